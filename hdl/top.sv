@@ -84,4 +84,15 @@ module top #(
     end
   endgenerate
 
+`ifdef SDM_DUMP
+  // Waveform dump of the ports the scoreboards sample (Icarus), parsed offline by model/waveform.py
+  reg [8*512-1:0] dump_file;
+  initial begin
+    if (!$value$plusargs("DUMP_FILE=%s", dump_file))
+      dump_file = "top.vcd";
+    $dumpfile(dump_file);
+    $dumpvars(0, clk, valid_out_dac, sdm_out, valid_in_adc, sdm_in, valid_out_adc, audio_out);
+  end
+`endif
+
 endmodule
\ No newline at end of file
@@ -1,213 +1,435 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.signal import resample
-from scipy.signal import firwin, lfilter, decimate
-import sys
-import os
-
-parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
-if parent_path not in sys.path:
-    sys.path.append(parent_path)
-
-sys.setrecursionlimit(10000000)
-
-def sigma_delta_modulator(input_signal, index=0, integrator=0, output_signal=None):
-    """
-    Recursive implementation of a first-order Sigma-Delta modulator for 0 and 1 output.
-
-    Args:
-        input_signal (array-like): The input analog signal to be converted.
-        index (int): Current index in the signal.
-        integrator (float): Current state of the integrator.
-        output_signal (list): Accumulated output signal (0 or 1).
-
-    Returns:
-        list: The quantized output signal (0 or 1).
-    """
-    if output_signal is None:
-        output_signal = []
-
-    if index >= len(input_signal):  # Base case
-        return output_signal
-
-    # Integrator: accumulate the difference
-    quantizer = 1 if integrator > 0 else 0  # Quantizer outputs 0 or 1
-    integrator += input_signal[index] - (32768 if quantizer == 1 else -32768)
-
-    # Append the quantized value to the output
-    output_signal.append(quantizer)
-    return sigma_delta_modulator(input_signal, index + 1, integrator, output_signal)
-
-def second_order_sigma_delta_modulator(input_signal, index=0, integrator1=0, integrator2=0, output_signal=None):
-    """
-    Recursive implementation of a second-order Sigma-Delta modulator for 0 and 1 output.
-
-    Args:
-        input_signal (array-like): The input analog signal to be converted.
-        index (int): Current index in the signal.
-        integrator1 (float): Current state of the first integrator.
-        integrator2 (float): Current state of the second integrator.
-        output_signal (list): Accumulated output signal (0 or 1).
-
-    Returns:
-        list: The quantized output signal (0 or 1).
-    """
-    if output_signal is None:
-        output_signal = []
-
-    if index >= len(input_signal):  # Base case
-        return output_signal
-
-    # First integrator: accumulate the difference
-    integrator1 += input_signal[index] - (32768 if integrator2 > 0 else -32768)
-
-    # Second integrator: accumulate the output of the first integrator
-    integrator2 += integrator1
-
-    # Quantizer: outputs 0 or 1 based on the second integrator
-    quantizer = 1 if integrator2 > 0 else 0
-
-    # Append the quantized value to the output
-    output_signal.append(quantizer)
-    return second_order_sigma_delta_modulator(input_signal, index + 1, integrator1, integrator2, output_signal)
-
-def convert_audio_to_sdm(audio_data, sample_rate, target_rate, order=1):
-    """
-    Converts 16-bit audio data at 44.1 kHz to Sigma-Delta modulated signal at 2.8224 MHz.
-
-    Args:
-        audio_data (array-like): The input 16-bit audio signal.
-        sample_rate (int): Original sample rate of the audio (44.1 kHz).
-        target_rate (int): Target sample rate (2.8224 MHz).
-        order (int): Order of the sigma delta modulator, available order=1 or order=2
-
-    Returns:
-        array: Sigma-Delta modulated signal (0 or 1) at target rate.
-    """
-    print(f"sample_rate: {sample_rate}, target_rate: {target_rate}")
-    # Normalize audio data to [0, 1]
-    #print(f"max: {np.max(np.abs(audio_data))}")
-    #audio_data = audio_data / 32768 #np.max(np.abs(audio_data))  # Normalize to [-1, 1]
-    #audio_data = (audio_data + 1) / 2  # Shift to [0, 1]
-    print(f"Adudio data len: {len(audio_data)}")
-
-    # Calculate the oversampling factor
-    oversampling_factor = 64#target_rate // sample_rate
-    print(f"oversampling_factor: {oversampling_factor}")
-
-    # Oversample the input signal
-    oversampled_audio = [int(x) for x in audio_data for _ in range(oversampling_factor)] #lst = [(j, k) for j in s1 for k in s2]
-    print(f"oversampled: {oversampled_audio}")
-    #oversampled_audio = resample(audio_data, len(audio_data) * oversampling_factor)
-
-    # Apply Sigma-Delta Modulation
-    sdm_signal = sigma_delta_modulator(oversampled_audio) if order != 2 else second_order_sigma_delta_modulator(oversampled_audio)
-
-    # Decimate the SDM signal to reduce the number of samples
-    #decimation_factor = 64
-    #decimated_sdm_signal = sdm_signal[::decimation_factor]
-    #return decimated_sdm_signal
-    return sdm_signal
-
-def sigma_delta_demodulator_fir(sdm_signal, target_rate, sample_rate, num_taps=64):
-    """
-    Demodulates a Sigma-Delta modulated signal using an FIR filter.
-
-    Args:
-        sdm_signal (array-like): 1-bit Sigma-Delta modulated signal with values 0 and 1.
-        target_rate (int): The sampling rate of the modulated signal (e.g., 2.8224 MHz).
-        sample_rate (int): The desired output sampling rate (e.g., 44.1 kHz).
-        num_taps (int): Number of taps for the FIR filter.
-
-    Returns:
-        array: Demodulated audio signal at the original sampling rate (16-bit).
-    """
-    # Map SDM signal from [0, 1] to [-1, 1]
-    sdm_signal = 2 * np.array(sdm_signal) - 1
-
-    # Design an FIR low-pass filter
-    nyquist = target_rate / 2
-    cutoff = sample_rate / 2  # Low-pass filter cutoff frequency
-    fir_coefficients = firwin(num_taps, cutoff / nyquist)
-
-    # Apply FIR low-pass filter
-    filtered_signal = lfilter(fir_coefficients, 1.0, sdm_signal)
-
-    # Decimate the signal to reduce the sampling rate back to the original
-    decimation_factor = target_rate // sample_rate
-    demodulated_signal = decimate(filtered_signal, decimation_factor, ftype="fir")
-
-    # Scale back to 16-bit integer range (-32768 to 32767)
-    demodulated_signal = np.clip(demodulated_signal, -1, 1)  # Ensure the range is [-1, 1]
-    demodulated_signal = (demodulated_signal * 32767).astype(np.int16)
-
-    return demodulated_signal
-
-if __name__ == "__main__":
-    # Generate a test 16-bit sine wave audio signal at 44.1 kHz
-    #duration = 1.0  # 1 second
-    #sample_rate = 44100  # 44.1 kHz
-    #target_rate = 2822400  # 2.8224 MHz
-    #t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    #frequency = 100
-    #audio_data = (0.9 * np.sin(2 * np.pi * frequency * t) * 32767).astype(np.int16)
-    #print("Audio_data len: ", len(audio_data))
-    # Convert the audio to Sigma-Delta Modulated Signal
-
-    # TEMP #############
-
-    periods=5
-    samples_per_period=5
-    target_rate=2822400
-    frequency=100
-
-    # Calculate the duration for 5 periods
-    duration = periods / frequency
-
-    # Total number of samples
-    total_samples = periods * samples_per_period
-
-    # Time array with 5 samples per period
-    t = np.linspace(0, duration, int(total_samples), endpoint=False)
-    print(f"t: {t}, len: {len(t)}")
-
-    # Generate sine wave with the desired properties
-    audio_data = (0.9 * np.sin(2 * np.pi * frequency * t) * 32767).astype(dtype='int16')
-    print(f"audio_data: {audio_data}, len: {len(audio_data)}")
-    # Convert to SDM signal
-    sdm_signal = convert_audio_to_sdm(audio_data, total_samples, target_rate)
-
-
-    #sdm_signal = convert_audio_to_sdm(audio_data, sample_rate, target_rate)
-
-    #demodulated_audio_fir = sigma_delta_demodulator_fir(sdm_signal, target_rate, sample_rate)
-
-    # Plot the results
-    plt.figure(figsize=(12, 9))
-
-    # Plot original audio signal
-    plt.subplot(3, 1, 1)
-    plt.plot(t[:1000], audio_data[:1000], label="Original Audio Signal")
-    plt.title("Original Audio Signal (44.1 kHz)")
-    plt.grid(True)
-    plt.legend()
-
-    # Plot Sigma-Delta Modulated Signal
-    oversampled_t = np.linspace(0, duration, len(sdm_signal), endpoint=False)
-    plt.subplot(3, 1, 2)
-    plt.step(oversampled_t[:64000], sdm_signal[:64000], label="Sigma-Delta Modulated Signal", where="mid")
-    plt.title("Sigma-Delta Modulated Signal (2.8224 MHz)")
-    plt.grid(True)
-    plt.legend()
-
-    ## Plot demodulated audio signal
-    #demodulated_t = np.linspace(0, duration, len(demodulated_audio_fir), endpoint=False)
-    #plt.subplot(3, 1, 3)
-    #plt.plot(demodulated_t[:1000], demodulated_audio_fir[:1000], label="Demodulated Audio Signal (FIR, 16-bit)")
-    #plt.title("Demodulated Audio Signal (44.1 kHz) Using FIR")
-    #plt.grid(True)
-    #plt.legend()
-
-    # Adjust layout
-    plt.tight_layout()
-    plt.show()
+import numpy as np
+from scipy.signal import lfilter, decimate
+import sys
+import os
+
+try:
+    import numba
+except ImportError:  # numba is optional, the pure-Python backend is always available
+    numba = None
+
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+
+from model.oversampling import Oversampler, get_oversampling_factor
+from model.bitstream import SDM_bitstream
+from model.decimation import cached_firwin
+from model.trace import configure_logging, get_logger, summary
+from model.report import REPORT_DIR_ENV, write_report
+from model.stimulus import SDM_stimulus
+
+log = get_logger("model")
+
+def _first_order_kernel_python(input_signal, output_signal, integrator, hold):
+    """
+    Pure-Python loop of the first-order modulator, returns the final integrator.
+    Every input sample is held for `hold` modulator cycles.
+    """
+    bits = bytearray(len(input_signal) * hold)
+    index = 0
+    for sample in input_signal.tolist():
+        for _ in range(hold):
+            if integrator > 0:
+                bits[index] = 1
+                integrator += sample - 32768
+            else:
+                integrator += sample + 32768
+            index += 1
+    output_signal[:] = np.frombuffer(bits, dtype=np.uint8)
+    return integrator
+
+def _second_order_kernel_python(input_signal, output_signal, integrator1, integrator2, hold):
+    """
+    Pure-Python loop of the second-order modulator, returns the final integrators.
+    Every input sample is held for `hold` modulator cycles.
+    """
+    bits = bytearray(len(input_signal) * hold)
+    index = 0
+    for sample in input_signal.tolist():
+        for _ in range(hold):
+            integrator1 += sample - (32768 if integrator2 > 0 else -32768)
+            integrator2 += integrator1
+            if integrator2 > 0:
+                bits[index] = 1
+            index += 1
+    output_signal[:] = np.frombuffer(bits, dtype=np.uint8)
+    return integrator1, integrator2
+
+def _first_order_kernel(input_signal, output_signal, integrator, hold):
+    """
+    Array kernel of the first-order modulator, meant to be compiled with numba.
+    """
+    index = 0
+    for sample_index in range(input_signal.shape[0]):
+        sample = input_signal[sample_index]
+        for _ in range(hold):
+            quantizer = 1 if integrator > 0 else 0
+            integrator += sample - (32768 if quantizer == 1 else -32768)
+            output_signal[index] = quantizer
+            index += 1
+    return integrator
+
+def _second_order_kernel(input_signal, output_signal, integrator1, integrator2, hold):
+    """
+    Array kernel of the second-order modulator, meant to be compiled with numba.
+    """
+    index = 0
+    for sample_index in range(input_signal.shape[0]):
+        sample = input_signal[sample_index]
+        for _ in range(hold):
+            integrator1 += sample - (32768 if integrator2 > 0 else -32768)
+            integrator2 += integrator1
+            output_signal[index] = 1 if integrator2 > 0 else 0
+            index += 1
+    return integrator1, integrator2
+
+def _first_order_multichannel_numpy(input_signal, output_signal, integrator, hold):
+    """
+    First-order modulator vectorised across the channel axis, one NumPy step per time index.
+    """
+    bits = np.empty((output_signal.shape[1], input_signal.shape[0]), dtype=np.bool_)
+    index = 0
+    for sample in input_signal.T + 32768:
+        for _ in range(hold):
+            quantizer = np.greater(integrator, 0, out=bits[index])
+            integrator += sample
+            integrator -= quantizer * 65536
+            index += 1
+    output_signal[:] = bits.T
+
+def _second_order_multichannel_numpy(input_signal, output_signal, integrator1, integrator2, hold):
+    """
+    Second-order modulator vectorised across the channel axis, one NumPy step per time index.
+    """
+    bits = np.empty((output_signal.shape[1], input_signal.shape[0]), dtype=np.bool_)
+    quantizer = integrator2 > 0
+    index = 0
+    for sample in input_signal.T + 32768:
+        for _ in range(hold):
+            integrator1 += sample
+            integrator1 -= quantizer * 65536
+            integrator2 += integrator1
+            quantizer = np.greater(integrator2, 0, out=bits[index])
+            index += 1
+    output_signal[:] = bits.T
+
+def _make_multichannel_kernels(first_order_kernel, second_order_kernel, channel_range=range):
+    """
+    Builds (channels, samples) kernels that run a single-channel kernel on every row and update the state arrays in place.
+    """
+    def first_order_multichannel(input_signal, output_signal, integrator, hold):
+        for channel in channel_range(input_signal.shape[0]):
+            integrator[channel] = first_order_kernel(input_signal[channel], output_signal[channel], integrator[channel], hold)
+
+    def second_order_multichannel(input_signal, output_signal, integrator1, integrator2, hold):
+        for channel in channel_range(input_signal.shape[0]):
+            integrator1[channel], integrator2[channel] = second_order_kernel(input_signal[channel], output_signal[channel],
+                                                                             integrator1[channel], integrator2[channel], hold)
+
+    return first_order_multichannel, second_order_multichannel
+
+# Available modulation engines: {name: (first_order_kernel, second_order_kernel)}
+MODULATOR_BACKENDS = {
+    "python": (_first_order_kernel_python, _second_order_kernel_python),
+}
+# Engines for (channels, samples) input, the state is a tuple of per-channel arrays updated in place
+MULTICHANNEL_BACKENDS = {
+    "python": _make_multichannel_kernels(
+        lambda input_signal, output_signal, integrator, hold:
+            _first_order_kernel_python(input_signal, output_signal, integrator.item(), hold),
+        lambda input_signal, output_signal, integrator1, integrator2, hold:
+            _second_order_kernel_python(input_signal, output_signal, integrator1.item(), integrator2.item(), hold)),
+    "numpy": (_first_order_multichannel_numpy, _second_order_multichannel_numpy),
+}
+if numba is not None:
+    MODULATOR_BACKENDS["numba"] = (numba.njit(cache=True, nogil=True)(_first_order_kernel),
+                                   numba.njit(cache=True, nogil=True)(_second_order_kernel))
+    MULTICHANNEL_BACKENDS["numba"] = tuple(numba.njit(parallel=True, nogil=True)(kernel) for kernel in
+                                           _make_multichannel_kernels(*MODULATOR_BACKENDS["numba"], channel_range=numba.prange))
+
+DEFAULT_BACKEND = "numba" if "numba" in MODULATOR_BACKENDS else "python"
+
+def _as_modulator_input(input_signal):
+    """
+    Converts the modulator input to a contiguous int64 (or float64) array.
+    """
+    input_signal = np.asarray(input_signal)
+    dtype = np.int64 if input_signal.dtype.kind in "iub" else np.float64
+    return np.ascontiguousarray(input_signal, dtype=dtype)
+
+def run_modulator(input_signal, order=1, state=None, output_signal=None, backend=None, hold=1):
+    """
+    Iterative Sigma-Delta modulation engine shared by the first and second order modulators.
+
+    A 2-D input of shape (channels, samples) modulates every channel independently with the
+    MULTICHANNEL_BACKENDS engines, the state is then a tuple of per-channel arrays.
+
+    Args:
+        input_signal (array-like): The input signal at the modulator rate, (samples,) or (channels, samples).
+        order (int): Order of the sigma delta modulator, 2 selects the second order, anything else the first.
+        state (tuple): Integrator state to start from, (integrator,) or (integrator1, integrator2). Zeros if None.
+        output_signal (np.ndarray): Preallocated uint8 output with input_signal.shape[-1] * hold bits per channel, allocated if None.
+        backend (str): Key of MODULATOR_BACKENDS (or MULTICHANNEL_BACKENDS for 2-D input), DEFAULT_BACKEND if None.
+        hold (int): Number of modulator cycles every input sample is held for (zero-order hold oversampling).
+
+    Returns:
+        tuple: The quantized output signal (uint8, 0 or 1) and the integrator state after the last sample.
+    """
+    input_signal = _as_modulator_input(input_signal)
+    output_shape = input_signal.shape[:-1] + (input_signal.shape[-1] * hold,)
+    if output_signal is None:
+        output_signal = np.empty(output_shape, dtype=np.uint8)
+    elif output_signal.shape != output_shape:
+        raise ValueError(f"output_signal has shape {output_signal.shape}, expected {output_shape}")
+
+    if input_signal.ndim == 2:
+        if state is None:
+            state = (0, 0) if order == 2 else (0,)
+        state = tuple(np.array(np.broadcast_to(value, input_signal.shape[:1]), dtype=input_signal.dtype) for value in state)
+        first_order_kernel, second_order_kernel = MULTICHANNEL_BACKENDS[backend or DEFAULT_BACKEND]
+        if order == 2:
+            second_order_kernel(input_signal, output_signal, state[0], state[1], hold)
+        else:
+            first_order_kernel(input_signal, output_signal, state[0], hold)
+        return output_signal, state
+
+    first_order_kernel, second_order_kernel = MODULATOR_BACKENDS[backend or DEFAULT_BACKEND]
+    cast = int if input_signal.dtype.kind == "i" else float
+    if order == 2:
+        integrator1, integrator2 = state if state is not None else (0, 0)
+        state = second_order_kernel(input_signal, output_signal, cast(integrator1), cast(integrator2), hold)
+    else:
+        integrator, = state if state is not None else (0,)
+        state = (first_order_kernel(input_signal, output_signal, cast(integrator), hold),)
+    return output_signal, tuple(cast(value) for value in state)
+
+def sigma_delta_modulator(input_signal, index=0, integrator=0, output_signal=None, backend=None):
+    """
+    Iterative implementation of a first-order Sigma-Delta modulator for 0 and 1 output.
+
+    Args:
+        input_signal (array-like): The input analog signal to be converted.
+        index (int): Index in the signal to start from.
+        integrator (float): Initial state of the integrator.
+        output_signal (np.ndarray): Preallocated uint8 output of len(input_signal) - index.
+        backend (str): Key of MODULATOR_BACKENDS, DEFAULT_BACKEND if None.
+
+    Returns:
+        np.ndarray: The quantized output signal (uint8, 0 or 1).
+    """
+    output_signal, _ = run_modulator(input_signal[index:], 1, (integrator,), output_signal, backend)
+    return output_signal
+
+def second_order_sigma_delta_modulator(input_signal, index=0, integrator1=0, integrator2=0, output_signal=None, backend=None):
+    """
+    Iterative implementation of a second-order Sigma-Delta modulator for 0 and 1 output.
+
+    Args:
+        input_signal (array-like): The input analog signal to be converted.
+        index (int): Index in the signal to start from.
+        integrator1 (float): Initial state of the first integrator.
+        integrator2 (float): Initial state of the second integrator.
+        output_signal (np.ndarray): Preallocated uint8 output of len(input_signal) - index.
+        backend (str): Key of MODULATOR_BACKENDS, DEFAULT_BACKEND if None.
+
+    Returns:
+        np.ndarray: The quantized output signal (uint8, 0 or 1).
+    """
+    output_signal, _ = run_modulator(input_signal[index:], 2, (integrator1, integrator2), output_signal, backend)
+    return output_signal
+
+class SDM_modulator():
+    """
+    Stateful Sigma-Delta modulator for chunked PCM streams.
+
+    The integrators are kept between calls, so concatenating the outputs of process() over
+    consecutive chunks gives the same bitstream as one call over the whole signal.
+    Memory use only depends on the chunk size. With "hold" interpolation the samples are held
+    inside the modulator loop, the oversampled signal is never materialised.
+    Chunks of shape (channels, samples) modulate all channels at once.
+    """
+    def __init__(self, order=1, oversampling_factor=64, backend=None, interpolation="hold"):
+        self.order = order
+        self.oversampling_factor = oversampling_factor
+        self.backend = backend
+        self.oversampler = Oversampler(oversampling_factor, interpolation)
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.oversampler.reset()
+        self.samples_in = 0
+        self.bits_out = 0
+
+    def process(self, chunk, output_signal=None):
+        """
+        Modulates one PCM chunk.
+
+        Args:
+            chunk (array-like): PCM samples at the input rate, (samples,) or (channels, samples).
+            output_signal (np.ndarray): Optional preallocated uint8 output, oversampling_factor bits per input sample.
+
+        Returns:
+            np.ndarray: The quantized output signal (uint8, 0 or 1) for this chunk.
+        """
+        chunk = np.asarray(chunk)
+        if self.oversampler.interpolation == "hold":
+            output_signal, self.state = run_modulator(chunk, self.order, self.state, output_signal, self.backend,
+                                                      hold=self.oversampling_factor)
+        else:
+            oversampled_chunk = self.oversampler.process(chunk)
+            output_signal, self.state = run_modulator(oversampled_chunk, self.order, self.state, output_signal, self.backend)
+        self.samples_in += chunk.shape[-1]
+        self.bits_out += output_signal.shape[-1]
+        return output_signal
+
+    def stream(self, pcm_blocks):
+        """
+        Generator yielding one SDM block per PCM block as the blocks arrive.
+
+        Args:
+            pcm_blocks (iterable): Iterable of PCM chunks, e.g. a file reader or a live source.
+
+        Yields:
+            np.ndarray: The quantized output signal (uint8, 0 or 1) of each block.
+        """
+        for chunk in pcm_blocks:
+            yield self.process(chunk)
+
+def convert_audio_to_sdm(audio_data, sample_rate, target_rate, order=1, interpolation="hold", block_size=65536, packed=False):
+    """
+    Converts 16-bit audio data at 44.1 kHz to Sigma-Delta modulated signal at 2.8224 MHz.
+
+    Args:
+        audio_data (array-like or SDM_stimulus): The input 16-bit audio signal, (samples,) or
+            (channels, samples). A stimulus is rendered one block at a time.
+        sample_rate (int): Original sample rate of the audio (44.1 kHz).
+        target_rate (int): Target sample rate (2.8224 MHz).
+        order (int): Order of the sigma delta modulator, available order=1 or order=2
+        interpolation (str): Oversampling method, "hold", "linear" or "polyphase".
+        block_size (int): Number of input samples modulated at once.
+        packed (bool): Return an SDM_bitstream (8 bits per byte) instead of a uint8 array,
+            a list with one SDM_bitstream per channel for multi-channel input.
+
+    Returns:
+        array: Sigma-Delta modulated signal (0 or 1) at target rate, (bits,) or (channels, bits).
+    """
+    log.info("sample_rate: %s, target_rate: %s", sample_rate, target_rate)
+    if not isinstance(audio_data, SDM_stimulus):
+        audio_data = np.asarray(audio_data)
+    log.info("audio data len: %s", audio_data.shape[-1])
+
+    # Calculate the oversampling factor
+    oversampling_factor = get_oversampling_factor(sample_rate, target_rate)
+    log.info("oversampling_factor: %s", oversampling_factor)
+
+    # Oversample and apply Sigma-Delta Modulation block by block into one preallocated output
+    modulator = SDM_modulator(order, oversampling_factor, interpolation=interpolation)
+    num_samples = audio_data.shape[-1]
+    num_bits = num_samples * oversampling_factor
+    if packed:
+        sdm_signal = [SDM_bitstream.empty(num_bits) for _ in range(audio_data.shape[0])] if audio_data.ndim == 2 \
+            else SDM_bitstream.empty(num_bits)
+    else:
+        sdm_signal = np.empty(audio_data.shape[:-1] + (num_bits,), dtype=np.uint8)
+    for start in range(0, num_samples, block_size):
+        chunk = audio_data[..., start:start + block_size]
+        bit_offset = start * oversampling_factor
+        if packed:
+            sdm_block = modulator.process(chunk)
+            for bitstream, bits in zip(sdm_signal, sdm_block) if audio_data.ndim == 2 else [(sdm_signal, sdm_block)]:
+                bitstream.write(bit_offset, bits)
+        else:
+            modulator.process(chunk, sdm_signal[..., bit_offset:bit_offset + chunk.shape[-1] * oversampling_factor])
+    return sdm_signal
+
+def sigma_delta_demodulator_fir(sdm_signal, target_rate, sample_rate, num_taps=64):
+    """
+    Demodulates a Sigma-Delta modulated signal using an FIR filter.
+
+    Args:
+        sdm_signal (array-like or SDM_bitstream): 1-bit Sigma-Delta modulated signal with values 0 and 1.
+        target_rate (int): The sampling rate of the modulated signal (e.g., 2.8224 MHz).
+        sample_rate (int): The desired output sampling rate (e.g., 44.1 kHz).
+        num_taps (int): Number of taps for the FIR filter.
+
+    Returns:
+        array: Demodulated audio signal at the original sampling rate (16-bit).
+    """
+    # Map SDM signal from [0, 1] to [-1, 1]
+    if isinstance(sdm_signal, SDM_bitstream):
+        sdm_signal = sdm_signal.to_bipolar()
+    else:
+        sdm_signal = 2 * np.asarray(sdm_signal, dtype=np.int8) - 1
+
+    # Design an FIR low-pass filter
+    nyquist = target_rate / 2
+    cutoff = sample_rate / 2  # Low-pass filter cutoff frequency
+    fir_coefficients = cached_firwin(num_taps, cutoff / nyquist)
+
+    # Apply FIR low-pass filter
+    filtered_signal = lfilter(fir_coefficients, 1.0, sdm_signal)
+
+    # Decimate the signal to reduce the sampling rate back to the original
+    decimation_factor = target_rate // sample_rate
+    demodulated_signal = decimate(filtered_signal, decimation_factor, ftype="fir")
+
+    # Scale back to 16-bit integer range (-32768 to 32767)
+    demodulated_signal = np.clip(demodulated_signal, -1, 1)  # Ensure the range is [-1, 1]
+    demodulated_signal = (demodulated_signal * 32767).astype(np.int16)
+
+    return demodulated_signal
+
+if __name__ == "__main__":
+    configure_logging()
+    # Generate a test 16-bit sine wave audio signal at 44.1 kHz
+    #duration = 1.0  # 1 second
+    #sample_rate = 44100  # 44.1 kHz
+    #target_rate = 2822400  # 2.8224 MHz
+    #t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
+    #frequency = 100
+    #audio_data = (0.9 * np.sin(2 * np.pi * frequency * t) * 32767).astype(np.int16)
+    #print("Audio_data len: ", len(audio_data))
+    # Convert the audio to Sigma-Delta Modulated Signal
+
+    # TEMP #############
+
+    periods=5
+    samples_per_period=5
+    target_rate=2822400
+    sample_rate=44100
+    frequency=100
+
+    # Calculate the duration for 5 periods
+    duration = periods / frequency
+
+    # Total number of samples
+    total_samples = periods * samples_per_period
+
+    # Time array with 5 samples per period
+    t = np.linspace(0, duration, int(total_samples), endpoint=False)
+    log.info("t: %s", summary(t))
+
+    # Generate sine wave with the desired properties
+    audio_data = (0.9 * np.sin(2 * np.pi * frequency * t) * 32767).astype(dtype='int16')
+    log.info("audio_data: %s", summary(audio_data))
+    # Convert to SDM signal
+    sdm_signal = convert_audio_to_sdm(audio_data, sample_rate, target_rate)
+
+
+    #sdm_signal = convert_audio_to_sdm(audio_data, sample_rate, target_rate)
+
+    #demodulated_audio_fir = sigma_delta_demodulator_fir(sdm_signal, target_rate, sample_rate)
+
+    # Plot the results (headless, see model/report.py)
+    oversampled_t = np.linspace(0, duration, len(sdm_signal), endpoint=False)
+    panels = [
+        {"title": "Original Audio Signal (44.1 kHz)", "series": [{"x": t, "y": audio_data, "label": "Original Audio Signal"}]},
+        {"title": "Sigma-Delta Modulated Signal (2.8224 MHz)", "step": True,
+         "series": [{"x": oversampled_t, "y": sdm_signal, "label": "Sigma-Delta Modulated Signal"}]},
+    ]
+    paths = write_report("SDM", panels, metrics={"order": 1, "sample_rate": sample_rate, "target_rate": target_rate,
+                                                 "samples": len(audio_data), "bits": len(sdm_signal)},
+                         directory=os.environ.get(REPORT_DIR_ENV, "."))
+    log.info("report written to %s", paths["html"])
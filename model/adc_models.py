@@ -0,0 +1,313 @@
+import numpy as np
+
+from model.bitstream import SDM_bitstream
+
+# fir_decimator.sv coefficients (Q15)
+FIR_COEFFICIENTS = np.array([-119, 197, 692, 0, -2613, -2855, 5177, 18681, 25580,
+                             18681, 5177, -2855, -2613, 0, 692, 197, -119], dtype=np.int64)
+# sdm_bound in sdm_adc_art.sv / sdm_adc_avg.sv
+SDM_BOUND = 32767
+
+def _wrap(values, bits):
+    """
+    Two's complement wraparound of integers to a signed register of the given width.
+    """
+    offset = 1 << (bits - 1)
+    return ((np.asarray(values, dtype=np.int64) + offset) & ((1 << bits) - 1)) - offset
+
+def _exclusive_cumsum(values, initial):
+    """
+    Running sum before every element: initial, initial + values[0], ...
+    """
+    cumulative = np.cumsum(values)
+    return initial + np.concatenate(([0], cumulative[:-1])).astype(np.int64)
+
+def _hold(values, load, initial):
+    """
+    Register with a load enable: values[t] after every cycle t with load[t], the previous content otherwise.
+    """
+    index = np.where(load, np.arange(len(load)), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, np.asarray(values)[np.maximum(index, 0)], initial)
+
+def _as_stimulus(din, valid_in):
+    if isinstance(din, SDM_bitstream):
+        din = din.to_bits()
+    din = np.asarray(din, dtype=np.bool_)
+    valid_in = np.ones(len(din), dtype=np.bool_) if valid_in is None else np.asarray(valid_in, dtype=np.bool_)
+    return din, valid_in
+
+def _no_cycles(trace):
+    """
+    Output of an empty block, which has no edge and leaves the registers as they are.
+    """
+    output = {"samples": np.zeros(0, dtype=np.int16), "cycles": np.zeros(0, dtype=np.int64)}
+    if trace:
+        output.update(valid_out=np.zeros(0, dtype=np.bool_), dout=np.zeros(0, dtype=np.int16))
+    return output
+
+class SDM_adc_art_model():
+    """
+    Bit-exact model of sdm_adc_art.sv: comb_decimator (32-bit integrator/comb, R=16, >>> 4)
+    followed by fir_decimator (17 Q15 taps, decimation 4, mac_result[31:16]).
+
+    Every cycle of the stimulus is one rising edge of clk after reset, the outputs of cycle t are the
+    register values right after that edge (what a monitor sees in ReadOnly after RisingEdge).
+    The state is carried between process() calls, so long stimuli can be fed block by block.
+    """
+    def __init__(self, decimation_factor=16, coefficients=FIR_COEFFICIENTS, fir_decimation_factor=4):
+        self.decimation_factor = decimation_factor
+        self.coefficients = np.asarray(coefficients, dtype=np.int64)
+        self.fir_decimation_factor = fir_decimation_factor
+        self.reset()
+
+    def reset(self):
+        self.cycle = 0
+        # comb_decimator
+        self.integrator_reg = 0
+        self.sample_count = 0
+        self.valid_decimate = False
+        self.decimated_reg = 0
+        self.comb_reg = 0
+        self.comb_valid_out = False
+        self.comb_data_out = 0
+        # fir_decimator, delay_line holds the previous inputs oldest first
+        self.delay_line = np.zeros(len(self.coefficients) - 1, dtype=np.int64)
+        self.decimation_counter = 0
+        self.data_out = 0
+
+    def process(self, din, valid_in=None, trace=False):
+        """
+        Runs a block of cycles.
+
+        Args:
+            din (array-like or SDM_bitstream): SDM input bit of every cycle.
+            valid_in (array-like): valid_in of every cycle, always high if None.
+            trace (bool): Also return valid_out and dout of every cycle.
+
+        Returns:
+            dict: "samples" (int16 dout at every rising edge of valid_out), "cycles" (absolute cycle of
+                those edges) and, with trace, "valid_out" and "dout" per cycle.
+        """
+        din, valid_in = _as_stimulus(din, valid_in)
+        num_cycles = len(din)
+        if not num_cycles:
+            return _no_cycles(trace)
+        data_in = np.where(din, SDM_BOUND, -SDM_BOUND) * valid_in
+
+        # comb_decimator: integrator stage and decimation stage, values before every edge
+        integrator_reg = _exclusive_cumsum(data_in, self.integrator_reg)
+        sample_count = _exclusive_cumsum(valid_in, self.sample_count) % self.decimation_factor
+        decimate = valid_in & (sample_count == self.decimation_factor - 1)
+        valid_decimate = _hold(decimate, valid_in, self.valid_decimate)
+        decimated_reg = _hold(integrator_reg, decimate, self.decimated_reg)
+        valid_decimate_before = np.concatenate(([self.valid_decimate], valid_decimate[:-1])).astype(np.bool_)
+        decimated_before = np.concatenate(([self.decimated_reg], decimated_reg[:-1]))
+
+        # comb stage fires on every edge with valid_decimate, comb_reg follows the fired value
+        comb_fire = np.flatnonzero(valid_decimate_before)
+        fired = decimated_before[comb_fire]
+        comb_before = np.concatenate(([self.comb_reg], fired[:-1]))
+        comb_out = _wrap(_wrap(fired - comb_before, 32) >> 4, 16)
+
+        # fir_decimator takes the registered comb output one edge later
+        fir_input_cycles = np.concatenate(([0] if self.comb_valid_out else [], comb_fire + 1)).astype(np.int64)
+        fir_inputs = np.concatenate(([self.comb_data_out] if self.comb_valid_out else [], comb_out)).astype(np.int64)
+        pending = fir_input_cycles >= num_cycles
+        if np.any(pending):
+            self.comb_valid_out, self.comb_data_out = True, int(fir_inputs[-1])
+            fir_input_cycles, fir_inputs = fir_input_cycles[~pending], fir_inputs[~pending]
+        else:
+            self.comb_valid_out = False
+
+        extended = np.concatenate((self.delay_line, fir_inputs))
+        # mode="valid" would swap its arguments when there is no new input
+        mac_result = np.convolve(extended, self.coefficients, mode="valid")[:len(fir_inputs)]
+        data_out = _wrap(mac_result, 32) >> 16
+        decimation_counter = (self.decimation_counter + np.arange(1, len(fir_inputs) + 1)) % self.fir_decimation_factor
+        valid_out = decimation_counter == self.fir_decimation_factor - 1
+
+        output = {"samples": data_out[valid_out].astype(np.int16),
+                  "cycles": fir_input_cycles[valid_out] + self.cycle}
+        if trace:
+            load = np.zeros(num_cycles, dtype=np.bool_)
+            load[fir_input_cycles] = True
+            output["valid_out"] = _hold(self._scatter(valid_out, fir_input_cycles, num_cycles), load,
+                                        self.decimation_counter == self.fir_decimation_factor - 1).astype(np.bool_)
+            output["dout"] = _hold(self._scatter(data_out, fir_input_cycles, num_cycles), load, self.data_out).astype(np.int16)
+
+        # Carry the registers to the next block
+        self.cycle += num_cycles
+        self.integrator_reg = int(_wrap(integrator_reg[-1] + data_in[-1], 32)) if num_cycles else self.integrator_reg
+        self.sample_count = int((sample_count[-1] + valid_in[-1]) % self.decimation_factor) if num_cycles else self.sample_count
+        if num_cycles:
+            self.valid_decimate = bool(valid_decimate[-1])
+            self.decimated_reg = int(decimated_reg[-1])
+        if len(fired):
+            self.comb_reg = int(fired[-1])
+        self.delay_line = extended[len(extended) - len(self.delay_line):]
+        if len(fir_inputs):
+            self.decimation_counter = int(decimation_counter[-1])
+            self.data_out = int(data_out[-1])
+        return output
+
+    @staticmethod
+    def _scatter(values, cycles, num_cycles):
+        scattered = np.zeros(num_cycles, dtype=np.asarray(values).dtype)
+        scattered[cycles] = values
+        return scattered
+
+class SDM_adc_avg_model():
+    """
+    Bit-exact model of sdm_adc_avg.sv: six cascaded avg_filter stages.
+
+    An avg_filter stage computes (previous + data_in) >>> 1 on every enabled cycle and raises rdy for one
+    cycle after every second enabled cycle, so the next stage receives the floor-average of each
+    non-overlapping input pair one cycle later. Every stage is evaluated over the whole block with strided
+    pair slices; the timing conventions are the ones of SDM_adc_art_model.
+    """
+    def __init__(self, num_stages=6):
+        self.num_stages = num_stages
+        self.reset()
+
+    def reset(self):
+        self.cycle = 0
+        self.previous = [0] * self.num_stages
+        self.cycle_toggle = [0] * self.num_stages
+        # Input of a stage on the first cycle of the next block (rdy of the stage before on the last edge)
+        self.pending = [None] * self.num_stages
+        self.avg = 0
+
+    def process(self, din, valid_in=None, trace=False):
+        """
+        Runs a block of cycles.
+
+        Args:
+            din (array-like or SDM_bitstream): SDM input bit of every cycle.
+            valid_in (array-like): valid_in of every cycle, always high if None.
+            trace (bool): Also return valid_out and dout of every cycle.
+
+        Returns:
+            dict: "samples" (int16 dout whenever valid_out is high), "cycles" (absolute cycle of those
+                samples) and, with trace, "valid_out" and "dout" per cycle.
+        """
+        din, valid_in = _as_stimulus(din, valid_in)
+        num_cycles = len(din)
+        if not num_cycles:
+            return _no_cycles(trace)
+        cycles = np.flatnonzero(valid_in)
+        values = np.where(din[cycles], SDM_BOUND, -SDM_BOUND).astype(np.int64)
+
+        pending = [None] * self.num_stages
+        for stage in range(self.num_stages):
+            if self.pending[stage] is not None:
+                cycles = np.concatenate(([0], cycles))
+                values = np.concatenate(([self.pending[stage]], values))
+            previous = np.concatenate(([self.previous[stage]], values[:-1]))
+            # Index of the first input that completes a pair, rdy follows every second input from there
+            first = 1 - self.cycle_toggle[stage]
+            if len(values):
+                self.previous[stage] = int(values[-1])
+                self.cycle_toggle[stage] = (self.cycle_toggle[stage] + len(values)) % 2
+            if stage == self.num_stages - 1:
+                break
+            values = (previous[first::2] + values[first::2]) >> 1
+            cycles = cycles[first::2] + 1
+            if len(cycles) and cycles[-1] == num_cycles:
+                pending[stage + 1] = int(values[-1])
+                cycles, values = cycles[:-1], values[:-1]
+
+        # Last stage: dout is the register written on every enabled cycle, valid_out its rdy
+        rdy_cycles = cycles[first::2]
+        output = {"samples": ((previous[first::2] + values[first::2]) >> 1).astype(np.int16),
+                  "cycles": rdy_cycles + self.cycle}
+        if trace:
+            averages = (previous + values) >> 1
+            load = np.zeros(num_cycles, dtype=np.bool_)
+            load[cycles] = True
+            dout = np.zeros(num_cycles, dtype=np.int64)
+            dout[cycles] = averages
+            output["dout"] = _hold(dout, load, self.avg).astype(np.int16)
+            output["valid_out"] = np.zeros(num_cycles, dtype=np.bool_)
+            output["valid_out"][rdy_cycles] = True
+        if len(values):
+            self.avg = int((previous[-1] + values[-1]) >> 1)
+        self.pending = pending
+        self.cycle += num_cycles
+        return output
+
+def _run_model(model, din, valid_in, block_size):
+    samples, cycles = [np.zeros(0, np.int16)], [np.zeros(0, np.int64)]
+    for start in range(0, len(din), block_size):
+        output = model.process(din[start:start + block_size],
+                               None if valid_in is None else valid_in[start:start + block_size])
+        samples.append(output["samples"])
+        cycles.append(output["cycles"])
+    return np.concatenate(samples), np.concatenate(cycles)
+
+def sdm_adc_art(din, valid_in=None, block_size=1 << 22):
+    """
+    One-shot sdm_adc_art model over a whole stimulus, see SDM_adc_art_model.
+
+    Returns:
+        tuple: int16 samples and the cycles at which valid_out rises.
+    """
+    return _run_model(SDM_adc_art_model(), din, valid_in, block_size)
+
+def sdm_adc_avg(din, valid_in=None, block_size=1 << 22):
+    """
+    One-shot sdm_adc_avg model over a whole stimulus, see SDM_adc_avg_model.
+
+    Returns:
+        tuple: int16 samples and the cycles at which valid_out is high.
+    """
+    return _run_model(SDM_adc_avg_model(), din, valid_in, block_size)
+
+# Model of the ADC that top.sv instantiates for every ADC_TYPE
+ADC_MODELS = {0: SDM_adc_avg_model, 1: SDM_adc_art_model}
+
+class SDM_loopback_model():
+    """
+    Expected audio_out of top with sdm_out fed back into sdm_in/valid_in_adc.
+
+    Two ADC models run on the cycles the ADC saw. "adc" is fed with the looped-back bits as they were
+    driven, which checks the ADC path alone and is bit-exact whatever the DAC did. "chained" is fed
+    with the bit-exact DAC model output from the first valid cycle on (valid for its whole length,
+    idle afterwards), the DAC -> ADC reference of the end-to-end PCM-in/PCM-out check; the DAC
+    stream only matches it cycle for cycle when the audio samples are exactly oversampling_factor
+    clk cycles apart. The cycles before the first valid one are idle after reset and skipped.
+    """
+    def __init__(self, adc_type, dac_signal):
+        if adc_type not in ADC_MODELS:
+            raise ValueError(f"top instantiates no ADC for ADC_TYPE={adc_type}")
+        self.adc = ADC_MODELS[adc_type]()
+        self.chained = ADC_MODELS[adc_type]()
+        self.dac_signal = dac_signal
+        # Cycles of the chained model since the first valid cycle, None before it
+        self.position = None
+
+    def process(self, din, valid_in):
+        """
+        Runs the next block of looped-back cycles.
+
+        Args:
+            din (array-like): sdm_in of every cycle.
+            valid_in (array-like): valid_in_adc of every cycle.
+
+        Returns:
+            dict: int16 samples of "adc" and "chained", see SDM_adc_art_model.process().
+        """
+        din, valid_in = _as_stimulus(din, valid_in)
+        output = {"adc": self.adc.process(din, valid_in)["samples"], "chained": np.zeros(0, dtype=np.int16)}
+        if self.position is None:
+            if not np.any(valid_in):
+                return output
+            din = din[int(np.argmax(valid_in)):]
+            self.position = 0
+        chained_din = np.zeros(len(din), dtype=np.bool_)
+        available = max(0, min(len(din), len(self.dac_signal) - self.position))
+        if available:
+            chained_din[:available] = np.asarray(self.dac_signal[self.position:self.position + available], dtype=np.bool_)
+        self.position += len(din)
+        output["chained"] = self.chained.process(chained_din, np.arange(len(din)) < available)["samples"]
+        return output
@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+# Adding main_repo to path when run as a script
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+from model.SDM import SDM_modulator, convert_audio_to_sdm, sigma_delta_demodulator_fir
+from model.trace import configure_logging, get_logger
+
+log = get_logger("benchmark")
+
+SAMPLE_RATE = 44100
+TARGET_RATE = 2822400
+# Input lengths of the full sweep, 10^3 to 10^8 samples
+SWEEP_LENGTHS = tuple(10 ** exponent for exponent in range(3, 9))
+# Relative memory growth against the baseline reported as a regression
+DEFAULT_THRESHOLD = 0.10
+# Relative slowdown reported as a regression, on top of the timing noise of both measurements: the
+# throughput of a whole run drifts by 10-20% on a loaded machine, the traced memory does not
+SPEED_THRESHOLD = 0.25
+# Fewest timed repeats of a measurement, the throughput is taken from their median
+MIN_REPEATS = 7
+# Fresh-process re-measurements of a slower measurement before it counts as a regression
+RECHECK_ROUNDS = 3
+# Baseline of the default sweep, written with --output
+BASELINE = os.path.join(parent_path, "model", "benchmark_baseline.json")
+# Chunk of the streaming oversampling benchmark, as in convert_audio_to_sdm()
+BLOCK_SIZE = 65536
+
+def _audio(num_samples):
+    time_axis = np.arange(num_samples) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * 1000 * time_axis) * 32767).astype(np.int16)
+
+def _modulator(order):
+    def setup(num_samples):
+        audio_data = _audio(num_samples)
+        return lambda: convert_audio_to_sdm(audio_data, SAMPLE_RATE, TARGET_RATE, order, packed=True).packed.nbytes
+    return setup
+
+def _oversampling(interpolation):
+    # The modulator path of each interpolation: "hold" runs inside the modulator loop, the others
+    # go through Oversampler first, the difference to modulator_order1 is the cost of interpolating
+    def setup(num_samples):
+        audio_data = _audio(num_samples)
+
+        def run():
+            modulator = SDM_modulator(1, TARGET_RATE // SAMPLE_RATE, interpolation=interpolation)
+            return sum(modulator.process(audio_data[start:start + BLOCK_SIZE]).nbytes
+                       for start in range(0, num_samples, BLOCK_SIZE))
+        return run
+    return setup
+
+def _demodulator(num_samples):
+    # num_samples are input bits here, the modulated stream of num_samples // 64 audio samples
+    sdm_signal = convert_audio_to_sdm(_audio(-(-num_samples // (TARGET_RATE // SAMPLE_RATE))), SAMPLE_RATE,
+                                      TARGET_RATE, 1, packed=True)[:num_samples]
+    return lambda: sigma_delta_demodulator_fir(sdm_signal, TARGET_RATE, SAMPLE_RATE).nbytes
+
+# name: setup(num_samples) -> run() returning the output size in bytes.
+# The modulators and the oversampler take num_samples audio samples, the demodulator num_samples bits.
+BENCHMARKS = {
+    "modulator_order1": _modulator(1),
+    "modulator_order2": _modulator(2),
+    "oversampling_hold": _oversampling("hold"),
+    "oversampling_polyphase": _oversampling("polyphase"),
+    "demodulator_fir": _demodulator,
+}
+
+def _measure(task):
+    """
+    Worker: times one benchmark in a fresh process, so that the peak RSS belongs to it alone.
+    """
+    name, num_samples, min_time = task
+    # Warm-up on a short input: JIT compilation, filter design and imports stay out of the timings
+    BENCHMARKS[name](min(num_samples, 1000))()
+    run = BENCHMARKS[name](num_samples)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    while len(times) < MIN_REPEATS or (sum(times) < min_time and len(times) < 100):
+        start = time.perf_counter()
+        output_bytes = run()
+        times.append(time.perf_counter() - start)
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    run()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    median = float(np.median(times))
+    return {"name": name, "num_samples": num_samples, "repeats": len(times), "best_time": min(times),
+            "median_time": median, "msamples_per_second": num_samples / median / 1e6,
+            # Median absolute deviation of the repeats relative to their median
+            "noise": float(np.median(np.abs(np.asarray(times) - median)) / median), "peak_rss_mb": rss_peak / 1024,
+            "rss_growth_mb": max(rss_peak - rss_before, 0) / 1024, "traced_peak_mb": traced_peak / (1 << 20),
+            "output_bytes": int(output_bytes)}
+
+def _measure_isolated(name, num_samples, min_time):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(_measure, (name, num_samples, min_time)).result()
+
+def run_benchmarks(names=None, lengths=SWEEP_LENGTHS[:4], min_time=0.2):
+    """
+    Runs every benchmark at every input length, each in its own process.
+
+    Args:
+        names (list): Keys of BENCHMARKS, all of them if None.
+        lengths (list): Input lengths in samples.
+        min_time (float): Repeats are added past MIN_REPEATS until their total time reaches it, the
+            throughput is the one of their median.
+
+    Returns:
+        dict: {"machine": ..., "results": {name: {str(length): measurement}}}.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        results[name] = {}
+        for num_samples in lengths:
+            measurement = _measure_isolated(name, num_samples, min_time)
+            log.info("%s %d: %.2f Msamples/s, peak RSS %.1f MB, traced %.1f MB, output %d B", name, num_samples,
+                     measurement["msamples_per_second"], measurement["peak_rss_mb"], measurement["traced_peak_mb"],
+                     measurement["output_bytes"])
+            results[name][str(num_samples)] = measurement
+    return {"machine": {"platform": platform.platform(), "processor": platform.processor(),
+                        "python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count()},
+            "results": results}
+
+def compare_to_baseline(current, baseline, threshold=DEFAULT_THRESHOLD, speed_threshold=SPEED_THRESHOLD):
+    """
+    Lists the measurements that are slower or use more memory than the baseline.
+
+    Throughput is compared as median Msamples/s with the relative noise of both measurements added to
+    speed_threshold, memory as traced peak (deterministic, unlike RSS). Measurements missing from either
+    side are skipped.
+
+    Returns:
+        list: One dict per regression with name, num_samples, metric, baseline, current and change.
+    """
+    regressions = []
+    for name, by_length in current["results"].items():
+        for length, measurement in by_length.items():
+            reference = baseline["results"].get(name, {}).get(length)
+            if reference is None:
+                continue
+            speed = measurement["msamples_per_second"] / reference["msamples_per_second"] - 1
+            if speed < -(speed_threshold + measurement.get("noise", 0) + reference.get("noise", 0)):
+                regressions.append({"name": name, "num_samples": int(length), "metric": "msamples_per_second",
+                                    "baseline": reference["msamples_per_second"],
+                                    "current": measurement["msamples_per_second"], "change": speed})
+            if reference["traced_peak_mb"] > 0:
+                memory = measurement["traced_peak_mb"] / reference["traced_peak_mb"] - 1
+                if memory > threshold:
+                    regressions.append({"name": name, "num_samples": int(length), "metric": "traced_peak_mb",
+                                        "baseline": reference["traced_peak_mb"],
+                                        "current": measurement["traced_peak_mb"], "change": memory})
+    return regressions
+
+def confirm_regressions(current, baseline, threshold=DEFAULT_THRESHOLD, speed_threshold=SPEED_THRESHOLD, min_time=0.2,
+                        rounds=RECHECK_ROUNDS):
+    """
+    compare_to_baseline() where a slowdown only counts if it survives re-measurement.
+
+    Every measurement that is slower than the baseline is measured again in a fresh process, up to
+    rounds times, and the fastest round is kept in current: transient load on the machine slows single
+    runs down by more than the threshold, a slower hot path slows all of them.
+
+    Returns:
+        list: The regressions left after the re-measurements, see compare_to_baseline().
+    """
+    regressions = compare_to_baseline(current, baseline, threshold, speed_threshold)
+    for _ in range(rounds):
+        slower = {(regression["name"], regression["num_samples"]) for regression in regressions
+                  if regression["metric"] == "msamples_per_second"}
+        if not slower:
+            break
+        for name, num_samples in sorted(slower):
+            measurement = _measure_isolated(name, num_samples, min_time)
+            log.info("%s %d: re-measured %.2f Msamples/s", name, num_samples, measurement["msamples_per_second"])
+            kept = current["results"][name][str(num_samples)]
+            if measurement["msamples_per_second"] > kept["msamples_per_second"]:
+                current["results"][name][str(num_samples)] = measurement
+        regressions = compare_to_baseline(current, baseline, threshold, speed_threshold)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and memory benchmarks of the SDM model.")
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS), default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=None,
+                        help="input lengths, 10^3 to 10^6 by default")
+    parser.add_argument("--full", action="store_true", help="sweep 10^3 to 10^8 samples")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--output", default=None, help="write the results (a new baseline) to this JSON file")
+    parser.add_argument("--baseline", default=None,
+                        help=f"fail if slower or larger than this JSON file, e.g. {os.path.relpath(BASELINE)}")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="memory growth")
+    parser.add_argument("--speed-threshold", type=float, default=SPEED_THRESHOLD, help="throughput drop")
+    args = parser.parse_args()
+
+    configure_logging()
+    lengths = args.lengths or (SWEEP_LENGTHS if args.full else SWEEP_LENGTHS[:4])
+    current = run_benchmarks(args.benchmarks, lengths, args.min_time)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(current, output_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = confirm_regressions(current, json.load(baseline_file), args.threshold, args.speed_threshold,
+                                              args.min_time)
+        for regression in regressions:
+            log.error("%s %d: %s %.3g -> %.3g (%+.1f%%)", regression["name"], regression["num_samples"],
+                      regression["metric"], regression["baseline"], regression["current"], 100 * regression["change"])
+        if regressions:
+            sys.exit(1)
+        log.info("no regression above %.0f%% (speed) / %.0f%% (memory) against %s", 100 * args.speed_threshold,
+                 100 * args.threshold, args.baseline)
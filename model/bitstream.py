@@ -0,0 +1,190 @@
+import numpy as np
+
+# _BIPOLAR_LUT[byte] is the MSB-first -1/+1 expansion of a packed byte
+_BIPOLAR_LUT = (np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.int8) * 2 - 1)
+# _PREFIX_ONES_LUT[byte, j] is the number of ones among the first j (MSB-first) bits of a byte
+_PREFIX_ONES_LUT = np.concatenate((np.zeros((256, 1), dtype=np.int64),
+                                   np.cumsum(np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1), axis=1)), axis=1)
+
+class SDM_bitstream():
+    """
+    Packed 1-bit Sigma-Delta stream, 8 bits per byte, MSB-first like DSD.
+
+    The storage is a plain uint8 array, so it can also be an np.memmap of a file.
+    Slicing on byte boundaries returns views, iteration and the *_bits() helpers unpack
+    only one block at a time.
+    """
+    def __init__(self, packed, num_bits=None):
+        self.packed = packed
+        self.num_bits = len(packed) * 8 if num_bits is None else num_bits
+        if self.num_bits > len(packed) * 8:
+            raise ValueError(f"{len(packed)} bytes cannot hold {self.num_bits} bits")
+
+    @classmethod
+    def empty(cls, num_bits):
+        return cls(np.zeros((num_bits + 7) // 8, dtype=np.uint8), num_bits)
+
+    @classmethod
+    def from_bits(cls, bits):
+        bits = np.asarray(bits, dtype=np.uint8)
+        return cls(np.packbits(bits), len(bits))
+
+    def __len__(self):
+        return self.num_bits
+
+    def __repr__(self):
+        return f"SDM_bitstream(num_bits={self.num_bits}, bytes={len(self.packed)})"
+
+    def __eq__(self, other):
+        if not isinstance(other, SDM_bitstream):
+            return NotImplemented
+        return self.num_bits == other.num_bits and np.array_equal(self.to_bits(), other.to_bits())
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.num_bits)
+            if step == 1:
+                stop = max(start, stop)
+                if start % 8 == 0:
+                    return SDM_bitstream(self.packed[start // 8:(stop + 7) // 8], stop - start)
+                return SDM_bitstream.from_bits(self.to_bits(start, stop))
+            return SDM_bitstream.from_bits(self.to_bits()[key])
+        index = key + self.num_bits if key < 0 else key
+        if not 0 <= index < self.num_bits:
+            raise IndexError(f"bit index {key} out of range for {self.num_bits} bits")
+        return int(self.packed[index // 8] >> (7 - index % 8)) & 1
+
+    def __iter__(self):
+        for block in self.iter_blocks():
+            yield from block.tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        bits = self.to_bits()
+        return bits if dtype is None else bits.astype(dtype)
+
+    def iter_blocks(self, block_bits=1 << 16):
+        """
+        Yields the stream as unpacked uint8 0/1 blocks of block_bits bits (the last one may be shorter).
+        """
+        block_bits -= block_bits % 8
+        for start in range(0, self.num_bits, block_bits):
+            yield self.to_bits(start, min(start + block_bits, self.num_bits))
+
+    def to_bits(self, start=0, stop=None):
+        """
+        Unpacks the bits [start, stop) to a uint8 0/1 array.
+        """
+        stop = self.num_bits if stop is None else stop
+        first_byte = start // 8
+        bits = np.unpackbits(self.packed[first_byte:(stop + 7) // 8])
+        return bits[start - first_byte * 8:stop - first_byte * 8]
+
+    def to_bipolar(self, start=0, stop=None):
+        """
+        Maps the bits [start, stop) to int8 -1/+1 through a byte lookup table.
+        """
+        stop = self.num_bits if stop is None else stop
+        first_byte = start // 8
+        bipolar = _BIPOLAR_LUT[self.packed[first_byte:(stop + 7) // 8]].ravel()
+        return bipolar[start - first_byte * 8:stop - first_byte * 8]
+
+    def iter_cumulative_ones(self, start=0, block_bits=1 << 16):
+        """
+        Yields the number of ones before every bit position from start to len(self) included, in int64
+        blocks of block_bits positions computed from byte popcounts. The count before the current
+        byte is carried between blocks, so memory does not grow with the stream.
+        """
+        block_bits = max(8, block_bits - block_bits % 8)
+        first_byte = start // 8
+        count = 0
+        for offset in range(0, first_byte, block_bits):
+            count += int(_PREFIX_ONES_LUT[self.packed[offset:min(offset + block_bits, first_byte)], 8].sum())
+        position = start
+        while position <= self.num_bits:
+            stop = min(position + block_bits, self.num_bits + 1)
+            first_byte = position // 8
+            block = self.packed[first_byte:(stop - 1) // 8 + 1]
+            if len(block) < (stop - 1) // 8 + 1 - first_byte:
+                # Position len(self) of a whole number of bytes lies just after the last byte
+                block = np.append(block, np.uint8(0))
+            byte_ones = _PREFIX_ONES_LUT[block, 8]
+            before = count + np.concatenate(([0], np.cumsum(byte_ones[:-1])))
+            ones = (before[:, None] + _PREFIX_ONES_LUT[block, :8]).ravel()
+            yield ones[position - first_byte * 8:stop - first_byte * 8]
+            count += int(byte_ones[:stop // 8 - first_byte].sum())
+            position = stop
+
+    def iter_window_sums(self, window, block_bits=1 << 16):
+        """
+        Yields the number of ones in every window of window consecutive bits, len(self) - window + 1
+        values in int64 blocks, as the difference of two carried popcount prefixes window bits apart.
+        """
+        trailing = self.iter_cumulative_ones(0, block_bits)
+        for leading in self.iter_cumulative_ones(window, block_bits):
+            yield leading - next(trailing)[:len(leading)]
+
+    def write(self, bit_offset, bits):
+        """
+        Writes 0/1 bits at bit_offset. Bits after the written range inside its last byte are cleared,
+        so blocks are expected to be written in order.
+        """
+        bits = np.asarray(bits, dtype=np.uint8)
+        head = bit_offset % 8
+        if head:
+            bits = np.concatenate((self.to_bits(bit_offset - head, bit_offset), bits))
+            bit_offset -= head
+        packed = np.packbits(bits)
+        self.packed[bit_offset // 8:bit_offset // 8 + len(packed)] = packed
+
+def moving_average(sdm_signal, window=256):
+    """
+    Moving average of a 0/1 stream, same as np.convolve(sdm_signal, np.ones(window)/window, mode='valid').
+
+    Args:
+        sdm_signal (array-like or SDM_bitstream): The 1-bit stream.
+        window (int): Length of the box filter.
+
+    Returns:
+        np.ndarray: The averaged signal in [0, 1].
+    """
+    if isinstance(sdm_signal, SDM_bitstream):
+        averaged = np.empty(max(len(sdm_signal) - window + 1, 0), dtype=np.float64)
+        position = 0
+        for sums in sdm_signal.iter_window_sums(window):
+            averaged[position:position + len(sums)] = sums / window
+            position += len(sums)
+        return averaged
+    return np.convolve(sdm_signal, np.ones(window)/window, mode='valid')
+
+def compare_bitstreams(got, exp):
+    """
+    Exact comparison of two 1-bit streams over their common length.
+
+    Packed streams are compared byte-wise (XOR and popcount) without unpacking.
+
+    Args:
+        got (array-like or SDM_bitstream): Bits captured from the DUT.
+        exp (array-like or SDM_bitstream): Bits predicted by the model.
+
+    Returns:
+        dict: "compared" bits, number of "mismatches", index of the "first_mismatch" (None if equal)
+            and "length_difference" (len(got) - len(exp)).
+    """
+    length = min(len(got), len(exp))
+    if isinstance(got, SDM_bitstream) and isinstance(exp, SDM_bitstream):
+        num_bytes = (length + 7) // 8
+        difference = got.packed[:num_bytes] ^ exp.packed[:num_bytes]
+        if length % 8:
+            difference[-1] &= (0xFF << (8 - length % 8)) & 0xFF
+        mismatching_bytes = np.flatnonzero(difference)
+        mismatches = int(_PREFIX_ONES_LUT[difference, 8].sum())
+        first_mismatch = None
+        if len(mismatching_bytes):
+            byte_index = mismatching_bytes[0]
+            first_mismatch = int(byte_index * 8 + np.argmax(np.unpackbits(difference[byte_index:byte_index + 1])))
+    else:
+        difference = (np.asarray(got, dtype=np.uint8)[:length] != np.asarray(exp, dtype=np.uint8)[:length])
+        mismatches = int(np.count_nonzero(difference))
+        first_mismatch = int(np.argmax(difference)) if mismatches else None
+    return {"compared": length, "mismatches": mismatches, "first_mismatch": first_mismatch,
+            "length_difference": len(got) - len(exp)}
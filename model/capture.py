@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+
+# Directory the scoreboards write their DUT captures to, disabled when the variable is not set
+CAPTURE_DIR_ENV = "SDM_CAPTURE_DIR"
+# Samples compared at once by compare_captures()
+COMPARE_BLOCK = 1 << 20
+
+class SDM_capture_writer():
+    """
+    Streams one captured signal to <directory>/<name>.bin as it arrives.
+
+    The blocks are appended as raw samples of a fixed dtype, close() writes the <name>.json sidecar
+    with the dtype and length, so a capture of any length needs no memory beyond the current block
+    and is read back memory-mapped with read_capture().
+    """
+    def __init__(self, name, dtype, directory):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.directory = directory
+        self.length = 0
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(os.path.join(directory, f"{name}.bin"), "wb")
+
+    def write(self, block):
+        block = np.ascontiguousarray(np.asarray(block).ravel(), dtype=self.dtype)
+        self.file.write(block.tobytes())
+        self.length += len(block)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        with open(os.path.join(self.directory, f"{self.name}.json"), "w") as sidecar:
+            json.dump({"dtype": self.dtype.str, "length": self.length}, sidecar)
+
+def open_capture(name, dtype, directory=None):
+    """
+    Writer of the capture name in directory, $SDM_CAPTURE_DIR if None.
+
+    Returns:
+        SDM_capture_writer: The writer, None if no directory is given and the variable is not set.
+    """
+    directory = directory or os.environ.get(CAPTURE_DIR_ENV)
+    if not directory:
+        return None
+    return SDM_capture_writer(name, dtype, directory)
+
+def list_captures(directory):
+    """
+    Returns:
+        list: Names of the complete (closed) captures in directory.
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(file_name[:-len(".json")] for file_name in os.listdir(directory)
+                  if file_name.endswith(".json") and os.path.exists(os.path.join(directory, file_name[:-5] + ".bin")))
+
+def read_capture(directory, name):
+    """
+    Returns:
+        np.ndarray: The capture, memory-mapped (an empty array for an empty capture).
+    """
+    with open(os.path.join(directory, f"{name}.json")) as sidecar:
+        header = json.load(sidecar)
+    if not header["length"]:
+        return np.zeros(0, dtype=header["dtype"])
+    return np.memmap(os.path.join(directory, f"{name}.bin"), dtype=header["dtype"], mode="r", shape=(header["length"],))
+
+def compare_captures(directory, other_directory, names=None):
+    """
+    Compares the captures of two runs sample for sample, block by block.
+
+    Args:
+        directory (str): Captures of the first run.
+        other_directory (str): Captures of the second run.
+        names (list): Captures to compare, the ones present in both directories if None.
+
+    Returns:
+        dict: {name: {"length", "other_length", "mismatches", "first_mismatch", "identical"}}, a capture
+            missing from either side has a None length and is not identical.
+    """
+    if names is None:
+        names = sorted(set(list_captures(directory)) & set(list_captures(other_directory)))
+    results = {}
+    for name in names:
+        try:
+            capture, other = read_capture(directory, name), read_capture(other_directory, name)
+        except FileNotFoundError:
+            results[name] = {"length": None, "other_length": None, "mismatches": None, "first_mismatch": None,
+                             "identical": False}
+            continue
+        length = min(len(capture), len(other))
+        mismatches, first_mismatch = 0, None
+        for start in range(0, length, COMPARE_BLOCK):
+            difference = np.asarray(capture[start:start + COMPARE_BLOCK]) != np.asarray(other[start:start + COMPARE_BLOCK])
+            count = int(np.count_nonzero(difference))
+            if count and first_mismatch is None:
+                first_mismatch = start + int(np.argmax(difference))
+            mismatches += count
+        if first_mismatch is None and len(capture) != len(other):
+            first_mismatch = length
+        results[name] = {"length": len(capture), "other_length": len(other), "mismatches": mismatches,
+                         "first_mismatch": first_mismatch,
+                         "identical": mismatches == 0 and len(capture) == len(other)}
+    return results
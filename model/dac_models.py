@@ -0,0 +1,187 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba is optional, the pure-Python backend is always available
+    numba = None
+
+from model.bitstream import SDM_bitstream
+
+def _wrap(value, bits):
+    """
+    Two's complement wraparound of an integer to a signed register of the given width.
+    """
+    half = 1 << (bits - 1)
+    return ((value + half) & ((1 << bits) - 1)) - half
+
+def _dac_1st_kernel(input_signal, output_signal, accumulator, dout, max_val, min_val, bw_tot):
+    """
+    Register loop of sdm_dac_1st over the valid cycles, returns the final DAC_acc_1st and dout_r.
+    """
+    half = 1 << (bw_tot - 1)
+    mask = (half << 1) - 1
+    for index in range(len(input_signal)):
+        dac_val = min_val if dout else max_val
+        accumulator = ((accumulator + input_signal[index] + dac_val + half) & mask) - half
+        dout = 1 if accumulator < 0 else 0
+        output_signal[index] = dout
+    return accumulator, dout
+
+def _dac_2nd_kernel(input_signal, output_signal, accumulator1, accumulator2, dout, mid_val, bw_tot, bw_tot2):
+    """
+    Register loop of sdm_dac_2nd over the valid cycles, returns the final DAC_acc_1st, DAC_acc_2nd and dout_r.
+    """
+    half1 = 1 << (bw_tot - 1)
+    mask1 = (half1 << 1) - 1
+    half2 = 1 << (bw_tot2 - 1)
+    mask2 = (half2 << 1) - 1
+    for index in range(len(input_signal)):
+        dac_val = -mid_val if dout else mid_val
+        accumulator1 = ((accumulator1 + input_signal[index] + dac_val + half1) & mask1) - half1
+        accumulator2 = ((accumulator2 + accumulator1 + dac_val + half2) & mask2) - half2
+        dout = 1 if accumulator2 < 0 else 0
+        output_signal[index] = dout
+    return accumulator1, accumulator2, dout
+
+def _dac_1st_kernel_python(input_signal, output_signal, accumulator, dout, max_val, min_val, bw_tot):
+    bits = bytearray(len(input_signal))
+    result = _dac_1st_kernel(input_signal.tolist(), bits, accumulator, dout, max_val, min_val, bw_tot)
+    output_signal[:] = np.frombuffer(bits, dtype=np.uint8)
+    return result
+
+def _dac_2nd_kernel_python(input_signal, output_signal, accumulator1, accumulator2, dout, mid_val, bw_tot, bw_tot2):
+    bits = bytearray(len(input_signal))
+    result = _dac_2nd_kernel(input_signal.tolist(), bits, accumulator1, accumulator2, dout, mid_val, bw_tot, bw_tot2)
+    output_signal[:] = np.frombuffer(bits, dtype=np.uint8)
+    return result
+
+DAC_BACKENDS = {
+    "python": (_dac_1st_kernel_python, _dac_2nd_kernel_python),
+}
+if numba is not None:
+    DAC_BACKENDS["numba"] = (numba.njit(cache=True, nogil=True)(_dac_1st_kernel),
+                             numba.njit(cache=True, nogil=True)(_dac_2nd_kernel))
+DEFAULT_DAC_BACKEND = "numba" if "numba" in DAC_BACKENDS else "python"
+
+class SDM_dac_model():
+    """
+    Register-accurate model of sdm_dac_1st.sv (order=1) and sdm_dac_2nd.sv (order=2).
+
+    The accumulators are bw_tot = dac_bw + bw_ext bits wide (plus osr bits for the second stage of
+    sdm_dac_2nd) and wrap around like the RTL, dout_r is the MSB of the updated accumulator and
+    selects the feedback of the next cycle. Only cycles with valid_in high update the registers.
+    """
+    def __init__(self, order=1, dac_bw=16, bw_ext=2, osr=6, backend=None):
+        if order not in (1, 2):
+            raise ValueError(f"order must be 1 or 2, got {order}")
+        backend = backend or DEFAULT_DAC_BACKEND
+        if backend not in DAC_BACKENDS:
+            raise ValueError(f"backend must be one of {tuple(DAC_BACKENDS)}, got {backend}")
+        self.order = order
+        self.dac_bw = dac_bw
+        self.bw_tot = dac_bw + bw_ext
+        self.bw_tot2 = self.bw_tot + osr
+        self.max_val = 2 ** (dac_bw - 1) - 1
+        self.min_val = -(2 ** (dac_bw - 1))
+        self.mid_val = 2 ** (dac_bw - 1) + 2 ** (osr + 2)
+        self.kernel = DAC_BACKENDS[backend][order - 1]
+        self.reset()
+
+    def reset(self):
+        self.cycle = 0
+        self.accumulator1 = 0
+        self.accumulator2 = 0
+        self.dout = 0
+
+    def process(self, din, valid_in=None, trace=False):
+        """
+        Runs a block of clk cycles.
+
+        Args:
+            din (array-like): audio_in of every cycle (16-bit, sign-extended like in_ext).
+            valid_in (array-like): valid_in of every cycle, always high if None.
+            trace (bool): Also return dout and valid_out of every cycle.
+
+        Returns:
+            dict: "bits" (uint8 dout_r after every valid cycle), "cycles" (absolute cycle of those bits)
+                and, with trace, "valid_out" and "dout" per cycle.
+        """
+        din = _wrap(np.asarray(din, dtype=np.int64), self.dac_bw)
+        valid_in = np.ones(len(din), dtype=np.bool_) if valid_in is None else np.asarray(valid_in, dtype=np.bool_)
+        cycles = np.flatnonzero(valid_in)
+        initial_dout = self.dout
+        bits = np.empty(len(cycles), dtype=np.uint8)
+        if len(cycles):
+            if self.order == 1:
+                self.accumulator1, self.dout = self.kernel(din[cycles], bits, self.accumulator1, self.dout,
+                                                           self.max_val, self.min_val, self.bw_tot)
+            else:
+                self.accumulator1, self.accumulator2, self.dout = self.kernel(
+                    din[cycles], bits, self.accumulator1, self.accumulator2, self.dout,
+                    self.mid_val, self.bw_tot, self.bw_tot2)
+            self.accumulator1, self.accumulator2, self.dout = int(self.accumulator1), int(self.accumulator2), int(self.dout)
+        output = {"bits": bits, "cycles": cycles + self.cycle}
+        if trace:
+            index = np.where(valid_in, np.cumsum(valid_in) - 1, -1)
+            np.maximum.accumulate(index, out=index)
+            output["dout"] = np.where(index >= 0, bits[np.maximum(index, 0)] if len(bits) else 0,
+                                      initial_dout).astype(np.uint8)
+            # Registered in sdm_dac_1st and combinational in sdm_dac_2nd, both follow valid_in of the cycle
+            output["valid_out"] = valid_in.copy()
+        self.cycle += len(din)
+        return output
+
+def _dac_blocks(audio_data, order, oversampling_factor, block_size, **parameters):
+    """
+    Yields the bits of sdm_dac() one block of block_size audio samples at a time.
+    """
+    model = SDM_dac_model(order, **parameters)
+    for start in range(0, len(audio_data), block_size):
+        chunk = np.asarray(audio_data[start:start + block_size], dtype=np.int64)
+        yield model.process(np.repeat(chunk, oversampling_factor))["bits"]
+
+def sdm_dac(audio_data, order=1, oversampling_factor=64, packed=False, block_size=65536, **parameters):
+    """
+    Bit-exact sdm_out of the DAC for audio_data, every sample held for oversampling_factor valid cycles.
+
+    Args:
+        audio_data (array-like): 16-bit audio samples, an np.memmap is read block by block.
+        order (int): 1 for sdm_dac_1st, 2 for sdm_dac_2nd.
+        oversampling_factor (int): Clock cycles per audio sample.
+        packed (bool): Return an SDM_bitstream instead of a uint8 array.
+        block_size (int): Number of audio samples modelled at once.
+        **parameters: dac_bw, bw_ext, osr and backend of SDM_dac_model.
+
+    Returns:
+        array: dout_r after every cycle (0 or 1).
+    """
+    num_bits = len(audio_data) * oversampling_factor
+    sdm_signal = SDM_bitstream.empty(num_bits) if packed else np.empty(num_bits, dtype=np.uint8)
+    position = 0
+    for bits in _dac_blocks(audio_data, order, oversampling_factor, block_size, **parameters):
+        if packed:
+            sdm_signal.write(position, bits)
+        else:
+            sdm_signal[position:position + len(bits)] = bits
+        position += len(bits)
+    return sdm_signal
+
+def sdm_dac_capture(audio_data, order=1, oversampling_factor=64, block_size=65536):
+    """
+    sdm_out as captured by the testbench monitors from the first cycle with valid_out high, see sdm_dac().
+
+    sdm_dac_2nd drives valid_out from valid_in, so its first captured bit is still the reset value of
+    dout_r and the stream is one cycle late compared to sdm_dac_1st.
+
+    Returns:
+        SDM_bitstream: The expected capture, len(audio_data) * oversampling_factor bits.
+    """
+    num_bits = len(audio_data) * oversampling_factor
+    capture = SDM_bitstream.empty(num_bits)
+    # The reset value 0 is already in place
+    position = 1 if order == 2 else 0
+    for bits in _dac_blocks(audio_data, order, oversampling_factor, block_size):
+        bits = bits[:num_bits - position]
+        capture.write(position, bits)
+        position += len(bits)
+    return capture
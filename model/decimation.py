@@ -0,0 +1,255 @@
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy.signal import firwin, firwin2, kaiserord, resample_poly
+
+from model.bitstream import SDM_bitstream
+
+# Bump when the design procedure changes so that stale on-disk designs are ignored
+DESIGN_VERSION = 1
+# Default on-disk cache, disabled when the variable is not set
+FILTER_CACHE_ENV = "SDM_FILTER_CACHE"
+
+@functools.lru_cache(maxsize=128)
+def cached_firwin(num_taps, cutoff, window="hamming"):
+    """
+    Memoised scipy.signal.firwin, the returned taps are read-only.
+    """
+    taps = firwin(num_taps, cutoff, window=window)
+    taps.setflags(write=False)
+    return taps
+
+def cic_response(freqs, input_rate, factor, order):
+    """
+    Magnitude response of a CIC decimator (normalised to unity DC gain) at freqs (Hz).
+    """
+    x = np.pi * np.asarray(freqs, dtype=np.float64) / input_rate
+    with np.errstate(invalid="ignore", divide="ignore"):
+        response = np.sin(x * factor) / (factor * np.sin(x))
+    return np.abs(np.where(x == 0, 1.0, response)) ** order
+
+def _odd(num_taps):
+    return num_taps + 1 - num_taps % 2
+
+def _symmetric_multiplies(taps):
+    """
+    Multiplies per output of a linear-phase FIR: zero taps are skipped and symmetric pairs share one multiply.
+    """
+    return -(-int(np.count_nonzero(np.abs(taps) > 1e-12)) // 2)
+
+def _design_halfband(rate, passband, attenuation_db):
+    width = (rate / 2 - 2 * passband) / (rate / 2)
+    num_taps, beta = kaiserord(attenuation_db, width)
+    num_taps = max(num_taps, 3)
+    num_taps += (3 - num_taps % 4) % 4  # 4k + 3 keeps the outermost taps non-zero
+    return firwin(num_taps, 0.5, window=("kaiser", beta))
+
+def _design_compensator(rate, factor, passband, stopband, attenuation_db, cic):
+    width = (stopband - passband) / (rate / 2)
+    num_taps, beta = kaiserord(attenuation_db, width)
+    num_taps = _odd(max(num_taps, 3))
+    if factor == 1 and cic is None:
+        return None
+    freqs = np.linspace(0, passband, 32)
+    gains = np.ones_like(freqs)
+    if cic is not None:
+        gains = 1 / cic_response(freqs * 1.0, *cic)
+    freqs = np.concatenate((freqs, [stopband, rate / 2]))
+    gains = np.concatenate((gains, [0.0, 0.0]))
+    return firwin2(num_taps, freqs, gains, fs=rate, window=("kaiser", beta))
+
+class SDM_decimation_plan():
+    """
+    Multistage decimator: optional CIC, then halfband (decimate-by-2) stages, then a final FIR
+    that also compensates the CIC droop.
+
+    stages is a list of dicts with "type" ("cic", "halfband" or "fir"), "factor", "rate" (input rate
+    of the stage), "taps" for the FIR stages, "order" for the CIC and "multiplies" per stage output.
+    """
+    def __init__(self, spec, stages):
+        self.spec = spec
+        self.stages = stages
+        for stage in stages:
+            if "taps" in stage:
+                stage["taps"] = np.asarray(stage["taps"], dtype=np.float64)
+                stage["taps"].setflags(write=False)
+
+    def __repr__(self):
+        description = " -> ".join(f"{stage['type']}/{stage['factor']}" for stage in self.stages)
+        return f"SDM_decimation_plan({description}, {self.multiplies_per_output:.1f} mult/output)"
+
+    @property
+    def multiplies_per_output(self):
+        """
+        Multiplies per final output sample, a stage running at rate r costs multiplies * r / output_rate.
+        """
+        total = 0.0
+        later_factor = 1
+        for stage in reversed(self.stages):
+            total += stage["multiplies"] * later_factor
+            later_factor *= stage["factor"]
+        return total
+
+    def apply(self, sdm_signal):
+        """
+        Runs the cascade over a whole bitstream.
+
+        Args:
+            sdm_signal (SDM_bitstream or array-like): 0/1 bits at the input rate.
+
+        Returns:
+            np.ndarray: float64 samples at the output rate, ceil(len / total factor) of them.
+        """
+        if isinstance(sdm_signal, SDM_bitstream):
+            signal = sdm_signal.to_bipolar()
+        else:
+            signal = 2 * np.asarray(sdm_signal, dtype=np.int8) - 1
+        num_outputs = -(-len(signal) // self.spec["factor"])
+        for stage in self.stages:
+            if stage["type"] == "cic":
+                factor, order = stage["factor"], stage["order"]
+                # int64 wraparound is harmless here: the comb sections undo it (Hogenauer)
+                integrated = signal.astype(np.int64)
+                for _ in range(order):
+                    integrated = np.cumsum(integrated)
+                combed = integrated[factor - 1::factor]
+                for _ in range(order):
+                    combed = np.diff(combed, prepend=0)
+                delay = round(order * (factor - 1) / 2 / factor)
+                signal = combed[delay:] / float(factor) ** order
+            else:
+                signal = resample_poly(signal, 1, stage["factor"], window=stage["taps"])
+        return np.pad(signal[:num_outputs], (0, max(0, num_outputs - len(signal))))
+
+def _plan_candidates(spec):
+    """
+    Yields every (cic_factor, halfbands, final_factor) split of the total factor.
+    """
+    factor = spec["factor"]
+    for cic_factor in [1] + [value for value in range(2, factor + 1) if factor % value == 0]:
+        rest = factor // cic_factor
+        halfbands = 0
+        while True:
+            yield cic_factor, halfbands, rest
+            if rest % 2:
+                break
+            rest //= 2
+            halfbands += 1
+
+def _build_plan(spec):
+    input_rate = spec["input_rate"]
+    passband, stopband, attenuation_db = spec["passband"], spec["stopband"], spec["attenuation_db"]
+    best = None
+    for cic_factor, halfbands, final_factor in _plan_candidates(spec):
+        stages = []
+        rate = input_rate
+        cic = None
+        if cic_factor > 1:
+            # Lowest order whose attenuation at the first alias of the passband meets the spec
+            alias = rate / cic_factor - passband
+            orders = [order for order in range(1, 7)
+                      if -20 * np.log10(cic_response(alias, rate, cic_factor, order) + 1e-300) >= attenuation_db]
+            if not orders:
+                continue
+            cic = (rate, cic_factor, orders[0])
+            stages.append({"type": "cic", "factor": cic_factor, "rate": rate, "order": orders[0], "multiplies": 0})
+            rate /= cic_factor
+        feasible = True
+        for _ in range(halfbands):
+            if rate / 2 - 2 * passband <= 0:
+                feasible = False
+                break
+            taps = _design_halfband(rate, passband, attenuation_db)
+            stages.append({"type": "halfband", "factor": 2, "rate": rate, "taps": taps,
+                           "multiplies": _symmetric_multiplies(taps)})
+            rate /= 2
+        if not feasible or stopband >= rate / 2:
+            continue
+        taps = _design_compensator(rate, final_factor, passband, stopband, attenuation_db, cic)
+        if taps is not None:
+            stages.append({"type": "fir", "factor": final_factor, "rate": rate, "taps": taps,
+                           "multiplies": _symmetric_multiplies(taps)})
+        plan = SDM_decimation_plan(spec, stages)
+        if best is None or plan.multiplies_per_output < best.multiplies_per_output:
+            best = plan
+    if best is None:
+        raise ValueError(f"no decimation plan meets {spec}")
+    return best
+
+def _spec_key(spec):
+    text = json.dumps(dict(spec, version=DESIGN_VERSION), sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+def _load_plan(path, spec):
+    with np.load(path, allow_pickle=False) as data:
+        stages = json.loads(str(data["stages"]))
+        for index, stage in enumerate(stages):
+            if f"taps_{index}" in data:
+                stage["taps"] = data[f"taps_{index}"]
+    return SDM_decimation_plan(spec, stages)
+
+def _save_plan(path, plan):
+    arrays = {f"taps_{index}": stage["taps"] for index, stage in enumerate(plan.stages) if "taps" in stage}
+    stages = [{key: value for key, value in stage.items() if key != "taps"} for stage in plan.stages]
+    temporary = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(temporary, stages=json.dumps(stages), **arrays)
+    os.replace(temporary, path)  # atomic, concurrent regressions never see a partial file
+
+def plan_decimation(input_rate, output_rate, passband=None, stopband=None, attenuation_db=90.0, cache_dir=None):
+    """
+    Plans the cheapest CIC / halfband / FIR cascade for a decimation spec.
+
+    Designs are memoised in process and, if cache_dir (or $SDM_FILTER_CACHE) is set, on disk
+    keyed by a hash of the spec. The directory is resolved on every call and is part of the
+    in-process key, so changing the variable takes effect immediately.
+
+    Args:
+        input_rate (int): Rate of the bitstream (e.g., 2.8224 MHz).
+        output_rate (int): Output audio rate (e.g., 44.1 kHz), must divide input_rate.
+        passband (float): Passband edge in Hz, 0.45 * output_rate if None.
+        stopband (float): Stopband edge in Hz, output_rate / 2 if None.
+        attenuation_db (float): Minimum stopband (and alias) attenuation.
+        cache_dir (str): Directory of the on-disk cache.
+
+    Returns:
+        SDM_decimation_plan: The plan with the fewest multiplies per output sample.
+    """
+    return _plan_decimation(input_rate, output_rate, passband, stopband, attenuation_db,
+                            cache_dir or os.environ.get(FILTER_CACHE_ENV) or None)
+
+@functools.lru_cache(maxsize=32)
+def _plan_decimation(input_rate, output_rate, passband, stopband, attenuation_db, cache_dir):
+    if input_rate % output_rate:
+        raise ValueError(f"input_rate {input_rate} is not an integer multiple of output_rate {output_rate}")
+    spec = {"input_rate": input_rate, "factor": input_rate // output_rate,
+            "passband": 0.45 * output_rate if passband is None else passband,
+            "stopband": output_rate / 2 if stopband is None else stopband,
+            "attenuation_db": attenuation_db}
+    path = os.path.join(cache_dir, f"decimation_{_spec_key(spec)}.npz") if cache_dir else None
+    if path and os.path.exists(path):
+        return _load_plan(path, spec)
+    plan = _build_plan(spec)
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_plan(path, plan)
+    return plan
+
+def sigma_delta_demodulator_multistage(sdm_signal, target_rate, sample_rate, **spec):
+    """
+    Demodulates a Sigma-Delta modulated signal with the planned multistage decimator.
+
+    Args:
+        sdm_signal (SDM_bitstream or array-like): 1-bit Sigma-Delta modulated signal with values 0 and 1.
+        target_rate (int): The sampling rate of the modulated signal (e.g., 2.8224 MHz).
+        sample_rate (int): The desired output sampling rate (e.g., 44.1 kHz).
+        **spec: passband, stopband, attenuation_db and cache_dir of plan_decimation().
+
+    Returns:
+        array: Demodulated audio signal at the original sampling rate (16-bit).
+    """
+    demodulated_signal = plan_decimation(target_rate, sample_rate, **spec).apply(sdm_signal)
+    demodulated_signal = np.clip(demodulated_signal, -1, 1)
+    return (demodulated_signal * 32767).astype(np.int16)
@@ -0,0 +1,206 @@
+import numpy as np
+from scipy.signal import upfirdn
+
+try:
+    import numba
+except ImportError:  # numba is optional, the NumPy loop over window bytes is always available
+    numba = None
+
+from model.bitstream import SDM_bitstream
+from model.decimation import cached_firwin
+
+# Idle pattern of a 1-bit stream (alternating bits), used as history before the first and after the last bit
+IDLE_BYTE = 0x55
+
+def design_demodulator_taps(target_rate, sample_rate, num_taps=64):
+    """
+    Designs the single FIR equivalent to sigma_delta_demodulator_fir(): the num_taps low-pass followed by
+    the zero-phase Hamming FIR used by scipy.signal.decimate.
+
+    Args:
+        target_rate (int): The sampling rate of the modulated signal (e.g., 2.8224 MHz).
+        sample_rate (int): The desired output sampling rate (e.g., 44.1 kHz).
+        num_taps (int): Number of taps of the first low-pass filter.
+
+    Returns:
+        tuple: The taps and the delay (in input samples) that centres the decimation filter.
+    """
+    decimation_factor = target_rate // sample_rate
+    low_pass = cached_firwin(num_taps, sample_rate / target_rate)
+    half_len = 10 * decimation_factor
+    anti_alias = cached_firwin(2 * half_len + 1, 1. / decimation_factor, window='hamming')
+    return np.convolve(low_pass, anti_alias), half_len
+
+def _lookup_sum_numpy(buffer, lookup_tables, first, frame_bytes, demodulated_signal):
+    """
+    Adds the table entries of every window byte, one strided gather per byte position.
+    """
+    span = (len(demodulated_signal) - 1) * frame_bytes + 1
+    for byte_index in range(lookup_tables.shape[0]):
+        start = first + byte_index
+        demodulated_signal += lookup_tables[byte_index][buffer[start:start + span:frame_bytes]]
+
+def _lookup_sum(buffer, lookup_tables, first, frame_bytes, demodulated_signal):
+    """
+    Adds the table entries of every window byte, meant to be compiled with numba.
+    """
+    for output in range(demodulated_signal.shape[0]):
+        start = first + output * frame_bytes
+        accumulator = 0.0
+        for byte_index in range(lookup_tables.shape[0]):
+            accumulator += lookup_tables[byte_index, buffer[start + byte_index]]
+        demodulated_signal[output] += accumulator
+
+lookup_sum = numba.njit(cache=True, nogil=True)(_lookup_sum) if numba is not None else _lookup_sum_numpy
+
+def _to_pcm(demodulated_signal):
+    """
+    Scales back to 16-bit integer range (-32768 to 32767) the same way as sigma_delta_demodulator_fir().
+    """
+    demodulated_signal = np.clip(demodulated_signal, -1, 1)
+    return (demodulated_signal * 32767).astype(np.int16)
+
+class SDM_demodulator():
+    """
+    Streaming polyphase decimating demodulator for packed 1-bit streams.
+
+    Output m is y[m] = sum_j taps[j] * x[m * D + delay - j] with x mapped to -1/+1, only the kept
+    outputs are computed. The taps are grouped by byte: for every byte position of the window a
+    256-entry table holds the partial sum of its 8 taps, so an output costs one lookup and one
+    addition per input byte and no multiply per bit. Only the window history is kept between calls.
+    """
+    def __init__(self, target_rate, sample_rate, num_taps=64, taps=None, delay=None):
+        self.decimation_factor = target_rate // sample_rate
+        if self.decimation_factor % 8:
+            raise ValueError(f"decimation factor {self.decimation_factor} is not a multiple of 8 bits")
+        if taps is None:
+            taps, delay = design_demodulator_taps(target_rate, sample_rate, num_taps)
+        delay = len(taps) - 1 if delay is None else delay
+
+        # Pad the taps at the front so that every window ends on a byte boundary, then to whole bytes
+        front = -(delay + 1) % 8
+        taps = np.concatenate((np.zeros(front), taps))
+        taps = np.concatenate((taps, np.zeros(-len(taps) % 8)))
+        window_bytes = len(taps) // 8
+        # window_end: first byte after the window of output 0
+        self.window_end = (delay + front + 1) // 8
+        self.frame_bytes = self.decimation_factor // 8
+        self.window_bytes = window_bytes
+
+        # Byte q of a window holds x[start + 8q .. start + 8q + 7], MSB first; taps run backwards in time
+        bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1) * 2.0 - 1
+        reversed_taps = taps[::-1].reshape(window_bytes, 8)
+        self.lookup_tables = reversed_taps @ bits.T  # (window_bytes, 256)
+        self.reset()
+
+    def reset(self):
+        # Idle bytes in front of the stream so that the first windows start at a non-negative index
+        history = max(0, self.window_bytes - self.window_end)
+        self.offset = history
+        self.buffer = np.full(history, IDLE_BYTE, dtype=np.uint8)
+        # Absolute byte index (in the padded stream) of buffer[0], and the next output to produce
+        self.base = 0
+        self.next_output = 0
+        self.bytes_in = 0
+        # Trailing bits of the last block that do not fill a byte yet (at most 7)
+        self.pending_bits = np.zeros(0, dtype=np.uint8)
+
+    def _start_of(self, output):
+        """
+        Index in the padded stream of the first byte of an output window.
+        """
+        return output * self.frame_bytes + self.window_end - self.window_bytes + self.offset
+
+    def process(self, sdm_signal):
+        """
+        Consumes a block of the bitstream and returns the outputs whose windows are complete.
+
+        Blocks may have any length: bits that do not fill a whole byte are kept and put in front of the
+        next block, flush() completes them with idle bits.
+
+        Args:
+            sdm_signal (SDM_bitstream or array-like): Packed bitstream or 0/1 bits.
+
+        Returns:
+            np.ndarray: float64 demodulated samples in [-1, 1] scale (not clipped).
+        """
+        if isinstance(sdm_signal, SDM_bitstream) and not len(self.pending_bits) and not sdm_signal.num_bits % 8:
+            packed = sdm_signal.packed[:sdm_signal.num_bits // 8]
+        else:
+            if isinstance(sdm_signal, SDM_bitstream):
+                sdm_signal = sdm_signal.to_bits()
+            bits = np.concatenate((self.pending_bits, np.asarray(sdm_signal, dtype=np.uint8).ravel()))
+            whole = len(bits) - len(bits) % 8
+            packed = np.packbits(bits[:whole])
+            self.pending_bits = bits[whole:]
+        return self._consume(packed)
+
+    def _consume(self, packed):
+        self.bytes_in += len(packed)
+        self.buffer = np.concatenate((self.buffer, packed))
+
+        available = self.base + len(self.buffer)
+        # output m is ready when _start_of(m) + window_bytes <= available
+        last = (available - self.window_bytes - self._start_of(0)) // self.frame_bytes
+        count = max(0, last - self.next_output + 1)
+        demodulated_signal = np.zeros(count)
+        if count:
+            first = self._start_of(self.next_output) - self.base
+            lookup_sum(self.buffer, self.lookup_tables, first, self.frame_bytes, demodulated_signal)
+            self.next_output += count
+        keep_from = self._start_of(self.next_output) - self.base
+        self.buffer = self.buffer[keep_from:]
+        self.base += keep_from
+        return demodulated_signal
+
+    def flush(self, num_outputs):
+        """
+        Pads the stream with idle bytes until num_outputs samples have been produced in total.
+        """
+        missing = num_outputs - self.next_output
+        if missing <= 0:
+            return np.zeros(0)
+        if len(self.pending_bits):
+            # The pending bits, then the idle pattern up to the byte boundary
+            tail_mask = 0xFF >> len(self.pending_bits)
+            tail = (int(np.packbits(self.pending_bits)[0]) & ~tail_mask & 0xFF) | (IDLE_BYTE & tail_mask)
+            self.pending_bits = np.zeros(0, dtype=np.uint8)
+            head = self._consume(np.array([tail], dtype=np.uint8))
+            return np.concatenate((head, self.flush(num_outputs)))[:missing]
+        padding = self._start_of(num_outputs - 1) + self.window_bytes - (self.base + len(self.buffer))
+        return self.process(SDM_bitstream(np.full(max(padding, 0), IDLE_BYTE, dtype=np.uint8)))[:missing]
+
+def sigma_delta_demodulator_polyphase(sdm_signal, target_rate, sample_rate, num_taps=64, block_bits=1 << 20):
+    """
+    Demodulates a Sigma-Delta modulated signal with the polyphase lookup-table FIR.
+
+    Same filter and output length as sigma_delta_demodulator_fir(), but only the kept outputs
+    are computed and a packed input is never unpacked.
+
+    Args:
+        sdm_signal (SDM_bitstream or array-like): 1-bit Sigma-Delta modulated signal with values 0 and 1.
+        target_rate (int): The sampling rate of the modulated signal (e.g., 2.8224 MHz).
+        sample_rate (int): The desired output sampling rate (e.g., 44.1 kHz).
+        num_taps (int): Number of taps for the FIR filter.
+        block_bits (int): Bits consumed per step.
+
+    Returns:
+        array: Demodulated audio signal at the original sampling rate (16-bit).
+    """
+    decimation_factor = target_rate // sample_rate
+    num_outputs = -(-len(sdm_signal) // decimation_factor)
+    if decimation_factor % 8:
+        # Not byte-aligned: fall back to upfirdn, which also computes only the kept outputs
+        taps, delay = design_demodulator_taps(target_rate, sample_rate, num_taps)
+        sdm_signal = 2 * np.asarray(sdm_signal, dtype=np.int8) - 1
+        demodulated_signal = upfirdn(taps, np.concatenate((sdm_signal, np.zeros(delay))), down=decimation_factor)
+        first = -(-delay // decimation_factor)
+        return _to_pcm(demodulated_signal[first:first + num_outputs])
+
+    demodulator = SDM_demodulator(target_rate, sample_rate, num_taps)
+    if not isinstance(sdm_signal, SDM_bitstream):
+        sdm_signal = SDM_bitstream.from_bits(sdm_signal)
+    blocks = [demodulator.process(sdm_signal[start:start + block_bits])
+              for start in range(0, len(sdm_signal), block_bits - block_bits % 8)]
+    blocks.append(demodulator.flush(num_outputs))
+    return _to_pcm(np.concatenate(blocks)[:num_outputs])
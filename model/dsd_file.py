@@ -0,0 +1,143 @@
+import struct
+import numpy as np
+
+from model.bitstream import SDM_bitstream
+
+# Reverses the bit order of a byte, DSF stores 1-bit samples LSB-first
+_BIT_REVERSE_LUT = np.packbits(np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)[:, ::-1], axis=1).ravel()
+
+class _DSD_writer():
+    """
+    Common part of the streaming DSD file writers.
+
+    Bits are packed per channel as they arrive and appended to the file through short-lived
+    np.memmap windows, so only the pending bytes of the current write are held in memory.
+    The header is written with placeholder sizes and patched on close().
+    """
+    def __init__(self, path, sample_rate, channels=1):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.num_bits = 0
+        self._pending_bits = np.zeros((channels, 0), dtype=np.uint8)
+        self._pending_bytes = np.zeros((channels, 0), dtype=np.uint8)
+        self._file = open(path, "w+b")
+        self._file.write(self._header())
+        self.data_offset = self._file.tell()
+        self.data_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, sdm_signal):
+        """
+        Appends bits to every channel.
+
+        Args:
+            sdm_signal (array-like or SDM_bitstream): 0/1 bits, shape (bits,) for mono or (channels, bits).
+        """
+        if isinstance(sdm_signal, SDM_bitstream):
+            for block in sdm_signal.iter_blocks():
+                self.write(block)
+            return
+        bits = np.asarray(sdm_signal, dtype=np.uint8).reshape(self.channels, -1)
+        self.num_bits += bits.shape[1]
+        bits = np.concatenate((self._pending_bits, bits), axis=1)
+        whole_bytes = bits.shape[1] // 8 * 8
+        self._pending_bits = bits[:, whole_bytes:]
+        self._pending_bytes = np.concatenate((self._pending_bytes, np.packbits(bits[:, :whole_bytes], axis=1)), axis=1)
+        self._flush(final=False)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._pending_bits.shape[1]:
+            self._pending_bytes = np.concatenate((self._pending_bytes, np.packbits(self._pending_bits, axis=1)), axis=1)
+            self._pending_bits = self._pending_bits[:, :0]
+        self._flush(final=True)
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+    def _append(self, data):
+        """
+        Appends raw bytes after the current end of the data chunk through a memory map.
+        """
+        if not len(data):
+            return
+        offset = self.data_offset + self.data_size
+        self._file.truncate(offset + len(data))
+        self._file.flush()
+        window = np.memmap(self._file, dtype=np.uint8, mode="r+", offset=offset, shape=(len(data),))
+        window[:] = data
+        window.flush()
+        del window
+        self.data_size += len(data)
+
+class DSF_writer(_DSD_writer):
+    """
+    Streaming writer of Sony DSF files (1 bit per sample, LSB-first, 4096-byte channel blocks).
+    """
+    block_size = 4096
+
+    def _flush(self, final):
+        full_blocks = self._pending_bytes.shape[1] // self.block_size
+        if final and self._pending_bytes.shape[1] % self.block_size:
+            padding = self.block_size - self._pending_bytes.shape[1] % self.block_size
+            self._pending_bytes = np.pad(self._pending_bytes, ((0, 0), (0, padding)))
+            full_blocks += 1
+        if not full_blocks:
+            return
+        used = full_blocks * self.block_size
+        blocks = self._pending_bytes[:, :used].reshape(self.channels, full_blocks, self.block_size)
+        # Channel blocks are interleaved: block 0 of every channel, then block 1, ...
+        self._append(_BIT_REVERSE_LUT[blocks.transpose(1, 0, 2)].ravel())
+        self._pending_bytes = self._pending_bytes[:, used:]
+
+    def _header(self):
+        channel_type = {1: 1, 2: 2, 3: 3, 4: 4, 5: 6, 6: 7}.get(self.channels, 0)
+        data_chunk_size = 12 + getattr(self, "data_size", 0)
+        file_size = 28 + 52 + data_chunk_size
+        header = b"DSD " + struct.pack("<QQQ", 28, file_size, 0)
+        header += b"fmt " + struct.pack("<QIIIIIIQI4x", 52, 1, 0, channel_type, self.channels,
+                                        self.sample_rate, 1, self.num_bits, self.block_size)
+        header += b"data" + struct.pack("<Q", data_chunk_size)
+        return header
+
+class DFF_writer(_DSD_writer):
+    """
+    Streaming writer of Philips DSDIFF files (uncompressed DSD, byte-interleaved channels, MSB-first).
+    """
+    channel_ids = {1: [b"C   "], 2: [b"SLFT", b"SRGT"]}
+
+    def _flush(self, final):
+        # Byte interleaving: byte n of every channel, then byte n + 1, ...
+        self._append(self._pending_bytes.T.ravel())
+        self._pending_bytes = self._pending_bytes[:, :0]
+
+    def _header(self):
+        data_size = getattr(self, "data_size", 0)
+        ids = self.channel_ids.get(self.channels, [f"C{index:03d}".encode() for index in range(self.channels)])
+        chnl = struct.pack(">H", self.channels) + b"".join(ids)
+        cmpr = b"DSD " + bytes([14]) + b"not compressed" + b"\x00"
+        prop = (b"SND "
+                + b"FS  " + struct.pack(">QI", 4, self.sample_rate)
+                + b"CHNL" + struct.pack(">Q", len(chnl)) + chnl
+                + b"CMPR" + struct.pack(">Q", len(cmpr)) + cmpr)
+        body = (b"DSD "
+                + b"FVER" + struct.pack(">QI", 4, 0x01050000)
+                + b"PROP" + struct.pack(">Q", len(prop)) + prop
+                + b"DSD " + struct.pack(">Q", data_size))
+        frm8_size = len(body) + data_size + data_size % 2
+        return b"FRM8" + struct.pack(">Q", frm8_size) + body
+
+    def close(self):
+        closed = self._file.closed
+        super().close()
+        # DSDIFF chunks are padded to an even length
+        if not closed and self.data_size % 2:
+            with open(self.path, "ab") as dff_file:
+                dff_file.write(b"\x00")
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from model.bitstream import SDM_bitstream
+from model.SDM import convert_audio_to_sdm
+from model.dac_models import sdm_dac_capture
+from model.stimulus import SDM_stimulus
+from model.trace import get_logger
+
+log = get_logger("golden")
+
+# Bump when a model changes its output so that stale golden vectors are never reused
+MODEL_VERSION = 1
+# Directory of the on-disk cache, disabled when the variable is not set
+GOLDEN_CACHE_ENV = "SDM_GOLDEN_CACHE"
+# Size bound of the cache in MiB, least recently used entries are evicted above it
+GOLDEN_CACHE_SIZE_ENV = "SDM_GOLDEN_CACHE_MB"
+DEFAULT_CACHE_MB = 1024
+# Stimulus samples hashed at once
+HASH_BLOCK = 1 << 20
+
+def golden_key(stimulus, **parameters):
+    """
+    Content hash of a stimulus and the model parameters, MODEL_VERSION included.
+
+    Args:
+        stimulus (array-like or SDM_stimulus): The model input, hashed with its dtype and shape. A
+            stimulus hashes like its int16 samples.
+        **parameters: JSON-serialisable model parameters (order, rates, ...).
+
+    Returns:
+        str: 32 hex digits.
+    """
+    if isinstance(stimulus, SDM_stimulus):
+        blocks = stimulus.blocks()
+    else:
+        stimulus = np.asarray(stimulus)
+        flat = stimulus.reshape(-1)
+        blocks = (flat[start:start + HASH_BLOCK] for start in range(0, len(flat), HASH_BLOCK))
+    digest = hashlib.sha256()
+    digest.update(json.dumps(dict(parameters, version=MODEL_VERSION, dtype=stimulus.dtype.str,
+                                  shape=stimulus.shape), sort_keys=True).encode())
+    # Block by block, a memory-mapped recording is never copied and a generator never rendered as a whole
+    for block in blocks:
+        digest.update(np.ascontiguousarray(block))
+    return digest.hexdigest()[:32]
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class SDM_golden_cache():
+    """
+    Content-addressed store of model outputs shared by concurrent simulations.
+
+    An entry is one packed .npy file per output (<key>.<name>.npy) and a <key>.json manifest with
+    the bit counts. Every file is written to a temporary name and renamed, the manifest last, so
+    a reader sees either a complete entry or none. Hits are returned as SDM_bitstreams over
+    read-only np.memmaps and refresh the manifest mtime, which orders the LRU eviction.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MB << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, name=None):
+        return os.path.join(self.directory, f"{key}.json" if name is None else f"{key}.{name}.npy")
+
+    def get(self, key):
+        """
+        Returns:
+            dict: {name: SDM_bitstream} of the entry, None on a miss.
+        """
+        try:
+            with open(self._path(key)) as manifest_file:
+                manifest = json.load(manifest_file)
+            outputs = {name: SDM_bitstream(np.load(self._path(key, name), mmap_mode="r"), num_bits)
+                       for name, num_bits in manifest["outputs"].items()}
+            os.utime(self._path(key))
+        except (FileNotFoundError, ValueError, KeyError):
+            # Missing, being evicted by another run or written by an incompatible version
+            return None
+        return outputs
+
+    def put(self, key, outputs):
+        """
+        Stores the outputs of one key and evicts old entries above max_bytes.
+
+        Args:
+            key (str): See golden_key().
+            outputs (dict): {name: SDM_bitstream}.
+        """
+        suffix = f"{os.getpid()}.tmp"
+        for name, bitstream in outputs.items():
+            temporary = f"{self._path(key, name)}.{suffix}.npy"
+            np.save(temporary, np.asarray(bitstream.packed, dtype=np.uint8))
+            os.replace(temporary, self._path(key, name))
+        temporary = f"{self._path(key)}.{suffix}"
+        with open(temporary, "w") as manifest_file:
+            json.dump({"version": MODEL_VERSION, "outputs": {name: len(bitstream) for name, bitstream in outputs.items()}},
+                      manifest_file)
+        os.replace(temporary, self._path(key))  # atomic, the entry becomes visible here
+        self.evict()
+
+    def entries(self):
+        """
+        Returns:
+            list: (last use, size in bytes, key) of every complete entry, least recently used first.
+        """
+        sizes, used = {}, {}
+        for file_name in os.listdir(self.directory):
+            if ".tmp" in file_name:
+                continue
+            key = file_name.split(".", 1)[0]
+            try:
+                status = os.stat(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                continue
+            sizes[key] = sizes.get(key, 0) + status.st_size
+            if file_name.endswith(".json"):
+                used[key] = status.st_mtime
+        return sorted((used[key], sizes[key], key) for key in used)
+
+    def evict(self, max_bytes=None):
+        """
+        Removes least recently used entries until the cache holds at most max_bytes.
+
+        Open memmaps of an evicted entry stay valid, the manifest goes first so no new reader picks it up.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= max_bytes:
+                break
+            manifest_path = self._path(key)
+            try:
+                with open(manifest_path) as manifest_file:
+                    names = list(json.load(manifest_file)["outputs"])
+            except (FileNotFoundError, ValueError, KeyError):
+                names = []
+            _remove(manifest_path)
+            for name in names:
+                _remove(self._path(key, name))
+            total -= size
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached outputs of key, or runs compute() and stores its {name: SDM_bitstream}.
+        """
+        outputs = self.get(key)
+        if outputs is None:
+            outputs = compute()
+            self.put(key, outputs)
+        return outputs
+
+def default_golden_cache():
+    """
+    The cache at $SDM_GOLDEN_CACHE bounded by $SDM_GOLDEN_CACHE_MB, None if the variable is not set.
+    """
+    directory = os.environ.get(GOLDEN_CACHE_ENV)
+    if not directory:
+        return None
+    return SDM_golden_cache(directory, int(float(os.environ.get(GOLDEN_CACHE_SIZE_ENV, DEFAULT_CACHE_MB)) * (1 << 20)))
+
+def golden_outputs(audio_data, order, sample_rate, target_rate, cache=None):
+    """
+    Golden vectors of the testbench model wrappers, from the cache when possible.
+
+    Args:
+        audio_data (array-like or SDM_stimulus): 16-bit stimulus driven into the DAC, a stimulus is
+            rendered block by block as the models consume it.
+        order (int): Order of the modulator.
+        sample_rate (int): Audio rate.
+        target_rate (int): Bitstream rate.
+        cache (SDM_golden_cache): Cache to use, default_golden_cache() if None.
+
+    Returns:
+        dict: "sdm_signal" (behavioural model) and "dac_signal" (bit-exact sdm_out capture), both SDM_bitstreams.
+    """
+    if not isinstance(audio_data, SDM_stimulus):
+        audio_data = np.asarray(audio_data, dtype=np.int16)  # an np.memmap stays memory-mapped
+    oversampling_factor = target_rate // sample_rate
+
+    def compute():
+        log.info("golden %s: not cached, running the models", key)
+        return {"sdm_signal": convert_audio_to_sdm(audio_data, sample_rate, target_rate, order, packed=True),
+                "dac_signal": sdm_dac_capture(audio_data, order, oversampling_factor)}
+
+    key = golden_key(audio_data, order=int(order), sample_rate=int(sample_rate), target_rate=int(target_rate),
+                     interpolation="hold")
+    cache = default_golden_cache() if cache is None else cache
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(key, compute)
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy.signal import firwin
+
+INTERPOLATIONS = ("hold", "linear", "polyphase")
+
+def get_oversampling_factor(sample_rate, target_rate):
+    """
+    Computes the integer oversampling factor between the PCM and the modulator rate.
+
+    Args:
+        sample_rate (int): Sample rate of the PCM input (e.g., 44.1 kHz).
+        target_rate (int): Sample rate of the modulator (e.g., 2.8224 MHz).
+
+    Returns:
+        int: target_rate // sample_rate.
+    """
+    if sample_rate <= 0 or target_rate % sample_rate != 0:
+        raise ValueError(f"target_rate {target_rate} is not an integer multiple of sample_rate {sample_rate}")
+    return int(target_rate // sample_rate)
+
+def zero_order_hold(audio_data, oversampling_factor):
+    """
+    Zero-order hold as a read-only broadcast view, nothing is copied.
+
+    Args:
+        audio_data (array-like): PCM samples at the input rate.
+        oversampling_factor (int): Number of times each sample is held.
+
+    Returns:
+        np.ndarray: View of shape (len(audio_data), oversampling_factor), row n holds audio_data[n].
+    """
+    audio_data = np.asarray(audio_data)
+    return np.broadcast_to(audio_data[:, None], (len(audio_data), oversampling_factor))
+
+class Oversampler():
+    """
+    Block-wise interpolator from the PCM rate to the modulator rate.
+
+    "hold" repeats every sample, "linear" ramps from the previous sample to the current one
+    and "polyphase" runs a windowed-sinc FIR split into oversampling_factor phases.
+    The filter history is kept between blocks, so the working memory is O(block + taps).
+    Chunks of shape (channels, samples) are interpolated along the last axis.
+    """
+    def __init__(self, oversampling_factor, interpolation="hold", taps_per_phase=16):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"interpolation must be one of {INTERPOLATIONS}, got {interpolation}")
+        self.oversampling_factor = oversampling_factor
+        self.interpolation = interpolation
+        self.taps_per_phase = taps_per_phase
+        if interpolation == "polyphase":
+            prototype = firwin(taps_per_phase * oversampling_factor, 1 / oversampling_factor) * oversampling_factor
+            # phases[p] produces output p of every input sample
+            self.phases = prototype.reshape(taps_per_phase, oversampling_factor).T.copy()
+        self.reset()
+
+    def reset(self):
+        self.previous = None
+        self.history = None
+
+    def process(self, chunk):
+        """
+        Oversamples one PCM chunk along its last axis.
+
+        Args:
+            chunk (array-like): PCM samples at the input rate, (samples,) or (channels, samples).
+
+        Returns:
+            np.ndarray: int64 samples at the modulator rate, oversampling_factor per input sample.
+        """
+        chunk = np.asarray(chunk)
+        if self.interpolation == "hold":
+            return np.repeat(chunk.astype(np.int64), self.oversampling_factor, axis=-1)
+
+        if self.interpolation == "linear":
+            if self.previous is None:
+                self.previous = np.zeros(chunk.shape[:-1])
+            previous = np.concatenate((self.previous[..., None], chunk[..., :-1]), axis=-1).astype(np.float64)
+            ramp = np.arange(1, self.oversampling_factor + 1) / self.oversampling_factor
+            oversampled = previous[..., None] + (chunk - previous)[..., None] * ramp
+            if chunk.shape[-1]:
+                self.previous = chunk[..., -1]
+        else:
+            if self.history is None:
+                self.history = np.zeros(chunk.shape[:-1] + (self.taps_per_phase - 1,))
+            extended = np.concatenate((self.history, chunk), axis=-1)
+            windows = np.lib.stride_tricks.sliding_window_view(extended, self.taps_per_phase, axis=-1)
+            oversampled = windows @ self.phases[:, ::-1].T
+            self.history = extended[..., extended.shape[-1] - self.history.shape[-1]:]
+
+        oversampled = oversampled.reshape(chunk.shape[:-1] + (-1,))
+        return np.clip(np.rint(oversampled), -32768, 32767).astype(np.int64)
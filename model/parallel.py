@@ -0,0 +1,140 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from scipy.signal import welch
+
+from model.SDM import SDM_modulator, convert_audio_to_sdm
+from model.bitstream import SDM_bitstream
+from model.oversampling import get_oversampling_factor
+
+def _modulate_segment(task):
+    """
+    Worker: modulates audio[..., start - warmup:stop] from zero state and stores the bits of [start, stop).
+
+    Input and output are shared memory blocks, only their names and the segment bounds are pickled.
+    """
+    (input_name, input_shape, input_dtype, output_name, output_shape,
+     start, stop, warmup, order, oversampling_factor, backend, packed) = task
+    input_memory = SharedMemory(name=input_name)
+    output_memory = SharedMemory(name=output_name)
+    try:
+        audio_data = np.ndarray(input_shape, dtype=input_dtype, buffer=input_memory.buf)
+        sdm_signal = np.ndarray(output_shape, dtype=np.uint8, buffer=output_memory.buf)
+        first = max(0, start - warmup)
+        modulator = SDM_modulator(order, oversampling_factor, backend)
+        bits = modulator.process(audio_data[..., first:stop])[..., (start - first) * oversampling_factor:]
+        bit_offset = start * oversampling_factor
+        if packed:
+            packed_bits = np.packbits(bits, axis=-1)
+            sdm_signal[..., bit_offset // 8:bit_offset // 8 + packed_bits.shape[-1]] = packed_bits
+        else:
+            sdm_signal[..., bit_offset:bit_offset + bits.shape[-1]] = bits
+        del audio_data, sdm_signal
+    finally:
+        input_memory.close()
+        output_memory.close()
+    return start
+
+def convert_audio_to_sdm_parallel(audio_data, sample_rate, target_rate, order=1, warmup=64, segment_size=None,
+                                  max_workers=None, backend=None, packed=False):
+    """
+    Segmented Sigma-Delta modulation of long recordings on a process pool.
+
+    Every segment starts from zero integrators `warmup` input samples before its first kept sample,
+    the pre-roll bits are dropped. The result is therefore close to, but not bit-exact with, the
+    serial convert_audio_to_sdm(), see compare_segmented() to tune `warmup`.
+
+    Args:
+        audio_data (array-like): The input 16-bit audio signal, (samples,) or (channels, samples).
+        sample_rate (int): Original sample rate of the audio (44.1 kHz).
+        target_rate (int): Target sample rate (2.8224 MHz).
+        order (int): Order of the sigma delta modulator, available order=1 or order=2
+        warmup (int): Pre-roll length in input samples.
+        segment_size (int): Input samples kept per segment, about four segments per worker if None.
+        max_workers (int): Size of the process pool, os.cpu_count() if None.
+        backend (str): Modulator backend, see model.SDM.MODULATOR_BACKENDS.
+        packed (bool): Return SDM_bitstream(s) instead of a uint8 array.
+
+    Returns:
+        array: Sigma-Delta modulated signal (0 or 1) at target rate, like convert_audio_to_sdm().
+    """
+    audio_data = np.ascontiguousarray(audio_data)
+    oversampling_factor = get_oversampling_factor(sample_rate, target_rate)
+    max_workers = max_workers or os.cpu_count()
+    num_samples = audio_data.shape[-1]
+    num_bits = num_samples * oversampling_factor
+    if segment_size is None:
+        segment_size = max(-(-num_samples // (4 * max_workers)), warmup, 1)
+    if packed:
+        segment_size += -segment_size % 8  # keeps every segment byte-aligned in the packed output
+    output_shape = audio_data.shape[:-1] + ((num_bits + 7) // 8 if packed else num_bits,)
+
+    input_memory = SharedMemory(create=True, size=max(audio_data.nbytes, 1))
+    output_memory = SharedMemory(create=True, size=max(int(np.prod(output_shape)), 1))
+    try:
+        np.ndarray(audio_data.shape, dtype=audio_data.dtype, buffer=input_memory.buf)[...] = audio_data
+        tasks = [(input_memory.name, audio_data.shape, audio_data.dtype.str, output_memory.name, output_shape,
+                  start, min(start + segment_size, num_samples), warmup, order, oversampling_factor, backend, packed)
+                 for start in range(0, num_samples, segment_size)]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_modulate_segment, tasks))
+        sdm_signal = np.ndarray(output_shape, dtype=np.uint8, buffer=output_memory.buf).copy()
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+
+    if packed:
+        if sdm_signal.ndim == 2:
+            return [SDM_bitstream(channel, num_bits) for channel in sdm_signal]
+        return SDM_bitstream(sdm_signal, num_bits)
+    return sdm_signal
+
+def compare_segmented(serial_signal, segmented_signal, sample_rate, target_rate, nperseg=1 << 16):
+    """
+    Measures how far a segmented bitstream is from the serial one.
+
+    Args:
+        serial_signal (array-like or SDM_bitstream): Output of convert_audio_to_sdm().
+        segmented_signal (array-like or SDM_bitstream): Output of convert_audio_to_sdm_parallel().
+        sample_rate (int): Audio sample rate, the band of interest is [0, sample_rate / 2].
+        target_rate (int): Rate of the bitstreams.
+        nperseg (int): Welch segment length.
+
+    Returns:
+        dict: bit_error_rate, in-band power of both streams and of their difference (dB) and
+            the largest per-bin in-band PSD deviation (dB).
+    """
+    serial = np.asarray(serial_signal, dtype=np.float32).ravel() * 2 - 1
+    segmented = np.asarray(segmented_signal, dtype=np.float32).ravel() * 2 - 1
+    nperseg = min(nperseg, len(serial))
+    freqs, psd_serial = welch(serial, target_rate, nperseg=nperseg)
+    _, psd_segmented = welch(segmented, target_rate, nperseg=nperseg)
+    _, psd_difference = welch(segmented - serial, target_rate, nperseg=nperseg)
+    in_band = freqs <= sample_rate / 2
+    tiny = np.finfo(np.float64).tiny
+    return {
+        "bit_error_rate": float(np.mean(serial != segmented)),
+        "in_band_power_serial_db": float(10 * np.log10(np.sum(psd_serial[in_band]) + tiny)),
+        "in_band_power_segmented_db": float(10 * np.log10(np.sum(psd_segmented[in_band]) + tiny)),
+        "in_band_difference_db": float(10 * np.log10(np.sum(psd_difference[in_band]) + tiny)),
+        "max_in_band_psd_deviation_db": float(np.max(np.abs(10 * np.log10((psd_segmented[in_band] + tiny)
+                                                                            / (psd_serial[in_band] + tiny))))),
+    }
+
+def tune_warmup(audio_data, sample_rate, target_rate, order=1, warmups=(0, 16, 64, 256), **kwargs):
+    """
+    Runs the serial and the segmented modulator for every warm-up length.
+
+    Returns:
+        dict: {warmup: compare_segmented() metrics}
+    """
+    serial_signal = convert_audio_to_sdm(audio_data, sample_rate, target_rate, order)
+    return {warmup: compare_segmented(serial_signal,
+                                      convert_audio_to_sdm_parallel(audio_data, sample_rate, target_rate, order,
+                                                                    warmup=warmup, **kwargs),
+                                      sample_rate, target_rate)
+            for warmup in warmups}
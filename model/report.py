@@ -0,0 +1,123 @@
+import html
+import io
+import json
+import os
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from model.stimulus import SDM_stimulus
+
+# Output directory of the reports, the Makefile points it to the sim build directory
+REPORT_DIR_ENV = "SDM_REPORT_DIR"
+# Points per plotted trace, whatever the trace length
+MAX_POINTS = 4000
+
+def _bucket_extremes(values, bucket):
+    """
+    Indices of the minimum and maximum of every bucket of values, in time order.
+    """
+    num_buckets = -(-len(values) // bucket)
+    padded = np.pad(values, (0, num_buckets * bucket - len(values)), mode="edge").reshape(num_buckets, bucket)
+    low, high = padded.argmin(axis=1), padded.argmax(axis=1)
+    index = np.stack((np.minimum(low, high), np.maximum(low, high)), axis=1) + np.arange(num_buckets)[:, None] * bucket
+    return np.minimum(index.ravel(), len(values) - 1)
+
+def envelope(values, x=None, max_points=MAX_POINTS):
+    """
+    Min/max envelope decimation of a long trace.
+
+    The trace is cut into max_points // 2 buckets and every bucket is replaced by its minimum and
+    maximum (in time order), so peaks and the filled area survive while the number of plotted
+    points stays constant. A stimulus is rendered in blocks of whole buckets and never held whole.
+
+    Args:
+        values (array-like, SDM_bitstream or SDM_stimulus): The trace.
+        x (array-like): Abscissa of every value, the sample index if None.
+        max_points (int): Upper bound of the returned length.
+
+    Returns:
+        tuple: x and values of at most max_points points.
+    """
+    if isinstance(values, SDM_stimulus) and len(values) > max_points:
+        bucket = -(-len(values) // (max_points // 2))
+        block_size = bucket * max(1, values.block_size // bucket)
+        index, picked = [], []
+        for start, block in zip(range(0, len(values), block_size), values.blocks(block_size)):
+            extremes = _bucket_extremes(block.astype(np.float64), bucket)
+            index.append(extremes + start)
+            picked.append(block[extremes].astype(np.float64))
+        index = np.concatenate(index)
+        return (index if x is None else np.asarray(x)[index]), np.concatenate(picked)
+    if isinstance(values, SDM_stimulus):
+        values = values.read()
+    values = np.asarray(values, dtype=np.float64)
+    x = np.arange(len(values)) if x is None else np.asarray(x)
+    if len(values) <= max_points:
+        return x, values
+    index = _bucket_extremes(values, -(-len(values) // (max_points // 2)))
+    return x[index], values[index]
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+def write_report(name, panels, metrics=None, directory=None, formats=("png", "svg", "html"), layout=None):
+    """
+    Renders a report without a display: images, an HTML page and a JSON summary of the metrics.
+
+    Args:
+        name (str): Base name of the files.
+        panels (list): One dict per subplot with "title", "series" (list of dicts with "y" and optional
+            "x", "label", "color"), optional "step" for bitstreams and "xscale" ("log" for spectra).
+        metrics (dict): Comparison metrics, written to <name>.json and into the HTML page.
+        directory (str): Output directory, $SDM_REPORT_DIR or sim_build if None.
+        formats (tuple): Any of "png", "svg" and "html".
+        layout (tuple): (rows, cols) of the subplots, one column if None.
+
+    Returns:
+        dict: {format: path} of the written files, "json" included.
+    """
+    directory = directory or os.environ.get(REPORT_DIR_ENV) or "sim_build"
+    os.makedirs(directory, exist_ok=True)
+    rows, cols = layout or (len(panels), 1)
+    figure = Figure(figsize=(5 * cols, 3 * rows))
+    axes = figure.subplots(rows, cols, squeeze=False)
+    for axis, panel in zip(axes.flat, panels):
+        for series in panel["series"]:
+            x, y = envelope(series["y"], series.get("x"))
+            axis.plot(x, y, color=series.get("color"), label=series.get("label"), alpha=0.7, linestyle='-',
+                      drawstyle="steps-mid" if panel.get("step") else "default")
+        axis.set_title(panel["title"])
+        axis.set_xscale(panel.get("xscale", "linear"))
+        axis.grid(True)
+        if any(series.get("label") for series in panel["series"]):
+            axis.legend()
+    for axis in list(axes.flat)[len(panels):]:
+        axis.set_visible(False)
+    figure.tight_layout()
+
+    paths = {}
+    base = os.path.join(directory, name)
+    for image_format in ("png", "svg"):
+        if image_format in formats:
+            paths[image_format] = f"{base}.{image_format}"
+            figure.savefig(paths[image_format], format=image_format)
+    metrics = metrics or {}
+    if "html" in formats:
+        svg = io.StringIO()
+        figure.savefig(svg, format="svg")
+        rows_html = "".join(f"<tr><td>{html.escape(str(key))}</td><td>{html.escape(str(value))}</td></tr>"
+                            for key, value in metrics.items())
+        paths["html"] = f"{base}.html"
+        with open(paths["html"], "w") as html_file:
+            html_file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(name)}</title></head>"
+                            f"<body><h1>{html.escape(name)}</h1><table border=\"1\">{rows_html}</table>"
+                            f"{svg.getvalue()[svg.getvalue().find('<svg'):]}</body></html>\n")
+    paths["json"] = f"{base}.json"
+    with open(paths["json"], "w") as json_file:
+        json.dump(metrics, json_file, indent=2, default=_to_builtin)
+    return paths
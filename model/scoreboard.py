@@ -0,0 +1,218 @@
+import numpy as np
+
+from model.bitstream import SDM_bitstream
+
+def _as_bits(bits):
+    if isinstance(bits, SDM_bitstream):
+        return bits.to_bits()
+    return np.asarray(bits, dtype=np.uint8).ravel()
+
+class SDM_stream_comparator():
+    """
+    Incremental DUT/model bitstream check for the scoreboards.
+
+    Computes the same statistic as the scoreboard compare, the mean over all windows of
+    |moving_average(exp) - moving_average(got)| on the -1/+1 scale, but the bits are consumed in
+    blocks as they arrive and only the last window - 1 bits of both streams are kept (plus the part
+    of the faster stream that the slower one has not reached yet). Exact bit mismatches are counted
+    on the way.
+
+    With fail_threshold, update() stops at the first window whose error reaches it (or at the first
+    mismatching bit with exact=True) and failed_at holds the bit index.
+    """
+    def __init__(self, window=256, threshold=0.1, fail_threshold=None, exact=False, record_every=None):
+        self.window = window
+        self.threshold = threshold
+        self.fail_threshold = fail_threshold
+        self.exact = exact
+        self.record_every = record_every
+        self.reset()
+
+    def reset(self):
+        self.got_pending = np.zeros(0, dtype=np.uint8)
+        self.exp_pending = np.zeros(0, dtype=np.uint8)
+        self.got_history = np.zeros(0, dtype=np.uint8)
+        self.exp_history = np.zeros(0, dtype=np.uint8)
+        self.position = 0
+        self.num_windows = 0
+        self.error_sum = 0.0
+        self.max_error = 0.0
+        self.max_error_at = None
+        self.mismatches = 0
+        self.first_mismatch = None
+        self.failed_at = None
+        # Decimated moving averages for plots, one point every record_every bits
+        self.recorded_index = []
+        self.recorded_got = []
+        self.recorded_exp = []
+
+    def update(self, got=None, exp=None):
+        """
+        Consumes the next bits of either or both streams.
+
+        Args:
+            got (array-like or SDM_bitstream): Next bits captured from the DUT.
+            exp (array-like or SDM_bitstream): Next bits of the model.
+
+        Returns:
+            bool: False once the comparison has failed fast, True otherwise.
+        """
+        if self.failed_at is not None:
+            return False
+        if got is not None:
+            self.got_pending = np.concatenate((self.got_pending, _as_bits(got)))
+        if exp is not None:
+            self.exp_pending = np.concatenate((self.exp_pending, _as_bits(exp)))
+        length = min(len(self.got_pending), len(self.exp_pending))
+        if length:
+            self._consume(self.got_pending[:length], self.exp_pending[:length])
+            self.got_pending = self.got_pending[length:]
+            self.exp_pending = self.exp_pending[length:]
+        return self.failed_at is None
+
+    def _consume(self, got, exp):
+        difference = got != exp
+        block_mismatches = int(np.count_nonzero(difference))
+        if block_mismatches and self.first_mismatch is None:
+            self.first_mismatch = self.position + int(np.argmax(difference))
+        self.mismatches += block_mismatches
+
+        # Window sums of every window that ends in this block
+        extended_got = np.concatenate((self.got_history, got))
+        extended_exp = np.concatenate((self.exp_history, exp))
+        cumulative_got = np.concatenate(([0], np.cumsum(extended_got, dtype=np.int64)))
+        cumulative_exp = np.concatenate(([0], np.cumsum(extended_exp, dtype=np.int64)))
+        averaged_got = (cumulative_got[self.window:] - cumulative_got[:-self.window]) * (2 / self.window) - 1
+        averaged_exp = (cumulative_exp[self.window:] - cumulative_exp[:-self.window]) * (2 / self.window) - 1
+        # Bit index of the last bit of every window
+        ends = self.position - len(self.got_history) + self.window - 1 + np.arange(len(averaged_got))
+        errors = np.abs(averaged_exp - averaged_got)
+
+        if self.fail_threshold is not None:
+            failing = errors >= self.fail_threshold
+            if np.any(failing):
+                self.failed_at = int(ends[np.argmax(failing)])
+        if self.exact and self.first_mismatch is not None:
+            self.failed_at = self.first_mismatch if self.failed_at is None else min(self.failed_at, self.first_mismatch)
+        if self.failed_at is not None:
+            # Statistics up to and including the failing window only
+            keep = ends <= self.failed_at
+            errors, ends = errors[keep], ends[keep]
+            averaged_got, averaged_exp = averaged_got[keep], averaged_exp[keep]
+
+        if len(errors):
+            self.num_windows += len(errors)
+            self.error_sum += float(errors.sum())
+            largest = int(np.argmax(errors))
+            if errors[largest] > self.max_error or self.max_error_at is None:
+                self.max_error, self.max_error_at = float(errors[largest]), int(ends[largest])
+        if self.record_every:
+            recorded = ends % self.record_every == 0
+            self.recorded_index.extend(ends[recorded].tolist())
+            self.recorded_got.extend(averaged_got[recorded].tolist())
+            self.recorded_exp.extend(averaged_exp[recorded].tolist())
+
+        self.got_history = extended_got[max(0, len(extended_got) - self.window + 1):]
+        self.exp_history = extended_exp[max(0, len(extended_exp) - self.window + 1):]
+        self.position += len(got)
+
+    @property
+    def mean_error(self):
+        return self.error_sum / self.num_windows if self.num_windows else 0.0
+
+    @property
+    def passed(self):
+        if self.failed_at is not None:
+            return False
+        if self.exact:
+            return self.mismatches == 0
+        return self.mean_error < self.threshold
+
+    def result(self):
+        """
+        Returns:
+            dict: compared bits, mean/max moving-average error, mismatches, first_mismatch, failed_at,
+                bits still waiting for the other stream and passed.
+        """
+        return {"compared": self.position, "mean_error": self.mean_error, "max_error": self.max_error,
+                "max_error_at": self.max_error_at, "mismatches": self.mismatches,
+                "first_mismatch": self.first_mismatch, "failed_at": self.failed_at,
+                "pending_got": len(self.got_pending), "pending_exp": len(self.exp_pending), "passed": self.passed}
+
+class SDM_pcm_comparator():
+    """
+    Incremental DUT/model check of two 16-bit PCM streams, sample for sample.
+
+    Blocks of either stream are consumed as they arrive and only the part of the faster stream that
+    the slower one has not reached yet is kept. Errors are on the [-1, 1) scale of 16-bit full scale.
+    With exact=True every sample has to match and both streams have to end at the same length,
+    otherwise the mean absolute error has to stay below threshold.
+    """
+    def __init__(self, exact=True, threshold=0.1):
+        self.exact = exact
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.got_pending = np.zeros(0, dtype=np.int16)
+        self.exp_pending = np.zeros(0, dtype=np.int16)
+        self.position = 0
+        self.error_sum = 0.0
+        self.max_error = 0.0
+        self.max_error_at = None
+        self.mismatches = 0
+        self.first_mismatch = None
+        # Last compared block of both streams, for plots
+        self.last_got = np.zeros(0, dtype=np.int16)
+        self.last_exp = np.zeros(0, dtype=np.int16)
+
+    def update(self, got=None, exp=None):
+        """
+        Consumes the next samples of either or both streams.
+
+        Args:
+            got (array-like): Next samples captured from the DUT.
+            exp (array-like): Next samples of the model.
+        """
+        if got is not None:
+            self.got_pending = np.concatenate((self.got_pending, np.asarray(got, dtype=np.int16).ravel()))
+        if exp is not None:
+            self.exp_pending = np.concatenate((self.exp_pending, np.asarray(exp, dtype=np.int16).ravel()))
+        length = min(len(self.got_pending), len(self.exp_pending))
+        if not length:
+            return
+        got, exp = self.got_pending[:length], self.exp_pending[:length]
+        errors = np.abs(got.astype(np.int64) - exp) / 32768
+        block_mismatches = int(np.count_nonzero(errors))
+        if block_mismatches and self.first_mismatch is None:
+            self.first_mismatch = self.position + int(np.argmax(errors > 0))
+        self.mismatches += block_mismatches
+        largest = int(np.argmax(errors))
+        if errors[largest] > self.max_error or self.max_error_at is None:
+            self.max_error, self.max_error_at = float(errors[largest]), self.position + largest
+        self.error_sum += float(errors.sum())
+        self.position += length
+        self.last_got, self.last_exp = got, exp
+        self.got_pending = self.got_pending[length:]
+        self.exp_pending = self.exp_pending[length:]
+
+    @property
+    def mean_error(self):
+        return self.error_sum / self.position if self.position else 0.0
+
+    @property
+    def passed(self):
+        if self.exact:
+            return self.mismatches == 0 and not len(self.got_pending) and not len(self.exp_pending)
+        return self.mean_error < self.threshold
+
+    def result(self):
+        """
+        Returns:
+            dict: compared samples, mean/max absolute error, mismatches, first_mismatch, samples still
+                waiting for the other stream and passed.
+        """
+        return {"compared": self.position, "mean_error": self.mean_error, "max_error": self.max_error,
+                "max_error_at": self.max_error_at, "mismatches": self.mismatches,
+                "first_mismatch": self.first_mismatch, "pending_got": len(self.got_pending),
+                "pending_exp": len(self.exp_pending), "passed": self.passed}
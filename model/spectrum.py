@@ -0,0 +1,204 @@
+import functools
+
+import numpy as np
+from scipy import fft
+from scipy.signal import get_window
+
+from model.bitstream import SDM_bitstream
+
+# Kaiser window with about 190 dB sidelobe attenuation, far below the in-band noise of a 16-bit signal
+DEFAULT_WINDOW = ("kaiser", 20)
+# Bins on each side of a tone that belong to it (main lobe plus one), for the windows with a known main lobe
+TONE_BINS = {"hann": 3, "hamming": 3, "blackman": 4, "blackmanharris": 5, "flattop": 6}
+
+def _tone_bins(window):
+    if isinstance(window, tuple) and window[0] == "kaiser":
+        return int(np.ceil(np.sqrt(1 + (window[1] / np.pi) ** 2))) + 1
+    name = window[0] if isinstance(window, tuple) else window
+    if name not in TONE_BINS:
+        raise ValueError(f"main lobe of window {window} unknown, pass tone_bins")
+    return TONE_BINS[name]
+
+@functools.lru_cache(maxsize=32)
+def cached_window(window, length):
+    """
+    Memoised float32 scipy.signal.get_window, the returned window is read-only.
+    """
+    values = get_window(window, length).astype(np.float32)
+    values.setflags(write=False)
+    return values
+
+def _db(power):
+    return float(10 * np.log10(max(power, np.finfo(np.float64).tiny)))
+
+class SDM_spectrum_analyser():
+    """
+    Streaming Welch PSD of a bitstream or PCM signal and the audio quality metrics derived from it.
+
+    Blocks are consumed as they arrive: every complete segment (nperseg samples, hop of
+    nperseg - noverlap) is windowed and transformed in float32 with scipy.fft, whose plan cache is
+    reused for the fixed segment length, and only |X|^2 is accumulated (in float64, so long runs
+    do not lose precision). At most nperseg - 1 samples are buffered between blocks.
+
+    Bits (0/1 arrays or SDM_bitstreams) are mapped to -1/+1, PCM to [-1, 1) of 16-bit full scale,
+    so both sides of a DUT/model comparison end on the same scale.
+    """
+    def __init__(self, rate, band=20000, nperseg=1 << 14, overlap=0.5, window=DEFAULT_WINDOW, pcm=False, tone_bins=None):
+        self.rate = rate
+        self.band = band
+        self.nperseg = nperseg
+        self.hop = max(1, nperseg - int(nperseg * overlap))
+        self.pcm = pcm
+        self.window_name = window
+        self.window = cached_window(window, nperseg)
+        self.tone_bins = _tone_bins(window) if tone_bins is None else tone_bins
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.power = np.zeros(self.nperseg // 2 + 1, dtype=np.float64)
+        self.segments = 0
+        self.num_samples = 0
+
+    def _as_float(self, block):
+        if isinstance(block, SDM_bitstream):
+            return block.to_bipolar().astype(np.float32)
+        block = np.asarray(block).ravel()
+        if self.pcm:
+            return block.astype(np.float32) / 32768
+        return block.astype(np.float32) * 2 - 1
+
+    def update(self, block):
+        """
+        Consumes the next samples.
+
+        Args:
+            block (array-like or SDM_bitstream): Next bits (or PCM samples with pcm=True).
+        """
+        block = self._as_float(block)
+        self.num_samples += len(block)
+        samples = np.concatenate((self.buffer, block))
+        num_segments = (len(samples) - self.nperseg) // self.hop + 1 if len(samples) >= self.nperseg else 0
+        if num_segments:
+            segments = np.lib.stride_tricks.sliding_window_view(samples, self.nperseg)[::self.hop][:num_segments]
+            spectra = fft.rfft(segments * self.window, axis=-1)
+            self.power += np.sum(np.abs(spectra).astype(np.float64) ** 2, axis=0)
+            self.segments += num_segments
+        self.buffer = samples[num_segments * self.hop:]
+
+    def psd(self):
+        """
+        One-sided power spectral density, same scaling as scipy.signal.welch(scaling="density").
+
+        If no complete segment was seen yet, the buffered samples are used as one zero-padded segment.
+
+        Returns:
+            tuple: frequencies (Hz) and PSD (units^2 / Hz).
+        """
+        freqs = fft.rfftfreq(self.nperseg, 1 / self.rate)
+        power, segments, window = self.power, self.segments, self.window
+        if not segments and len(self.buffer):
+            window = cached_window(self.window_name, len(self.buffer))
+            power = np.abs(fft.rfft(self.buffer * window, n=self.nperseg)).astype(np.float64) ** 2
+            segments = 1
+        if not segments:
+            return freqs, np.zeros_like(freqs)
+        psd = power / (segments * self.rate * float(np.sum(window.astype(np.float64) ** 2)))
+        psd[1:-1 if self.nperseg % 2 == 0 else None] *= 2
+        return freqs, psd
+
+    def metrics(self, fundamental=None, harmonics=5, slope_range=None):
+        """
+        In-band quality metrics of the accumulated spectrum.
+
+        Args:
+            fundamental (float): Tone frequency in Hz, the largest in-band peak above DC if None.
+            harmonics (int): Number of harmonics (2f, 3f, ...) counted as distortion.
+            slope_range (tuple): (f_low, f_high) of the noise-shaping fit, (band, rate / 16) if None.
+
+        Returns:
+            dict: fundamental_hz, signal_db, snr_db, sinad_db, thd_db, enob, noise_shaping_slope_db_per_decade,
+                segments and samples. Powers are relative to a full-scale square wave (0 dB).
+        """
+        freqs, psd = self.psd()
+        resolution = freqs[1] - freqs[0]
+        in_band = (freqs <= self.band)
+        in_band[:self.tone_bins] = False  # DC and its leakage
+        result = {"segments": self.segments, "samples": self.num_samples}
+        if not np.any(psd[in_band]):
+            return dict(result, fundamental_hz=None, signal_db=None, snr_db=None, sinad_db=None, thd_db=None, enob=None,
+                        noise_shaping_slope_db_per_decade=None)
+
+        def tone_bins(frequency):
+            center = int(round(frequency / resolution))
+            return np.arange(max(center - self.tone_bins, 0), min(center + self.tone_bins + 1, len(psd)))
+
+        if fundamental is None:
+            center = int(np.argmax(np.where(in_band, psd, 0)))
+        else:
+            center = int(round(fundamental / resolution))
+        # Power-weighted frequency of the peak, closer to the tone than the bin center
+        bins = tone_bins(center * resolution)
+        fundamental = float(np.sum(freqs[bins] * psd[bins]) / max(np.sum(psd[bins]), np.finfo(np.float64).tiny))
+        tone = np.zeros(len(psd), dtype=np.bool_)
+        tone[bins] = True
+        distortion_mask = np.zeros(len(psd), dtype=np.bool_)
+        for order in range(2, harmonics + 2):
+            if order * fundamental <= self.band:
+                distortion_mask[tone_bins(order * fundamental)] = True
+        distortion_mask &= in_band & ~tone
+
+        signal = float(np.sum(psd[tone])) * resolution
+        distortion = float(np.sum(psd[distortion_mask])) * resolution
+        noise = float(np.sum(psd[in_band & ~tone & ~distortion_mask])) * resolution
+        sinad = _db(signal) - _db(noise + distortion)
+        return dict(result, fundamental_hz=fundamental, signal_db=_db(signal), snr_db=_db(signal) - _db(noise),
+                    sinad_db=sinad, thd_db=_db(distortion) - _db(signal), enob=(sinad - 1.76) / 6.02,
+                    noise_shaping_slope_db_per_decade=self.noise_shaping_slope(freqs, psd, slope_range))
+
+    def noise_shaping_slope(self, freqs=None, psd=None, slope_range=None, num_bands=12):
+        """
+        Slope of the out-of-band noise floor in dB/decade, about 20 for a first-order and 40 for a
+        second-order modulator.
+
+        The range is split into log-spaced bands and the median PSD of each band is fitted against
+        log10(f), so tones and hold images do not bias the fit.
+        """
+        if freqs is None:
+            freqs, psd = self.psd()
+        low, high = slope_range or (self.band, self.rate / 16)
+        edges = np.geomspace(max(low, freqs[1]), high, num_bands + 1)
+        centers, levels = [], []
+        for start, stop in zip(edges[:-1], edges[1:]):
+            selected = psd[(freqs >= start) & (freqs < stop)]
+            if len(selected) and np.median(selected) > 0:
+                centers.append(np.log10(np.sqrt(start * stop)))
+                levels.append(10 * np.log10(np.median(selected)))
+        if len(centers) < 2:
+            return None
+        return float(np.polyfit(centers, levels, 1)[0])
+
+def compare_spectra(got, exp, **metrics_arguments):
+    """
+    Metrics of two analysers side by side, e.g. DUT capture vs model.
+
+    Returns:
+        dict: "dut_<metric>" and "model_<metric>" entries plus "snr_difference_db" (model - DUT).
+    """
+    dut, model = got.metrics(**metrics_arguments), exp.metrics(**metrics_arguments)
+    result = {f"dut_{key}": value for key, value in dut.items()}
+    result.update({f"model_{key}": value for key, value in model.items()})
+    if dut["snr_db"] is not None and model["snr_db"] is not None:
+        result["snr_difference_db"] = model["snr_db"] - dut["snr_db"]
+    return result
+
+def spectrum_panel(got, exp, title="PSD dut / model (dB/Hz)"):
+    """
+    Report panel (see model.report.write_report) with both PSDs on a log frequency axis.
+    """
+    series = []
+    for analyser, color, label in ((got, 'r', 'dut'), (exp, 'b', 'model')):
+        freqs, psd = analyser.psd()
+        series.append({"x": freqs[1:], "y": 10 * np.log10(psd[1:] + np.finfo(np.float64).tiny), "color": color,
+                       "label": label})
+    return {"title": title, "series": series, "xscale": "log"}
@@ -0,0 +1,287 @@
+import struct
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# Full scale of the generators, level 1.0 maps to 32767
+FULL_SCALE = 32767
+# Block length of the generators and of the noise random streams
+DEFAULT_BLOCK_SIZE = 65536
+NOISE_CHUNK = 4096
+
+def _to_int16(values):
+    return np.clip(values, -32768, 32767).astype(np.int16)
+
+class SDM_stimulus(ABC):
+    """
+    Lazily generated 16-bit mono stimulus.
+
+    Subclasses implement render(start, stop), a vectorised function of the sample index, so any
+    range can be produced on its own and nothing is kept in memory between blocks. The same object
+    feeds the cocotb driver (iteration yields one int per sample), the pyuvm sequences (blocks())
+    and the models, which slice it like a 1-D int16 array and so render it one block at a time.
+    """
+    dtype = np.dtype(np.int16)
+    ndim = 1
+
+    def __init__(self, num_samples, sample_rate=44100, block_size=DEFAULT_BLOCK_SIZE):
+        self.num_samples = int(num_samples)
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+
+    def __len__(self):
+        return self.num_samples
+
+    def __repr__(self):
+        return f"{type(self).__name__}(num_samples={self.num_samples}, sample_rate={self.sample_rate})"
+
+    def __iter__(self):
+        for block in self.blocks():
+            yield from block.tolist()
+
+    @property
+    def shape(self):
+        return (self.num_samples,)
+
+    def __getitem__(self, key):
+        # stimulus[..., start:stop] as the multi-channel model code slices its input
+        if isinstance(key, tuple) and len(key) == 2 and key[0] is Ellipsis:
+            key = key[1]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.num_samples)
+            if step == 1:
+                return self.read(start, max(start, stop))
+            return self.read()[key]
+        index = key + self.num_samples if key < 0 else key
+        if not 0 <= index < self.num_samples:
+            raise IndexError(f"sample index {key} out of range for {self.num_samples} samples")
+        return self.read(index, index + 1)[0]
+
+    @abstractmethod
+    def render(self, start, stop):
+        """
+        Returns:
+            np.ndarray: int16 samples [start, stop), 0 <= start <= stop <= len(self).
+        """
+
+    def read(self, start=0, stop=None):
+        """
+        Returns:
+            np.ndarray: int16 samples [start, stop), clamped to the stimulus length.
+        """
+        stop = self.num_samples if stop is None else min(stop, self.num_samples)
+        start = min(max(start, 0), stop)
+        return self.render(start, stop)
+
+    def blocks(self, block_size=None):
+        """
+        Yields the stimulus as int16 blocks of block_size samples (the last one may be shorter).
+        """
+        block_size = block_size or self.block_size
+        for start in range(0, self.num_samples, block_size):
+            yield self.read(start, start + block_size)
+
+    def to_array(self):
+        return np.array(self.read(), dtype=np.int16)
+
+    def _time(self, start, stop):
+        return np.arange(start, stop, dtype=np.float64) / self.sample_rate
+
+class SDM_multitone(SDM_stimulus):
+    """
+    Sum of sines, amplitudes relative to full scale.
+
+    SDM_multitone([1], [0.5], num_samples=40, sample_rate=20) is the sine of the testbench model wrappers.
+    """
+    def __init__(self, frequencies=(1000,), amplitudes=None, phases=None, num_samples=44100, sample_rate=44100,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__(num_samples, sample_rate, block_size)
+        self.frequencies = np.atleast_1d(np.asarray(frequencies, dtype=np.float64))
+        num_tones = len(self.frequencies)
+        self.amplitudes = np.full(num_tones, 0.5 / num_tones) if amplitudes is None \
+            else np.broadcast_to(np.asarray(amplitudes, dtype=np.float64), (num_tones,))
+        self.phases = np.zeros(num_tones) if phases is None \
+            else np.broadcast_to(np.asarray(phases, dtype=np.float64), (num_tones,))
+
+    def render(self, start, stop):
+        time_axis = self._time(start, stop)
+        values = np.zeros(stop - start)
+        for frequency, amplitude, phase in zip(self.frequencies, self.amplitudes, self.phases):
+            values += amplitude * np.sin(2 * np.pi * frequency * time_axis + phase)
+        return _to_int16(values * FULL_SCALE)
+
+class SDM_log_chirp(SDM_stimulus):
+    """
+    Sine sweeping exponentially from f_start to f_stop over the whole stimulus.
+    """
+    def __init__(self, f_start=20, f_stop=20000, amplitude=0.5, num_samples=44100, sample_rate=44100,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__(num_samples, sample_rate, block_size)
+        self.f_start = f_start
+        self.f_stop = f_stop
+        self.amplitude = amplitude
+
+    def render(self, start, stop):
+        time_axis = self._time(start, stop)
+        duration = self.num_samples / self.sample_rate
+        if self.f_start == self.f_stop:
+            phase = 2 * np.pi * self.f_start * time_axis
+        else:
+            rate = np.log(self.f_stop / self.f_start)
+            phase = 2 * np.pi * self.f_start * duration / rate * np.expm1(time_axis / duration * rate)
+        return _to_int16(self.amplitude * np.sin(phase) * FULL_SCALE)
+
+class SDM_dithered_noise(SDM_stimulus):
+    """
+    Uniform white noise of the given peak level, quantised with TPDF dither.
+
+    The random stream is split into NOISE_CHUNK chunks seeded by (seed, chunk index), so every
+    range is reproducible whatever the block size.
+    """
+    def __init__(self, amplitude=0.5, seed=0, dither=True, num_samples=44100, sample_rate=44100,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__(num_samples, sample_rate, block_size)
+        self.amplitude = amplitude
+        self.seed = seed
+        self.dither = dither
+
+    def _chunk(self, index):
+        generator = np.random.default_rng([self.seed, index])
+        values = generator.uniform(-self.amplitude, self.amplitude, NOISE_CHUNK) * FULL_SCALE
+        if self.dither:
+            values += generator.uniform(-0.5, 0.5, NOISE_CHUNK) + generator.uniform(-0.5, 0.5, NOISE_CHUNK)
+        return _to_int16(np.round(values))
+
+    def render(self, start, stop):
+        if start == stop:
+            return np.zeros(0, dtype=np.int16)
+        first, last = start // NOISE_CHUNK, (stop - 1) // NOISE_CHUNK
+        chunks = np.concatenate([self._chunk(index) for index in range(first, last + 1)])
+        return chunks[start - first * NOISE_CHUNK:stop - first * NOISE_CHUNK]
+
+class SDM_steps(SDM_stimulus):
+    """
+    Cycles through DC levels, step_length samples each; the default toggles between -/+ full scale.
+    """
+    def __init__(self, levels=(-1.0, 1.0), step_length=4410, num_samples=44100, sample_rate=44100,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__(num_samples, sample_rate, block_size)
+        self.levels = _to_int16(np.asarray(levels, dtype=np.float64) * FULL_SCALE)
+        self.step_length = step_length
+
+    def render(self, start, stop):
+        return self.levels[np.arange(start, stop) // self.step_length % len(self.levels)]
+
+class SDM_ramp(SDM_stimulus):
+    """
+    Linear DC ramp from start_level to stop_level (relative to full scale) over the whole stimulus.
+    """
+    def __init__(self, start_level=-1.0, stop_level=1.0, num_samples=44100, sample_rate=44100,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        super().__init__(num_samples, sample_rate, block_size)
+        self.start_level = start_level
+        self.stop_level = stop_level
+
+    def render(self, start, stop):
+        position = np.arange(start, stop) / max(self.num_samples - 1, 1)
+        return _to_int16((self.start_level + (self.stop_level - self.start_level) * position) * FULL_SCALE)
+
+class SDM_pcm_file(SDM_stimulus):
+    """
+    One channel of a 16-bit PCM file (raw or WAV), memory-mapped.
+
+    read() returns np.memmap views, so a multi-minute recording is paged in by the OS as the
+    blocks are consumed and never loaded as a whole.
+    """
+    def __init__(self, path, sample_rate=44100, channels=1, channel=0, offset=0, num_frames=None, dtype="<i2",
+                 block_size=DEFAULT_BLOCK_SIZE):
+        if not 0 <= channel < channels:
+            raise ValueError(f"channel {channel} out of range for {channels} channels")
+        frames = np.memmap(path, dtype=dtype, mode="r", offset=offset)
+        num_frames = len(frames) // channels if num_frames is None else num_frames
+        self.path = path
+        self.channels = channels
+        self.data = frames[:num_frames * channels].reshape(num_frames, channels)[:, channel]
+        super().__init__(num_frames, sample_rate, block_size)
+
+    @classmethod
+    def from_wav(cls, path, channel=0, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Opens a 16-bit PCM WAV file (WAVE_FORMAT_PCM or WAVE_FORMAT_EXTENSIBLE).
+        """
+        with open(path, "rb") as wav_file:
+            riff, _, wave = struct.unpack("<4sI4s", wav_file.read(12))
+            if riff != b"RIFF" or wave != b"WAVE":
+                raise ValueError(f"{path} is not a RIFF/WAVE file")
+            fmt = None
+            while True:
+                header = wav_file.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"{path} has no data chunk")
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = struct.unpack("<HHIIHH", wav_file.read(16))
+                    wav_file.seek(chunk_size - 16 + chunk_size % 2, 1)
+                elif chunk_id == b"data":
+                    offset = wav_file.tell()
+                    break
+                else:
+                    wav_file.seek(chunk_size + chunk_size % 2, 1)
+        if fmt is None:
+            raise ValueError(f"{path} has no fmt chunk before the data chunk")
+        audio_format, channels, sample_rate, _, _, bits_per_sample = fmt
+        if audio_format not in (1, 0xFFFE) or bits_per_sample != 16:
+            raise ValueError(f"{path}: only 16-bit PCM is supported, got format {audio_format}, {bits_per_sample} bits")
+        return cls(path, sample_rate, channels, channel, offset, chunk_size // (2 * channels), "<i2", block_size)
+
+    def render(self, start, stop):
+        return self.data[start:stop]
+
+# Names of stimulus_from_spec()
+STIMULI = {
+    "multitone": SDM_multitone,
+    "chirp": SDM_log_chirp,
+    "noise": SDM_dithered_noise,
+    "steps": SDM_steps,
+    "ramp": SDM_ramp,
+    "wav": SDM_pcm_file.from_wav,
+    "pcm": SDM_pcm_file,
+}
+
+def _parse_value(text):
+    if "/" in text:
+        return [_parse_value(item) for item in text.split("/")]
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def stimulus_from_spec(spec, sample_rate=44100):
+    """
+    Builds a stimulus from a "name:key=value,..." string, e.g. from the +STIMULUS plusarg.
+
+    Lists are separated with "/" (except in path) and duration=<seconds> may replace num_samples:
+    "multitone:frequencies=1000/3000,amplitudes=0.3/0.1,duration=0.5", "chirp:f_start=20,f_stop=20000",
+    "noise:seed=3", "steps:step_length=441", "ramp", "wav:path=/data/take1.wav,channel=1".
+
+    Returns:
+        SDM_stimulus: The stimulus.
+    """
+    name, _, arguments = spec.partition(":")
+    if name not in STIMULI:
+        raise ValueError(f"unknown stimulus {name}, available: {sorted(STIMULI)}")
+    parameters = {}
+    for field in filter(None, arguments.split(",")):
+        key, separator, value = field.partition("=")
+        if not separator:
+            raise ValueError(f"expected key=value in {spec}, got {field}")
+        key, value = key.strip(), value.strip()
+        parameters[key] = value if key == "path" else _parse_value(value)
+    if name in ("wav", "pcm"):
+        return STIMULI[name](**parameters)
+    parameters.setdefault("sample_rate", sample_rate)
+    if "duration" in parameters:
+        parameters["num_samples"] = int(round(parameters.pop("duration") * parameters["sample_rate"]))
+    return STIMULI[name](**parameters)
@@ -0,0 +1,354 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.ndimage import median_filter
+
+try:
+    import numba
+except ImportError:  # numba is optional, the NumPy backend is always available
+    numba = None
+
+# Adding main_repo to path when run as a script
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+from model.spectrum import DEFAULT_WINDOW, SDM_spectrum_analyser
+from model.stimulus import FULL_SCALE
+from model.trace import configure_logging, get_logger
+
+log = get_logger("sweep")
+
+# Parameters of a sweep point and their defaults. amplitude and offset of the input tone are relative to full
+# scale, every input sample is held for osr modulator cycles, feedback and feedback2 are the levels fed back into
+# the first and second integrator (feedback=32768, feedback2=0 is the loop of model.SDM) and the accumulator widths
+# wrap the integrators like the RTL registers (0: unbounded).
+SWEEP_DEFAULTS = {"order": 1, "amplitude": 0.5, "offset": 0.0, "frequency": 2000.0, "osr": 64, "feedback": 32768,
+                  "feedback2": 0, "accumulator_bits": 0, "accumulator_bits2": 0}
+# Modulator cycles per kernel call, bounds the (cycles, configurations) input and integrator buffers
+KERNEL_BLOCK = 4096
+# Modulator cycles of bits buffered per configuration between spectrum updates, a multiple of KERNEL_BLOCK
+SPECTRUM_BLOCK = 8 * KERNEL_BLOCK
+# Width of an unbounded integrator, wide enough to never wrap in int64
+UNBOUNDED_BITS = 63
+# In-band spur above the local noise floor reported as an idle tone, and the noise bins of that floor
+IDLE_TONE_THRESHOLD_DB = 10.0
+FLOOR_BINS = 33
+# Spurs below this level (dB of a full-scale square wave) are float32 FFT residue, e.g. with a zero input
+NUMERIC_FLOOR_DB = -140.0
+
+def _first_order_sweep_numpy(inputs, bits, values1, values2, integrator1, integrator2, feedback, feedback2,
+                             half1, mask1, half2, mask2):
+    """
+    First-order modulator of every configuration in lockstep, one NumPy step per cycle across the
+    configuration axis. Rows of inputs, bits and values are cycles, columns configurations.
+    """
+    # x - (feedback if q else -feedback) == x + feedback - 2 * feedback * q
+    offset_inputs = inputs + feedback
+    twice = 2 * feedback
+    step = np.empty_like(integrator1)
+    for index in range(inputs.shape[0]):
+        quantizer = np.greater(integrator1, 0, out=bits[index])
+        value = np.add(integrator1, offset_inputs[index], out=values1[index])
+        value -= np.multiply(quantizer, twice, out=step)
+        np.add(value, half1, out=integrator1)
+        integrator1 &= mask1
+        integrator1 -= half1
+
+def _second_order_sweep_numpy(inputs, bits, values1, values2, integrator1, integrator2, feedback, feedback2,
+                              half1, mask1, half2, mask2):
+    """
+    Second-order modulator of every configuration in lockstep, see _first_order_sweep_numpy().
+    """
+    offset_inputs = inputs + feedback
+    twice1, twice2 = 2 * feedback, 2 * feedback2
+    step = np.empty_like(integrator1)
+    quantizer = (integrator2 > 0).astype(np.uint8)
+    for index in range(inputs.shape[0]):
+        value = np.add(integrator1, offset_inputs[index], out=values1[index])
+        value -= np.multiply(quantizer, twice1, out=step)
+        np.add(value, half1, out=integrator1)
+        integrator1 &= mask1
+        integrator1 -= half1
+        value = np.add(integrator2, integrator1, out=values2[index])
+        value += feedback2
+        value -= np.multiply(quantizer, twice2, out=step)
+        np.add(value, half2, out=integrator2)
+        integrator2 &= mask2
+        integrator2 -= half2
+        quantizer = np.greater(integrator2, 0, out=bits[index])
+
+def _first_order_sweep_kernel(inputs, bits, values1, values2, integrator1, integrator2, feedback, feedback2,
+                              half1, mask1, half2, mask2):
+    """
+    Loop form of _first_order_sweep_numpy(), meant to be compiled with numba.
+    """
+    for index in range(inputs.shape[0]):
+        for config in range(inputs.shape[1]):
+            quantizer = 1 if integrator1[config] > 0 else 0
+            value = integrator1[config] + inputs[index, config] - (feedback[config] if quantizer else -feedback[config])
+            values1[index, config] = value
+            integrator1[config] = ((value + half1[config]) & mask1[config]) - half1[config]
+            bits[index, config] = quantizer
+
+def _second_order_sweep_kernel(inputs, bits, values1, values2, integrator1, integrator2, feedback, feedback2,
+                               half1, mask1, half2, mask2):
+    """
+    Loop form of _second_order_sweep_numpy(), meant to be compiled with numba.
+    """
+    for index in range(inputs.shape[0]):
+        for config in range(inputs.shape[1]):
+            sign = 1 if integrator2[config] > 0 else -1
+            value = integrator1[config] + inputs[index, config] - sign * feedback[config]
+            values1[index, config] = value
+            integrator1[config] = ((value + half1[config]) & mask1[config]) - half1[config]
+            value = integrator2[config] + integrator1[config] - sign * feedback2[config]
+            values2[index, config] = value
+            integrator2[config] = ((value + half2[config]) & mask2[config]) - half2[config]
+            bits[index, config] = 1 if integrator2[config] > 0 else 0
+
+# Available sweep engines: {name: (first_order_kernel, second_order_kernel)}, the state arrays are updated in place
+SWEEP_BACKENDS = {
+    "numpy": (_first_order_sweep_numpy, _second_order_sweep_numpy),
+}
+if numba is not None:
+    SWEEP_BACKENDS["numba"] = (numba.njit(cache=True, nogil=True)(_first_order_sweep_kernel),
+                               numba.njit(cache=True, nogil=True)(_second_order_sweep_kernel))
+DEFAULT_SWEEP_BACKEND = "numba" if "numba" in SWEEP_BACKENDS else "numpy"
+
+def sweep_grid(**axes):
+    """
+    Cartesian product of parameter values, e.g. sweep_grid(order=[1, 2], amplitude=[0.1, 0.5]).
+
+    Returns:
+        list: One configuration dict per point, the parameters not given keep their SWEEP_DEFAULTS.
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+def _register(bits):
+    bits = np.where(bits > 0, bits, UNBOUNDED_BITS).astype(np.int64)
+    half = np.left_shift(np.int64(1), bits - 1)
+    return half, 2 * half - 1
+
+class SDM_sweep():
+    """
+    Design-space sweep: a grid of modulator configurations advanced in lockstep and measured on the fly.
+
+    The modulator clock (modulator_rate) is common to all points. A configuration with oversampling
+    factor osr is fed a tone sampled at modulator_rate / osr, held for osr cycles like the "hold"
+    interpolation of model.SDM, and its band is min(band, modulator_rate / (2 * osr)).
+
+    The configurations of each order form one batch, the configuration being the column axis of the
+    kernel blocks. The bits go into one streaming SDM_spectrum_analyser per
+    configuration and the integrator values before wrapping into running peaks and overflow counts,
+    so only SPECTRUM_BLOCK cycles of bits are ever held.
+    """
+    def __init__(self, configurations, modulator_rate=2822400, band=20000, nperseg=1 << 15, window=DEFAULT_WINDOW,
+                 harmonics=5, idle_tone_threshold_db=IDLE_TONE_THRESHOLD_DB, backend=None):
+        self.configurations = []
+        for configuration in configurations:
+            unknown = set(configuration) - set(SWEEP_DEFAULTS)
+            if unknown:
+                raise ValueError(f"unknown sweep parameters {sorted(unknown)}, available: {list(SWEEP_DEFAULTS)}")
+            configuration = dict(SWEEP_DEFAULTS, **configuration)
+            if configuration["order"] not in (1, 2):
+                raise ValueError(f"order must be 1 or 2, got {configuration['order']}")
+            self.configurations.append(configuration)
+        backend = backend or DEFAULT_SWEEP_BACKEND
+        if backend not in SWEEP_BACKENDS:
+            raise ValueError(f"backend must be one of {tuple(SWEEP_BACKENDS)}, got {backend}")
+        self.kernels = SWEEP_BACKENDS[backend]
+        self.modulator_rate = modulator_rate
+        self.band = band
+        self.nperseg = nperseg
+        self.window = window
+        self.harmonics = harmonics
+        self.idle_tone_threshold_db = idle_tone_threshold_db
+        self.reset()
+
+    def reset(self):
+        self.cycle = 0
+        self.groups = []
+        for order in (1, 2):
+            indices = np.array([index for index, configuration in enumerate(self.configurations)
+                                if configuration["order"] == order], dtype=np.int64)
+            if not len(indices):
+                continue
+            group = {name: np.array([self.configurations[index][name] for index in indices])
+                     for name in SWEEP_DEFAULTS}
+            group["half1"], group["mask1"] = _register(group["accumulator_bits"])
+            group["half2"], group["mask2"] = _register(group["accumulator_bits2"])
+            for name in ("feedback", "feedback2", "osr"):
+                group[name] = group[name].astype(np.int64)
+            for name in ("integrator1", "integrator2", "peak1", "peak2", "overflows1", "overflows2"):
+                group[name] = np.zeros(len(indices), dtype=np.int64)
+            group["order"], group["indices"] = order, indices
+            # Bits of the last SPECTRUM_BLOCK cycles, handed to the analysers at once
+            group["bits"] = np.empty((SPECTRUM_BLOCK, len(indices)), dtype=np.uint8)
+            group["buffered"] = 0
+            self.groups.append(group)
+        self.analysers = [SDM_spectrum_analyser(self.modulator_rate,
+                                                min(self.band, self.modulator_rate / (2 * configuration["osr"])),
+                                                self.nperseg, window=self.window)
+                          for configuration in self.configurations]
+
+    def _inputs(self, group, start, stop):
+        """
+        Returns:
+            np.ndarray: int64 modulator input of cycles [start, stop), (cycles, configurations of the group).
+        """
+        inputs = np.empty((stop - start, len(group["indices"])), dtype=np.int64)
+        for osr in np.unique(group["osr"]):
+            columns = np.flatnonzero(group["osr"] == osr)
+            first = start // osr
+            # Same sample values as SDM_multitone at modulator_rate / osr
+            time_axis = np.arange(first, (stop - 1) // osr + 1, dtype=np.float64)[:, None] / (self.modulator_rate / osr)
+            tone = group["amplitude"][columns] * np.sin(2 * np.pi * group["frequency"][columns] * time_axis)
+            samples = np.clip((group["offset"][columns] + tone) * FULL_SCALE, -32768, 32767).astype(np.int16)
+            inputs[:, columns] = np.repeat(samples, osr, axis=0)[start - first * osr:stop - first * osr]
+        return inputs
+
+    def _flush(self, group):
+        # One transposition, so that every analyser gets a contiguous row
+        bits = np.ascontiguousarray(group["bits"][:group["buffered"]].T)
+        for row, index in enumerate(group["indices"]):
+            self.analysers[index].update(bits[row])
+        group["buffered"] = 0
+
+    def run(self, num_cycles):
+        """
+        Advances every configuration by num_cycles modulator cycles, may be called repeatedly.
+        """
+        for start in range(self.cycle, self.cycle + num_cycles, KERNEL_BLOCK):
+            stop = min(start + KERNEL_BLOCK, self.cycle + num_cycles)
+            for group in self.groups:
+                inputs = self._inputs(group, start, stop)
+                if group["buffered"] + len(inputs) > len(group["bits"]):
+                    self._flush(group)
+                bits = group["bits"][group["buffered"]:group["buffered"] + len(inputs)]
+                values1 = np.empty(inputs.shape, dtype=np.int64)
+                values2 = np.zeros(inputs.shape, dtype=np.int64)
+                self.kernels[group["order"] - 1](inputs, bits, values1, values2, group["integrator1"],
+                                                 group["integrator2"], group["feedback"], group["feedback2"],
+                                                 group["half1"], group["mask1"], group["half2"], group["mask2"])
+                group["buffered"] += len(inputs)
+                for stage, values in ((1, values1), (2, values2))[:group["order"]]:
+                    peak = group[f"peak{stage}"]
+                    np.maximum(peak, np.max(values, axis=0), out=peak)
+                    np.maximum(peak, -np.min(values, axis=0), out=peak)
+                    # Outside [-half, half) exactly when value + half, read unsigned, exceeds the register mask
+                    values += group[f"half{stage}"]
+                    group[f"overflows{stage}"] += np.count_nonzero(values.view(np.uint64) > group[f"mask{stage}"].astype(np.uint64), axis=0)
+        for group in self.groups:
+            self._flush(group)
+        self.cycle += num_cycles
+
+    def _spectral_metrics(self, analyser, configuration):
+        tiny = np.finfo(np.float64).tiny
+        freqs, psd = analyser.psd()
+        resolution = freqs[1] - freqs[0]
+        noise_mask = freqs <= analyser.band
+        noise_mask[:analyser.tone_bins] = False  # DC and its leakage
+        if configuration["amplitude"] > 0:
+            for harmonic in range(1, self.harmonics + 2):
+                center = int(round(harmonic * configuration["frequency"] / resolution))
+                noise_mask[max(center - analyser.tone_bins, 0):center + analyser.tone_bins + 1] = False
+            metrics = analyser.metrics(fundamental=configuration["frequency"], harmonics=self.harmonics)
+        else:
+            metrics = {"snr_db": None, "sinad_db": None, "thd_db": None, "enob": None,
+                       "noise_shaping_slope_db_per_decade": analyser.noise_shaping_slope(freqs, psd)}
+        result = {name: metrics[name] for name in ("snr_db", "sinad_db", "thd_db", "enob",
+                                                   "noise_shaping_slope_db_per_decade")}
+        noise = psd[noise_mask]
+        result["noise_db"] = float(10 * np.log10(max(np.sum(noise) * resolution, tiny)))
+        if len(noise) and np.any(noise):
+            # Largest spur relative to the median of the surrounding noise bins, the shaped floor rises with frequency
+            floor = median_filter(noise, size=FLOOR_BINS, mode="nearest")
+            ratio = noise / np.maximum(floor, tiny)
+            peak = int(np.argmax(ratio))
+            result["idle_tone_db"] = float(10 * np.log10(ratio[peak]))
+            result["idle_tone_hz"] = float(freqs[noise_mask][peak])
+            spur_db = 10 * np.log10(max(noise[peak] * resolution, tiny))
+            result["idle_tone"] = bool(result["idle_tone_db"] > self.idle_tone_threshold_db and spur_db > NUMERIC_FLOOR_DB)
+        else:
+            result.update(idle_tone_db=None, idle_tone_hz=None, idle_tone=False)
+        return result
+
+    def results(self):
+        """
+        Metrics of every configuration so far, in the order the configurations were given.
+
+        Returns:
+            list: One dict per configuration: its parameters, band_hz, cycles, snr_db, sinad_db, thd_db, enob,
+                noise_db (in-band noise without DC, tone and harmonics, relative to a full-scale square wave),
+                noise_shaping_slope_db_per_decade, idle_tone_db/idle_tone_hz/idle_tone (largest in-band spur
+                above the local noise floor) and, per integrator, peak (before wrapping), required bits (signed
+                width holding the peak) and overflows (cycles wrapped by accumulator_bits). SNR-type metrics are
+                None for a zero amplitude.
+        """
+        results = [None] * len(self.configurations)
+        for group in self.groups:
+            for column, index in enumerate(group["indices"]):
+                configuration = self.configurations[index]
+                result = dict(configuration, band_hz=self.analysers[index].band, cycles=self.cycle)
+                result.update(self._spectral_metrics(self.analysers[index], configuration))
+                for stage in (1, 2) if group["order"] == 2 else (1,):
+                    peak = int(group[f"peak{stage}"][column])
+                    result[f"integrator{stage}_peak"] = peak
+                    result[f"integrator{stage}_bits"] = peak.bit_length() + 1
+                    result[f"integrator{stage}_overflows"] = int(group[f"overflows{stage}"][column])
+                results[index] = result
+        return results
+
+def run_sweep(configurations, num_cycles=1 << 17, **options):
+    """
+    Runs a sweep, see SDM_sweep for the options.
+
+    Args:
+        configurations (list): Configuration dicts, e.g. from sweep_grid().
+        num_cycles (int): Modulator cycles simulated per configuration.
+
+    Returns:
+        list: See SDM_sweep.results().
+    """
+    start = time.perf_counter()
+    sweep = SDM_sweep(configurations, **options)
+    sweep.run(num_cycles)
+    results = sweep.results()
+    log.info("%d configurations x %d cycles in %.1f s", len(results), num_cycles, time.perf_counter() - start)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Design-space sweep of the SDM modulator.")
+    for name, default in SWEEP_DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), nargs="+", default=[default])
+    parser.add_argument("--cycles", type=int, default=1 << 17, help="modulator cycles per configuration")
+    parser.add_argument("--modulator-rate", type=float, default=2822400)
+    parser.add_argument("--band", type=float, default=20000)
+    parser.add_argument("--nperseg", type=int, default=1 << 15)
+    parser.add_argument("--backend", default=None, choices=sorted(SWEEP_BACKENDS))
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    configure_logging()
+    grid = sweep_grid(**{name: getattr(args, name) for name in SWEEP_DEFAULTS})
+    results = run_sweep(grid, args.cycles, modulator_rate=args.modulator_rate, band=args.band, nperseg=args.nperseg,
+                        backend=args.backend)
+    for result in results:
+        log.info("order %d amplitude %g osr %d feedback %d/%d bits %d/%d: SNR %s dB, idle tone %.1f dB at %.0f Hz, "
+                 "integrator peaks %s, overflows %s", result["order"], result["amplitude"], result["osr"],
+                 result["feedback"], result["feedback2"], result["accumulator_bits"], result["accumulator_bits2"],
+                 "-" if result["snr_db"] is None else f"{result['snr_db']:.1f}", result["idle_tone_db"] or 0,
+                 result["idle_tone_hz"] or 0,
+                 "/".join(str(result[f"integrator{stage}_peak"]) for stage in (1, 2) if f"integrator{stage}_peak" in result),
+                 "/".join(str(result[f"integrator{stage}_overflows"]) for stage in (1, 2)
+                          if f"integrator{stage}_overflows" in result))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
@@ -0,0 +1,75 @@
+import logging
+import os
+
+import numpy as np
+
+# Root of all model and testbench loggers, e.g. "sdm.model", "sdm.driver"
+LOGGER_ROOT = "sdm"
+# Default verbosity outside of cocotb, same syntax as the +VERBOSITY plusarg
+VERBOSITY_ENV = "SDM_VERBOSITY"
+
+class summary():
+    """
+    Lazy log argument for arrays: nothing is formatted unless the record is emitted, and then only
+    length, min/max and a few values from the head and the tail.
+
+    log.debug("captured %s", summary(bits)) costs one object and one level check when debug is off.
+    """
+    def __init__(self, values, edge=4):
+        self.values = values
+        self.edge = edge
+
+    def __str__(self):
+        values = np.asarray(self.values)
+        if values.size == 0:
+            return "[] (len=0)"
+        flat = values.ravel()
+        if flat.size <= 2 * self.edge:
+            return f"{flat.tolist()} (len={values.shape[-1] if values.ndim else 1})"
+        return (f"len={values.shape[-1]}{f' shape={values.shape}' if values.ndim > 1 else ''} "
+                f"min={flat.min()} max={flat.max()} "
+                f"head={flat[:self.edge].tolist()} tail={flat[-self.edge:].tolist()}")
+
+    __repr__ = __str__
+
+def get_logger(component):
+    """
+    Logger of one model or testbench component, its level is set by configure_logging().
+    """
+    return logging.getLogger(f"{LOGGER_ROOT}.{component}")
+
+def parse_verbosity(text):
+    """
+    Parses "INFO,driver=DEBUG,monitor=WARNING": a bare level sets the default of every component.
+
+    Returns:
+        dict: {component: level}, the default under the "" key.
+    """
+    levels = {}
+    for field in filter(None, (field.strip() for field in str(text).split(","))):
+        component, _, level = field.rpartition("=")
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"unknown log level {level} in {text}")
+        levels[component] = level
+    return levels
+
+def configure_logging(verbosity=None):
+    """
+    Sets the level of the sdm loggers.
+
+    Args:
+        verbosity (str or dict): See parse_verbosity(), $SDM_VERBOSITY (or INFO) if None.
+    """
+    if verbosity is None:
+        verbosity = os.environ.get(VERBOSITY_ENV, "INFO")
+    levels = parse_verbosity(verbosity) if isinstance(verbosity, str) else dict(verbosity)
+    root = logging.getLogger(LOGGER_ROOT)
+    root.setLevel(levels.pop("", "INFO"))
+    for component, level in levels.items():
+        get_logger(component).setLevel(level)
+    # Under cocotb the records go to its handler through the root logger
+    if not root.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(name)s | %(levelname)s | %(message)s"))
+        root.addHandler(handler)
@@ -0,0 +1,415 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Adding main_repo to path when run as a script
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+from model.adc_models import SDM_loopback_model
+from model.bitstream import SDM_bitstream
+from model.capture import open_capture
+from model.report import write_report
+from model.scoreboard import SDM_pcm_comparator, SDM_stream_comparator
+from model.trace import configure_logging, get_logger
+
+log = get_logger("waveform")
+
+# Bytes of the dump parsed at once, the memory bound of the reader is a small multiple of it
+DUMP_CHUNK = 1 << 22
+# Command converting an FST dump to VCD on stdout (GTKWave)
+FST2VCD = "fst2vcd"
+# First characters of a scalar value change
+SCALAR_VALUES = np.isin(np.arange(256), np.frombuffer(b"01xzXZ", dtype=np.uint8))
+
+def _open_dump(path):
+    """
+    Binary VCD stream of a .vcd file, or of an .fst file through fst2vcd.
+
+    Returns:
+        tuple: The stream and the converter process (None for a VCD).
+    """
+    if not path.endswith(".fst"):
+        return open(path, "rb"), None
+    if shutil.which(FST2VCD) is None:
+        raise RuntimeError(f"{FST2VCD} (GTKWave) is needed to read {path}, dump VCD instead (DUMP=vcd)")
+    process = subprocess.Popen([FST2VCD, "-f", path], stdout=subprocess.PIPE)
+    return process.stdout, process
+
+class SDM_vcd_reader():
+    """
+    Streaming sampler of a few signals of a VCD (or FST) waveform dump.
+
+    The dump is read DUMP_CHUNK bytes at a time and every chunk is cut at its last timestep marker, so
+    only complete timesteps are parsed and the rest is carried to the next chunk. A chunk is decoded
+    with NumPy as a whole, without a Python loop over its lines: line starts and first characters give
+    the timestep of every line and the kind of change, the identifiers of the requested signals are
+    compared byte by byte at their fixed position and vector values are summed from their bits.
+
+    The signals are sampled at the end of every timestep with a rising edge of clock or of trigger, which
+    is what a monitor reads in ReadOnly after RisingEdge. Values x and z read as 0, the vectors named
+    in signed are two's complement (e.g. audio_out).
+    """
+    def __init__(self, path, signals, clock="clk", trigger=None, signed=(), chunk_size=DUMP_CHUNK):
+        self.path = path
+        self.signals = list(signals)
+        self.signed = set(signed)
+        self.clock = clock
+        self.trigger = trigger
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.points = 0
+        self.elapsed = 0.0
+
+    def _header(self, stream):
+        """
+        Reads the declarations up to $enddefinitions and maps every wanted signal to its identifier.
+
+        Returns:
+            bytes: The start of the value changes read along with the header.
+        """
+        identifiers, widths, scope = {}, {}, []
+        data = b""
+        while b"$enddefinitions" not in data:
+            block = stream.read(1 << 16)
+            if not block:
+                raise ValueError(f"{self.path}: no $enddefinitions, not a VCD dump")
+            data += block
+        header, _, rest = data.partition(b"$enddefinitions")
+        rest = rest.partition(b"$end")[2]
+        self.bytes_read += len(data)
+        tokens = header.split()
+        for index, token in enumerate(tokens):
+            if token == b"$scope":
+                scope.append(tokens[index + 2].decode())
+            elif token == b"$upscope":
+                scope.pop()
+            elif token == b"$var":
+                width, identifier, name = int(tokens[index + 2]), tokens[index + 3], tokens[index + 4].decode()
+                # The signals of the outermost scope that has them, top above its submodules
+                if name not in identifiers or len(scope) < identifiers[name][1]:
+                    identifiers[name] = (identifier, len(scope))
+                    widths[name] = width
+        wanted = set(self.signals) | {self.clock} | ({self.trigger} if self.trigger else set())
+        missing = sorted(wanted - set(identifiers))
+        if missing:
+            raise ValueError(f"{self.path}: signals {missing} not in the dump")
+        self.identifiers = {name: identifiers[name][0] for name in wanted}
+        self.widths = {name: widths[name] for name in wanted}
+        return rest
+
+    def _changes(self, data, lines, name):
+        """
+        Timesteps and values of the changes of one signal in a chunk.
+
+        Scalar changes are "<value><identifier>", vector changes "b<bits> <identifier>", so the identifier
+        is compared at a fixed offset from the line start or end.
+        """
+        starts, ends, timesteps, scalar, vector = lines
+        identifier = np.frombuffer(self.identifiers[name], dtype=np.uint8)
+        length = len(identifier)
+        if self.widths[name] == 1:
+            selected = np.flatnonzero(scalar & (ends - starts == length + 1))
+            offsets = starts[selected] + 1
+        else:
+            selected = np.flatnonzero(vector)
+            selected = selected[(ends[selected] - starts[selected] > length + 1)
+                                & (data[ends[selected] - length - 1] == ord(" "))]
+            offsets = ends[selected] - length
+        for index, character in enumerate(identifier):
+            matching = data[offsets + index] == character
+            selected, offsets = selected[matching], offsets[matching]
+        if self.widths[name] == 1:
+            return timesteps[selected], (data[starts[selected]] == ord("1")).astype(np.uint8)
+        first, last = starts[selected] + 1, offsets - 1
+        values = np.zeros(len(selected), dtype=np.int64)
+        for bit in range(self.widths[name]):
+            position = last - 1 - bit
+            present = position >= first
+            values |= (present & (data[np.where(present, position, 0)] == ord("1"))).astype(np.int64) << bit
+        if name in self.signed:
+            values = np.where(values >> (self.widths[name] - 1), values - (1 << self.widths[name]), values)
+        return timesteps[selected], values
+
+    def _parse(self, data, timestep_offset):
+        """
+        Splits a chunk of complete timesteps into lines.
+
+        Returns:
+            tuple: start, end, timestep, is scalar and is vector change of every non-empty line.
+        """
+        newlines = np.flatnonzero(data == ord("\n"))
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [len(data)]))
+        # Trailing carriage returns and blank lines
+        ends -= (ends > starts) & (data[np.maximum(ends - 1, 0)] == ord("\r"))
+        nonempty = ends > starts
+        starts, ends = starts[nonempty], ends[nonempty]
+        first = data[starts]
+        timesteps = timestep_offset + np.cumsum(first == ord("#"))
+        return starts, ends, timesteps, SCALAR_VALUES[first], (first == ord("b")) | (first == ord("B"))
+
+    def _rising(self, timesteps, values, name):
+        previous = np.concatenate(([self.state[name]], values[:-1]))
+        return timesteps[(values == 1) & (previous == 0)]
+
+    def _sample(self, data, timestep_offset):
+        lines = self._parse(data, timestep_offset)
+        changes = {name: self._changes(data, lines, name) for name in self.identifiers}
+        edges = self._rising(*changes[self.clock], self.clock)
+        rises = self._rising(*changes[self.trigger], self.trigger) if self.trigger else np.zeros(0, dtype=np.int64)
+        points = np.union1d(edges, rises)
+        block = {"timestep": points, "clock": np.isin(points, edges), "trigger": np.isin(points, rises)}
+        for name, (timesteps, values) in changes.items():
+            # Value at the end of every sampled timestep, the carried state before the first change
+            index = np.searchsorted(timesteps, points, side="right")
+            if name in self.signals:
+                block[name] = np.concatenate((np.asarray([self.state[name]], dtype=values.dtype), values))[index]
+            if len(values):
+                self.state[name] = int(values[-1])
+        self.points += len(points)
+        return block, int(lines[2][-1]) if len(lines[2]) else timestep_offset
+
+    def blocks(self):
+        """
+        Yields the sampled signals chunk by chunk.
+
+        Yields:
+            dict: "timestep" (ordinal of every sampled timestep), "clock" and "trigger" (which edge it
+                has) and the value of every requested signal, uint8 for 1-bit and int64 for vectors.
+        """
+        stream, process = _open_dump(self.path)
+        start = time.perf_counter()
+        try:
+            data = self._header(stream)
+            self.state = {name: 0 for name in self.identifiers}
+            timestep_offset = 0
+            while True:
+                block = stream.read(self.chunk_size)
+                data += block
+                self.bytes_read += len(block)
+                if block:
+                    # Everything before the last timestep marker is complete
+                    cut = data.rfind(b"\n#")
+                    if cut <= 0:
+                        continue
+                    chunk, data = data[:cut + 1], data[cut + 1:]
+                else:
+                    chunk, data = data, b""
+                sampled, timestep_offset = self._sample(np.frombuffer(chunk, dtype=np.uint8), timestep_offset)
+                self.elapsed = time.perf_counter() - start
+                yield sampled
+                if not block:
+                    break
+        finally:
+            stream.close()
+            if process is not None:
+                process.wait()
+            self.elapsed = time.perf_counter() - start
+
+    def throughput(self):
+        """
+        Returns:
+            dict: bytes and sampled points read, seconds, MB/s and points/s of the parse so far.
+        """
+        seconds = max(self.elapsed, np.finfo(np.float64).tiny)
+        return {"bytes": self.bytes_read, "points": self.points, "seconds": self.elapsed,
+                "mb_per_second": self.bytes_read / seconds / 1e6, "points_per_second": self.points / seconds}
+
+class SDM_dump_capture():
+    """
+    What SDM_monitor captures from a dump: data at the first rising edge of valid, then at every
+    following rising clock edge, num_samples values in total.
+
+    The blocks of an SDM_vcd_reader with valid as its trigger are consumed one at a time, so several
+    captures can share a single pass over the dump.
+    """
+    def __init__(self, data, valid, num_samples):
+        self.data = data
+        self.valid = valid
+        self.num_samples = num_samples
+        self.captured = 0
+        self.started = False
+
+    @property
+    def done(self):
+        return self.captured == self.num_samples
+
+    def update(self, block):
+        """
+        Args:
+            block (dict): Next block of SDM_vcd_reader.blocks().
+
+        Returns:
+            SDM_bitstream: The part of the capture in the block, packed for a 1-bit signal (an int64
+                array for a vector).
+        """
+        if self.started:
+            selected = np.flatnonzero(block["clock"])
+        else:
+            rises = np.flatnonzero(block["trigger"] & (block[self.valid] == 1))
+            if len(rises):
+                # The point of the rise, then the clock edges after it
+                first = rises[0]
+                selected = np.concatenate(([first], first + 1 + np.flatnonzero(block["clock"][first + 1:])))
+                self.started = True
+            else:
+                selected = np.zeros(0, dtype=np.int64)
+        values = block[self.data][selected[:self.num_samples - self.captured]]
+        self.captured += len(values)
+        if values.dtype == np.uint8:
+            return SDM_bitstream.from_bits(values)
+        return values
+
+class SDM_dump_adc():
+    """
+    The ADC path of a dump: sdm_in/valid_in_adc at every rising clock edge and what SDM_pcm_monitor
+    captures, audio_out at every rising edge of valid_out_adc.
+
+    The inputs are sampled at the end of the edge timestep, which is what the ADC clocks in as long as
+    they are driven away from the rising edge (SDM_loopback drives them on the falling one).
+    """
+    SIGNALS = ["sdm_in", "valid_in_adc", "audio_out", "valid_out_adc"]
+
+    def __init__(self):
+        self.valid_before = 0
+
+    def update(self, block):
+        """
+        Args:
+            block (dict): Next block of an SDM_vcd_reader sampling SIGNALS with audio_out signed.
+
+        Returns:
+            tuple: sdm_in and valid_in_adc of every clock edge, int16 audio_out samples.
+        """
+        edges = np.flatnonzero(block["clock"])
+        valid = block["valid_out_adc"][edges]
+        previous = np.concatenate((np.asarray([self.valid_before], dtype=valid.dtype), valid[:-1]))
+        if len(valid):
+            self.valid_before = int(valid[-1])
+        samples = block["audio_out"][edges[(valid == 1) & (previous == 0)]].astype(np.int16)
+        return block["sdm_in"][edges], block["valid_in_adc"][edges], samples
+
+def write_dump_manifest(dump_file, expected, exact=False, fail_threshold=None, adc_type=None, dac_signal=None):
+    """
+    Stores what the scoreboards would have compared the outputs with next to a dump, for check_dump().
+
+    Args:
+        dump_file (str): The dump the simulator writes.
+        expected (SDM_bitstream): Expected sdm_out capture, saved packed to <dump_file>.expected.npy.
+        exact (bool): Bit-exact comparison instead of the moving-average statistic.
+        fail_threshold (float): See SDM_stream_comparator.
+        adc_type (int): ADC of top whose audio_out is checked against ADC_MODELS, None to skip it.
+        dac_signal (SDM_bitstream): Bit-exact DAC model output when sdm_out was looped back into the
+            ADC, saved to <dump_file>.dac.npy for the end-to-end check of SDM_loopback_model.
+
+    Returns:
+        str: Path of the <dump_file>.json manifest.
+    """
+    np.save(f"{dump_file}.expected.npy", np.asarray(expected.packed, dtype=np.uint8))
+    manifest = {"dump_file": dump_file, "expected": f"{dump_file}.expected.npy", "num_bits": len(expected),
+                "exact": bool(exact), "fail_threshold": fail_threshold, "adc_type": adc_type, "dac": None}
+    if dac_signal is not None:
+        np.save(f"{dump_file}.dac.npy", np.asarray(dac_signal.packed, dtype=np.uint8))
+        manifest.update(dac=f"{dump_file}.dac.npy", dac_bits=len(dac_signal))
+    with open(f"{dump_file}.json", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return f"{dump_file}.json"
+
+def check_dump(manifest_path, chunk_size=DUMP_CHUNK):
+    """
+    Checks the outputs of a dump against the expectations the testbench stored with it.
+
+    The manifest written next to the dump names the dump, the packed expected bitstream and the
+    scoreboard settings. sdm_out is checked block by block with SDM_stream_comparator, the statistic of
+    the cocotb scoreboards. With an adc_type, audio_out is compared bit-exactly with the ADC model fed
+    with the dumped sdm_in/valid_in_adc and, when sdm_out was looped back (dac in the manifest), with
+    the chained DAC -> ADC models like SDM_loopback_scoreboard. Everything comes from one pass over
+    the dump; the captures are written to $SDM_CAPTURE_DIR when it is set and reported with
+    write_report() like a simulation.
+
+    Returns:
+        dict: The sdm_out comparator result, "captured" bits, adc_/end_to_end_ results of audio_out
+            and the parse throughput of the reader.
+    """
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    expected = SDM_bitstream(np.load(manifest["expected"], mmap_mode="r"), manifest["num_bits"])
+    comparator = SDM_stream_comparator(window=256, threshold=0.1, fail_threshold=manifest.get("fail_threshold"),
+                                       exact=bool(manifest["exact"]), record_every=256)
+    dac = SDM_dump_capture("sdm_out", "valid_out_dac", len(expected))
+    signals = ["sdm_out", "valid_out_dac"]
+    adc_type = manifest.get("adc_type")
+    if adc_type is not None:
+        dac_signal = None
+        if manifest.get("dac"):
+            dac_signal = SDM_bitstream(np.load(manifest["dac"], mmap_mode="r"), manifest["dac_bits"])
+        adc = SDM_dump_adc()
+        # Without a loopback the chained model has no DAC stream and stays idle
+        adc_model = SDM_loopback_model(adc_type, dac_signal if dac_signal is not None else SDM_bitstream.empty(0))
+        adc_comparator = SDM_pcm_comparator()
+        end_to_end = SDM_pcm_comparator(exact=bool(manifest["exact"])) if dac_signal is not None else None
+        signals += SDM_dump_adc.SIGNALS
+    capture = open_capture("sdm_out", np.uint8)
+    audio_capture = open_capture("audio_out", np.int16) if adc_type is not None else None
+    reader = SDM_vcd_reader(manifest["dump_file"], signals, clock="clk", trigger="valid_out_dac",
+                            signed=["audio_out"], chunk_size=chunk_size)
+    for block in reader.blocks():
+        got = dac.update(block)
+        if len(got):
+            comparator.update(got, expected[dac.captured - len(got):dac.captured])
+            if capture is not None:
+                capture.write(got.to_bits())
+        if adc_type is not None:
+            din, valid_in, samples = adc.update(block)
+            modelled = adc_model.process(din, valid_in)
+            adc_comparator.update(samples, modelled["adc"])
+            if end_to_end is not None:
+                end_to_end.update(samples, modelled["chained"])
+            if audio_capture is not None:
+                audio_capture.write(samples)
+        elif dac.done:
+            break
+        log.debug("%d bits, %.1f MB/s", dac.captured, reader.throughput()["mb_per_second"])
+    for opened in (capture, audio_capture):
+        if opened is not None:
+            opened.close()
+    result = dict(comparator.result(), captured=dac.captured, **reader.throughput())
+    # A dump that ends early leaves expected bits uncompared
+    result["passed"] = comparator.passed and dac.done
+    panels = [{"title": 'avg filtered dut / model',
+               "series": [{"x": comparator.recorded_index, "y": comparator.recorded_got, "color": 'r', "label": 'dut'},
+                          {"x": comparator.recorded_index, "y": comparator.recorded_exp, "color": 'b', "label": 'model'}]}]
+    if adc_type is not None:
+        checks = [("adc", adc_comparator, 'audio_out / ADC model (last block)')]
+        if end_to_end is not None:
+            checks.append(("end_to_end", end_to_end, 'audio_out / DAC -> ADC model (last block)'))
+            # A loopback that never produced a sample checked nothing
+            result["passed"] = result["passed"] and adc_comparator.position > 0
+        for prefix, pcm, title in checks:
+            result.update({f"{prefix}_{key}": value for key, value in pcm.result().items()})
+            result["passed"] = result["passed"] and pcm.passed
+            panels.append({"title": title, "series": [{"y": pcm.last_got, "color": 'r', "label": 'dut'},
+                                                      {"y": pcm.last_exp, "color": 'b', "label": 'model'}]})
+    log.info("%s: %s", manifest["dump_file"], result)
+    write_report(os.path.basename(manifest["dump_file"]).replace(".", "_") + "_check", panels, metrics=result)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the outputs of a VCD/FST dump against the expectations stored with it.")
+    parser.add_argument("manifest", help="<dump file>.json written by the testbench with DUMP=vcd|fst")
+    parser.add_argument("--chunk-mb", type=float, default=DUMP_CHUNK / (1 << 20), help="bytes parsed at once")
+    args = parser.parse_args()
+
+    configure_logging()
+    result = check_dump(args.manifest, int(args.chunk_mb * (1 << 20)))
+    log.info("parsed %.1f MB in %.2f s: %.1f MB/s, %.0f points/s", result["bytes"] / 1e6, result["seconds"],
+             result["mb_per_second"], result["points_per_second"])
+    sys.exit(0 if result["passed"] else 1)
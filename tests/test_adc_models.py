@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Adding main_repo to path when run from the repository root
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+from model.adc_models import ADC_MODELS, SDM_loopback_model
+
+BLOCK = 5000
+
+def _stimulus(num_cycles=20 * BLOCK, seed=3):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2, num_cycles).astype(np.bool_), rng.random(num_cycles) < 0.9
+
+@pytest.mark.parametrize("adc_type", sorted(ADC_MODELS))
+def test_empty_blocks_leave_the_output_unchanged(adc_type):
+    din, valid_in = _stimulus()
+    reference = ADC_MODELS[adc_type]().process(din, valid_in, trace=True)
+    model = ADC_MODELS[adc_type]()
+    outputs = []
+    for start in range(0, len(din), BLOCK):
+        # An empty block between every pair, e.g. a dump chunk without a clock edge
+        outputs.append(model.process(din[:0], valid_in[:0], trace=True))
+        outputs.append(model.process(din[start:start + BLOCK], valid_in[start:start + BLOCK], trace=True))
+    for key, expected in reference.items():
+        np.testing.assert_array_equal(np.concatenate([output[key] for output in outputs]), expected, err_msg=key)
+
+@pytest.mark.parametrize("adc_type", sorted(ADC_MODELS))
+def test_loopback_model_with_empty_blocks(adc_type):
+    din, valid_in = _stimulus()
+    reference = SDM_loopback_model(adc_type, din).process(din, valid_in)
+    model = SDM_loopback_model(adc_type, din)
+    samples = {"adc": [], "chained": []}
+    for start in range(0, len(din), BLOCK):
+        for block in (model.process(din[:0], valid_in[:0]),
+                      model.process(din[start:start + BLOCK], valid_in[start:start + BLOCK])):
+            for key in samples:
+                samples[key].append(block[key])
+    for key, expected in reference.items():
+        np.testing.assert_array_equal(np.concatenate(samples[key]), expected, err_msg=key)
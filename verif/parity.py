@@ -0,0 +1,120 @@
+# Icarus/Verilator parity of the testbenches
+#
+#   python parity.py --orders 1 2 --adc-types 0 1 --uvm 0 1
+#   python parity.py --define EXACT=1 --define BURST=4096 --output parity_exact
+#
+# Every configuration runs on both simulators through the regression runner (one job each, same
+# seed and defines), the sdm_out/audio_out captures of the scoreboards are compared sample for
+# sample and the simulated cycles per second of both runs are reported. <output>/parity.json lists
+# the faster simulator of every configuration, regression.py --sim-from picks it up.
+import argparse
+import json
+import os
+import sys
+
+from regression import VERIF_DIR, _define, configuration_name, expand_matrix, run_regression
+
+# Adding main_repo to path to use relative imports
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
+
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+from model.capture import compare_captures, list_captures
+from model.trace import configure_logging, get_logger
+
+log = get_logger("parity")
+
+SIMULATORS = ("icarus", "verilator")
+
+def check_parity(results, simulators=SIMULATORS):
+    """
+    Pairs the jobs of the same configuration and seed and compares their captures.
+
+    Args:
+        results (list): Job results of run_regression(), every configuration on every simulator.
+        simulators (list): The first one is the reference the others are compared against.
+
+    Returns:
+        list: One dict per configuration and seed with configuration, seed, passed ({sim: bool}),
+            captures ({sim: compare_captures() against the reference}), identical,
+            cycles_per_second ({sim: float}), faster and speedup (faster over slower cycles/s).
+    """
+    runs = {}
+    for result in results:
+        runs.setdefault((configuration_name(result), result["seed"]), {})[result["sim"]] = result
+    checks = []
+    for (name, seed), by_sim in sorted(runs.items()):
+        reference = by_sim.get(simulators[0])
+        check = {"configuration": name, "seed": seed, "passed": {sim: run["passed"] for sim, run in by_sim.items()},
+                 "captures": {}, "cycles_per_second": {sim: run["cycles_per_second"] for sim, run in by_sim.items()}}
+        identical = reference is not None and len(by_sim) == len(simulators)
+        for sim in simulators[1:]:
+            if reference is None or sim not in by_sim:
+                continue
+            # A capture written by only one of the simulators is reported as missing, not skipped
+            names = sorted(set(list_captures(reference["captures"])) | set(list_captures(by_sim[sim]["captures"])))
+            check["captures"][sim] = compare_captures(reference["captures"], by_sim[sim]["captures"], names)
+            identical = identical and bool(names) and all(capture["identical"]
+                                                          for capture in check["captures"][sim].values())
+        check["identical"] = identical
+        speeds = {sim: speed for sim, speed in check["cycles_per_second"].items() if speed}
+        check["faster"] = max(speeds, key=speeds.get) if speeds else None
+        check["speedup"] = max(speeds.values()) / min(speeds.values()) if len(speeds) > 1 else None
+        checks.append(check)
+    return checks
+
+def fastest_simulators(checks):
+    """
+    Returns:
+        dict: {configuration name: simulator} of the configurations whose runs are identical, the
+            simulator with the highest cycles per second over all seeds.
+    """
+    speeds = {}
+    for check in checks:
+        if not check["identical"]:
+            continue
+        for sim, speed in check["cycles_per_second"].items():
+            speeds.setdefault(check["configuration"], {}).setdefault(sim, []).append(speed or 0.0)
+    return {name: max(by_sim, key=lambda sim: sum(by_sim[sim]) / len(by_sim[sim])) for name, by_sim in speeds.items()}
+
+def run_parity(orders=(1, 2), adc_types=(0, 1), uvm=(0, 1), seeds=(1,), defines=None, output_dir="parity",
+               max_workers=None, timeout=None, simulators=SIMULATORS):
+    """
+    Runs the matrix on every simulator and writes <output_dir>/parity.json.
+
+    Returns:
+        list: See check_parity().
+    """
+    jobs = expand_matrix(orders, adc_types, uvm, seeds, list(simulators), defines)
+    checks = check_parity(run_regression(jobs, output_dir, max_workers, timeout), simulators)
+    for check in checks:
+        captures = ", ".join(f"{name} {capture['length']}/{capture['other_length']} samples, "
+                             f"{capture['mismatches']} mismatches"
+                             for by_name in check["captures"].values() for name, capture in by_name.items())
+        speeds = ", ".join(f"{sim} {speed:.0f} cycles/s" if speed else f"{sim} -"
+                           for sim, speed in check["cycles_per_second"].items())
+        log.info("%s seed %d: %s (%s), %s%s", check["configuration"], check["seed"],
+                 "IDENTICAL" if check["identical"] else "DIFFERENT", captures or "no captures", speeds,
+                 f", {check['faster']} {check['speedup']:.1f}x faster" if check["speedup"] else "")
+    with open(os.path.join(os.path.abspath(output_dir), "parity.json"), "w") as json_file:
+        json.dump({"simulators": list(simulators), "identical": all(check["identical"] for check in checks),
+                   "fastest": fastest_simulators(checks), "checks": checks}, json_file, indent=2)
+    return checks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Icarus/Verilator parity of the SDM testbenches.")
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--adc-types", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--uvm", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1])
+    parser.add_argument("--define", type=_define, action="append", default=[],
+                        help="extra Makefile variable of every job, e.g. EXACT=1")
+    parser.add_argument("--jobs", type=int, default=None, help="concurrent simulations, all CPUs by default")
+    parser.add_argument("--timeout", type=float, default=None, help="per-job limit in seconds")
+    parser.add_argument("--output", default=os.path.join(VERIF_DIR, "regression_parity"))
+    args = parser.parse_args()
+
+    configure_logging()
+    checks = run_parity(args.orders, args.adc_types, args.uvm, args.seeds, dict(args.define), args.output, args.jobs,
+                        args.timeout)
+    sys.exit(0 if all(check["identical"] and all(check["passed"].values()) for check in checks) else 1)
@@ -0,0 +1,267 @@
+# Parallel regression over the ORDER x ADC_TYPE x UVM matrix
+#
+#   python regression.py --orders 1 2 --adc-types 0 1 --uvm 0 1 --seeds 1 2 --jobs 8
+#   python regression.py --define EXACT=1 --define BURST=4096 --output regression_exact
+#   python regression.py --sim-from regression_parity/parity.json
+#
+# Every job runs the verif Makefile with its own SIM_BUILD, results.xml and report directory, so
+# jobs never share a sim_build and clean_dirs is not needed. The HDL is compiled once per
+# (SIM, ORDER, ADC_TYPE, COMPILE_DEFINES) into <output>/compiled, make keeps it up to date across
+# regressions and the jobs start from a copy of it. DUMP jobs also run the offline dump_check.
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+# Adding main_repo to path to use relative imports
+parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
+
+if parent_path not in sys.path:
+    sys.path.append(parent_path)
+from model.trace import configure_logging, get_logger
+
+log = get_logger("regression")
+
+VERIF_DIR = os.path.abspath(os.path.dirname(__file__))
+# Period of top.clk in the testbenches
+CLOCK_PERIOD_NS = 354.6
+# Compiled model of every simulator, relative to SIM_BUILD (cocotb Makefile targets)
+COMPILED_TARGETS = {"icarus": "sim.vvp", "verilator": "Vtop"}
+# Makefile variables that change the compiled model, part of the build key
+COMPILE_DEFINES = ("DUMP",)
+
+def configuration_name(job):
+    """
+    Returns:
+        str: Name of the HDL/testbench configuration of a job, without the simulator and the seed.
+    """
+    return f"order{job['order']}_adc{job['adc_type']}_uvm{job['uvm']}"
+
+def expand_matrix(orders=(1, 2), adc_types=(0, 1), uvm=(0, 1), seeds=(1,), sim="icarus", defines=None):
+    """
+    Expands the configuration matrix into job descriptions.
+
+    Args:
+        sim (str or list): Simulator of the jobs, a list runs every configuration on each of them.
+
+    Returns:
+        list: One dict per job with name, sim, order, adc_type, uvm, seed and defines.
+    """
+    sims = [sim] if isinstance(sim, str) else list(sim)
+    jobs = [{"sim": sim_name, "order": order, "adc_type": adc_type, "uvm": uvm_flag, "seed": seed,
+             "defines": dict(defines or {})}
+            for sim_name, order, adc_type, uvm_flag, seed in itertools.product(sims, orders, adc_types, uvm, seeds)]
+    return [dict(job, name=f"{job['sim']}_{configuration_name(job)}_seed{job['seed']}") for job in jobs]
+
+def assign_simulators(jobs, fastest):
+    """
+    Moves every job to the simulator recorded as the fastest for its configuration.
+
+    Args:
+        jobs (list): See expand_matrix().
+        fastest (dict): {configuration_name(job): sim}, e.g. the "fastest" entry of parity.json.
+
+    Returns:
+        list: The jobs, renamed; configurations missing from fastest keep their simulator.
+    """
+    jobs = [dict(job, sim=fastest.get(configuration_name(job), job["sim"])) for job in jobs]
+    return [dict(job, name=f"{job['sim']}_{configuration_name(job)}_seed{job['seed']}") for job in jobs]
+
+def _make(arguments, log_path, timeout=None, environment=None):
+    # The Makefile builds the source paths from $(PWD), which make -C does not update
+    environment = dict(environment or os.environ, PWD=VERIF_DIR)
+    with open(log_path, "w") as log_file:
+        process = subprocess.run(["make"] + arguments, cwd=VERIF_DIR, stdout=log_file, stderr=subprocess.STDOUT,
+                                 env=environment, timeout=timeout)
+    return process.returncode
+
+def _build_key(job):
+    """
+    Returns:
+        tuple: sim, order, adc_type and the sorted (name, value) pairs of the COMPILE_DEFINES of a job.
+    """
+    defines = tuple(sorted((key, str(value)) for key, value in job["defines"].items()
+                           if key in COMPILE_DEFINES and value))
+    return job["sim"], job["order"], job["adc_type"], defines
+
+def _build_name(job):
+    sim, order, adc_type, defines = _build_key(job)
+    return f"{sim}_order{order}_adc{adc_type}" + "".join(f"_{key.lower()}{value}" for key, value in defines)
+
+def _compile(task):
+    """
+    Worker: builds (or refreshes) the compiled model of one HDL parameter set.
+    """
+    sim, order, adc_type, defines, build_dir = task
+    os.makedirs(build_dir, exist_ok=True)
+    start = time.perf_counter()
+    returncode = _make([f"SIM={sim}", f"ORDER={order}", f"ADC_TYPE={adc_type}", f"SIM_BUILD_DIR={build_dir}"]
+                       + [f"{key}={value}" for key, value in defines]
+                       + [os.path.join(build_dir, COMPILED_TARGETS[sim])], os.path.join(build_dir, "compile.log"))
+    return {"build_dir": build_dir, "returncode": returncode, "compile_time": time.perf_counter() - start}
+
+def _parse_results(results_path):
+    """
+    Returns:
+        tuple: (tests, failures, simulated ns, test real time) of a cocotb results.xml, None if missing.
+    """
+    if not os.path.exists(results_path):
+        return None
+    tests = failures = 0
+    sim_time_ns = real_time = 0.0
+    for testcase in ET.parse(results_path).getroot().iter("testcase"):
+        tests += 1
+        failures += any(child.tag in ("failure", "error") for child in testcase)
+        sim_time_ns += float(testcase.get("sim_time_ns", 0))
+        real_time += float(testcase.get("real_time", testcase.get("time", 0)))
+    return tests, failures, sim_time_ns, real_time
+
+def _run_job(task):
+    """
+    Worker: runs one simulation in its own directory and summarises it.
+    """
+    job, job_dir, compiled_dir, timeout = task
+    shutil.rmtree(job_dir, ignore_errors=True)
+    build_dir = os.path.join(job_dir, "sim_build")
+    # copy2 keeps the mtimes, so make sees the compiled model as up to date
+    shutil.copytree(compiled_dir, build_dir, copy_function=shutil.copy2)
+    results_path = os.path.join(job_dir, "results.xml")
+    environment = dict(os.environ, SDM_REPORT_DIR=os.path.join(job_dir, "reports"),
+                       SDM_CAPTURE_DIR=os.path.join(job_dir, "captures"),
+                       RANDOM_SEED=str(job["seed"]), COCOTB_RANDOM_SEED=str(job["seed"]))
+    arguments = [f"SIM={job['sim']}", f"ORDER={job['order']}", f"ADC_TYPE={job['adc_type']}", f"UVM={job['uvm']}",
+                 f"SIM_BUILD_DIR={build_dir}", f"COCOTB_RESULTS_FILE={results_path}"]
+    arguments += [f"{key}={value}" for key, value in job["defines"].items()]
+    arguments.append("all")  # the default goal is clean_dirs
+    if job["defines"].get("DUMP"):
+        # The testbench only writes the dump, the comparison runs afterwards
+        arguments.append("dump_check")
+
+    start = time.perf_counter()
+    try:
+        returncode = _make(arguments, os.path.join(job_dir, "sim.log"), timeout, environment)
+        message = None if returncode == 0 else f"make exited with {returncode}"
+    except subprocess.TimeoutExpired:
+        returncode, message = None, f"timeout after {timeout} s"
+    wall_time = time.perf_counter() - start
+
+    parsed = _parse_results(results_path)
+    if parsed is None:
+        tests, failures, sim_time_ns, real_time = 0, 0, 0.0, 0.0
+        message = message or "no results.xml"
+    else:
+        tests, failures, sim_time_ns, real_time = parsed
+        if failures:
+            message = f"{failures} of {tests} tests failed"
+    cycles = sim_time_ns / CLOCK_PERIOD_NS
+    return dict(job, directory=job_dir, captures=os.path.join(job_dir, "captures"), returncode=returncode,
+                passed=message is None and tests > 0, message=message, tests=tests, failures=failures,
+                wall_time=wall_time, simulated_cycles=cycles, cycles_per_second=cycles / real_time if real_time else None)
+
+def _build_failed(job, job_dir, build):
+    """
+    Result of a job whose compiled model did not build, the job is not run.
+    """
+    os.makedirs(job_dir, exist_ok=True)
+    return dict(job, directory=job_dir, captures=os.path.join(job_dir, "captures"), returncode=None, passed=False,
+                message=f"compile failed (make exited with {build['returncode']}), see "
+                        f"{os.path.join(build['build_dir'], 'compile.log')}",
+                tests=0, failures=0, wall_time=0.0, simulated_cycles=0.0, cycles_per_second=None)
+
+def write_junit(results, path, name="sdm_regression"):
+    """
+    Writes the job results as one JUnit test suite, one test case per job.
+    """
+    suite = ET.Element("testsuite", name=name, tests=str(len(results)),
+                       failures=str(sum(not result["passed"] for result in results)),
+                       time=f"{sum(result['wall_time'] for result in results):.3f}")
+    for result in results:
+        testcase = ET.SubElement(suite, "testcase", classname=name, name=result["name"], time=f"{result['wall_time']:.3f}")
+        properties = ET.SubElement(testcase, "properties")
+        for key in ("order", "adc_type", "uvm", "seed", "simulated_cycles", "cycles_per_second"):
+            ET.SubElement(properties, "property", name=key, value=str(result[key]))
+        if not result["passed"]:
+            ET.SubElement(testcase, "failure", message=result["message"] or "failed").text = \
+                os.path.join(result["directory"], "sim.log")
+    testsuites = ET.Element("testsuites")
+    testsuites.append(suite)
+    ET.ElementTree(testsuites).write(path, encoding="utf-8", xml_declaration=True)
+
+def run_regression(jobs, output_dir="regression", max_workers=None, timeout=None):
+    """
+    Runs the jobs on a process pool.
+
+    Args:
+        jobs (list): See expand_matrix().
+        output_dir (str): Root of compiled/, jobs/<name>/, results.json and results.xml.
+        max_workers (int): Concurrent simulations, os.cpu_count() if None.
+        timeout (float): Per-job limit in seconds.
+
+    Returns:
+        list: One result dict per job, in job order.
+    """
+    output_dir = os.path.abspath(output_dir)
+    compiled = {_build_key(job): os.path.join(output_dir, "compiled", _build_name(job)) for job in jobs}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        builds = {build["build_dir"]: build for build in
+                  executor.map(_compile, [key + (build_dir,) for key, build_dir in compiled.items()])}
+        for build in builds.values():
+            if build["returncode"]:
+                log.error("compile of %s failed (make exited with %d), see %s", build["build_dir"], build["returncode"],
+                          os.path.join(build["build_dir"], "compile.log"))
+            else:
+                log.info("compiled %s in %.1f s", build["build_dir"], build["compile_time"])
+        tasks = [(job, os.path.join(output_dir, "jobs", job["name"]),
+                  compiled[_build_key(job)], timeout) for job in jobs]
+        # Jobs of a failed build fail right away instead of running a broken or empty copy of it
+        runnable = [task for task in tasks if builds[task[2]]["returncode"] == 0]
+        ran = dict(zip((task[0]["name"] for task in runnable), executor.map(_run_job, runnable)))
+        results = []
+        for job, job_dir, build_dir, _ in tasks:
+            result = ran.get(job["name"]) or _build_failed(job, job_dir, builds[build_dir])
+            log.info("%s: %s in %.1f s%s", result["name"], "PASS" if result["passed"] else "FAIL", result["wall_time"],
+                     f" ({result['message']})" if result["message"] else "")
+            results.append(result)
+
+    with open(os.path.join(output_dir, "results.json"), "w") as json_file:
+        json.dump({"wall_time": time.perf_counter() - start, "passed": sum(result["passed"] for result in results),
+                   "failed": sum(not result["passed"] for result in results), "jobs": results}, json_file, indent=2)
+    write_junit(results, os.path.join(output_dir, "results.xml"))
+    return results
+
+def _define(text):
+    key, separator, value = text.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text}")
+    return key, value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel regression of the SDM testbenches.")
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--adc-types", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--uvm", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1])
+    parser.add_argument("--sim", nargs="+", default=["icarus"], choices=sorted(COMPILED_TARGETS))
+    parser.add_argument("--sim-from", default=None,
+                        help="parity.json of parity.py, every configuration runs on its fastest simulator")
+    parser.add_argument("--define", type=_define, action="append", default=[],
+                        help="extra Makefile variable of every job, e.g. EXACT=1")
+    parser.add_argument("--jobs", type=int, default=None, help="concurrent simulations, all CPUs by default")
+    parser.add_argument("--timeout", type=float, default=None, help="per-job limit in seconds")
+    parser.add_argument("--output", default=os.path.join(VERIF_DIR, "regression"))
+    args = parser.parse_args()
+
+    configure_logging()
+    jobs = expand_matrix(args.orders, args.adc_types, args.uvm, args.seeds, args.sim, dict(args.define))
+    if args.sim_from:
+        with open(args.sim_from) as parity_file:
+            jobs = assign_simulators(jobs, json.load(parity_file)["fastest"])
+    results = run_regression(jobs, args.output, args.jobs, args.timeout)
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
@@ -1,7 +1,7 @@
 # Cocotb
 import cocotb
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, Timer, FallingEdge, ClockCycles, ReadOnly
+from cocotb.triggers import RisingEdge, Timer, FallingEdge, ClockCycles, ReadOnly, Event
 
 # Cocotb-bus
 from cocotb_bus.drivers import Driver
@@ -12,19 +12,34 @@ from cocotb_bus.scoreboard import Scoreboard
 import numpy as np
 import sys
 import os
-import matplotlib.pyplot as plt
-from scipy.signal import resample
-from scipy.signal import firwin, lfilter, decimate
-import collections
+import time
 # Adding main_repo to path to use relative imports
 parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
 
 if parent_path not in sys.path:
     sys.path.append(parent_path)
 # Model
-from model.SDM import convert_audio_to_sdm, sigma_delta_demodulator_fir
-# Misc
-sys.setrecursionlimit(10000000)
+from model.scoreboard import SDM_stream_comparator, SDM_pcm_comparator
+from model.trace import configure_logging, get_logger, summary
+from model.report import write_report
+from model.golden import golden_outputs
+from model.stimulus import SDM_multitone, stimulus_from_spec
+from model.spectrum import SDM_spectrum_analyser, compare_spectra, spectrum_panel
+from model.capture import open_capture
+from model.adc_models import ADC_MODELS, SDM_loopback_model
+from model.waveform import write_dump_manifest
+
+# Per-component loggers, levels from the +VERBOSITY plusarg (e.g. +VERBOSITY=INFO,scoreboard=DEBUG)
+log_model = get_logger("model")
+log_monitor = get_logger("monitor")
+log_scoreboard = get_logger("scoreboard")
+
+# Cycles the loopback runs on top of the DAC stream: lead-in before valid_out_dac rises and ADC latency
+LOOPBACK_DRAIN = 1024
+# Looped-back cycles and audio_out samples published at once
+LOOPBACK_BLOCK = 1 << 16
+# clk cycles simulated after the stimulus in dump mode, the DAC stream ends within one audio sample
+DUMP_DRAIN = 256
 
 class SDM_transaction:
     def __init__(self, data=[], valid=0):
@@ -61,7 +76,7 @@ class SDM_reset_driver(Driver):
         await RisingEdge(self.clk)
 
 class SDM_monitor(Monitor):
-    def __init__(self, clk, name, data_out, valid_out, num_of_probes, callback=None, event=None):
+    def __init__(self, clk, name, data_out, valid_out, num_of_probes, callback=None, event=None, block_size=None):
         self.clk = clk
         self.name = name
         self.data_out = data_out
@@ -69,9 +84,16 @@ class SDM_monitor(Monitor):
         self.num_of_probes = num_of_probes
         self.trans = SDM_transaction()
         self.temp_list_of_probes = []
+        # Burst capture: probes go to a preallocated array, one transaction per block_size probes
+        self.block_size = block_size
+        self.done = Event()
+        self.cycles_per_second = None
         super().__init__(callback=callback, event=event)
 
     async def _monitor_recv(self):
+        if self.block_size:
+            await self._monitor_recv_blocks()
+            return
         while True:
             await RisingEdge(self.valid_out)
             await ReadOnly()
@@ -81,76 +103,222 @@ class SDM_monitor(Monitor):
                 await RisingEdge(self.clk)
             self._recv(self.temp_list_of_probes)
 
+    async def _monitor_recv_blocks(self):
+        buffer = np.empty(self.block_size, dtype=np.uint8)
+        await RisingEdge(self.valid_out)
+        await ReadOnly()
+        start = time.perf_counter()
+        for index in range(self.num_of_probes):
+            await ReadOnly()
+            position = index % self.block_size
+            buffer[position] = int(self.data_out.value)
+            if position == self.block_size - 1 or index == self.num_of_probes - 1:
+                self._recv(buffer[:position + 1].copy())
+            await RisingEdge(self.clk)
+        self.cycles_per_second = self.num_of_probes / (time.perf_counter() - start)
+        log_monitor.info("%s: captured %d cycles, %.0f cycles/s", self.name, self.num_of_probes, self.cycles_per_second)
+        self.done.set()
+
+class SDM_loopback(Monitor):
+    """
+    Feeds sdm_out/valid_out_dac back into sdm_in/valid_in_adc for num_cycles clk cycles.
+
+    The DAC outputs are copied on every falling edge, so on the next rising edge the ADC samples what a
+    wire from sdm_out would give it. The driven (din, valid_in) arrays are published in blocks of
+    block_size cycles for SDM_loopback_model.
+    """
+    def __init__(self, clk, sdm_out, valid_out, sdm_in, valid_in, num_cycles, callback=None, block_size=LOOPBACK_BLOCK):
+        self.clk = clk
+        self.sdm_out = sdm_out
+        self.valid_out = valid_out
+        self.sdm_in = sdm_in
+        self.valid_in = valid_in
+        self.num_cycles = num_cycles
+        self.block_size = block_size
+        self.done = Event()
+        super().__init__(callback=callback)
+
+    async def _monitor_recv(self):
+        din = np.empty(self.block_size, dtype=np.uint8)
+        valid_in = np.empty(self.block_size, dtype=np.uint8)
+        for index in range(self.num_cycles):
+            await FallingEdge(self.clk)
+            position = index % self.block_size
+            din[position] = bit = int(self.sdm_out.value)
+            valid_in[position] = valid = int(self.valid_out.value)
+            self.sdm_in.value = bit
+            self.valid_in.value = valid
+            if position == self.block_size - 1 or index == self.num_cycles - 1:
+                self._recv((din[:position + 1].copy(), valid_in[:position + 1].copy()))
+        self.done.set()
+
+class SDM_pcm_monitor(Monitor):
+    """
+    Samples data_out at every rising edge of valid_out during num_cycles clk cycles (the convention of the
+    ADC models) and publishes int16 blocks of block_size samples.
+    """
+    def __init__(self, clk, name, data_out, valid_out, num_cycles, callback=None, block_size=LOOPBACK_BLOCK):
+        self.clk = clk
+        self.name = name
+        self.data_out = data_out
+        self.valid_out = valid_out
+        self.num_cycles = num_cycles
+        self.block_size = block_size
+        self.done = Event()
+        self.cycles_per_second = None
+        super().__init__(callback=callback)
+
+    async def _monitor_recv(self):
+        buffer = np.empty(self.block_size, dtype=np.int16)
+        count = 0
+        previous = 0
+        start = time.perf_counter()
+        for _ in range(self.num_cycles):
+            await RisingEdge(self.clk)
+            await ReadOnly()
+            valid = int(self.valid_out.value)
+            if valid and not previous:
+                buffer[count] = self.data_out.value.signed_integer
+                count += 1
+                if count == self.block_size:
+                    self._recv(buffer.copy())
+                    count = 0
+            previous = valid
+        if count:
+            self._recv(buffer[:count].copy())
+        self.cycles_per_second = self.num_cycles / (time.perf_counter() - start)
+        log_monitor.info("%s: monitored %d cycles, %.0f cycles/s", self.name, self.num_cycles, self.cycles_per_second)
+        self.done.set()
+
+class SDM_loopback_scoreboard():
+    """
+    Checks audio_out of the loopback block by block as both monitors publish.
+
+    The ADC path is compared bit-exactly against the ADC model fed with the looped-back bits. The end to
+    end PCM-in/PCM-out comparison runs against the chained DAC -> ADC models of the stimulus, bit-exact
+    with exact, otherwise within the mean error threshold of SDM_pcm_comparator.
+    """
+    def __init__(self, adc_type, dac_signal, exact=False):
+        self.model = SDM_loopback_model(adc_type, dac_signal)
+        self.adc = SDM_pcm_comparator()
+        self.end_to_end = SDM_pcm_comparator(exact=exact)
+        # audio_out as captured, written to $SDM_CAPTURE_DIR for the simulator parity check
+        self.capture = open_capture("audio_out", np.int16)
+
+    def loopback_received(self, block):
+        expected = self.model.process(*block)
+        self.adc.update(exp=expected["adc"])
+        self.end_to_end.update(exp=expected["chained"])
+
+    def audio_received(self, samples):
+        self.adc.update(got=samples)
+        self.end_to_end.update(got=samples)
+        if self.capture is not None:
+            self.capture.write(samples)
+
+    @property
+    def passed(self):
+        return self.adc.position > 0 and self.adc.passed and self.end_to_end.passed
+
+    def report(self, name="simple_top_tb_loopback"):
+        if self.capture is not None:
+            self.capture.close()
+        metrics = {f"adc_{key}": value for key, value in self.adc.result().items()}
+        metrics.update({f"end_to_end_{key}": value for key, value in self.end_to_end.result().items()})
+        log_scoreboard.info("loopback: %s", metrics)
+        panels = [
+            {"title": 'audio_out / ADC model (last block)',
+             "series": [{"y": self.adc.last_got, "color": 'r', "label": 'dut'},
+                        {"y": self.adc.last_exp, "color": 'b', "label": 'model'}]},
+            {"title": 'audio_out / DAC -> ADC model (last block)',
+             "series": [{"y": self.end_to_end.last_got, "color": 'r', "label": 'dut'},
+                        {"y": self.end_to_end.last_exp, "color": 'b', "label": 'model'}]},
+        ]
+        paths = write_report(name, panels, metrics=metrics)
+        log_scoreboard.info("loopback report written to %s", paths["html"])
+
 
 class SDM_scoreboard(Scoreboard):
-    def __init__(self, dut, reorder_depth=0, fail_immediately=False):  # FIXME: reorder_depth needed here?
+    def __init__(self, dut, reorder_depth=0, fail_immediately=False, exact=False, fail_threshold=None, rate=2822400):  # FIXME: reorder_depth needed here?
         super().__init__(dut, reorder_depth, fail_immediately)
         self.val_got = []
         self.val_exp = []
+        self.exact = exact
+        # Consumes every transaction as it arrives, only the moving-average window is kept
+        self.comparator = SDM_stream_comparator(window=256, threshold=0.1, fail_threshold=fail_threshold, exact=exact,
+                                                record_every=256)
+        # In-band SNR/SINAD/ENOB/THD and noise-shaping slope of both streams, accumulated the same way
+        self.spectrum_got = SDM_spectrum_analyser(rate)
+        self.spectrum_exp = SDM_spectrum_analyser(rate)
+        # sdm_out as captured, written to $SDM_CAPTURE_DIR for the simulator parity check
+        self.capture = open_capture("sdm_out", np.uint8)
 
     def compare(self, got, exp, log, strict_type=False):
         self.val_got = got
         self.val_exp = exp
-        self.averaged_got = np.convolve(self.val_got, np.ones(256)/256, mode='valid') * 2 - 1
-        self.averaged_exp = np.convolve(self.val_exp, np.ones(256)/256, mode='valid') * 2 - 1
-        if np.average(np.abs(self.averaged_exp - self.averaged_got)) >= 0.1:
-            return False
-        return True
-
-    def report(self, input_data):
-        print(f"Len got: {len(self.val_got)}, got: {self.val_got}, type: {type(self.val_got)}; Len exp: {len(self.val_exp)}, exp: {self.val_exp}, type: {type(self.val_exp)}")
+        self.averaged_got = self.averaged_exp = None
+        self.comparator.update(got, exp)
+        self.spectrum_got.update(got)
+        self.spectrum_exp.update(exp)
+        if self.capture is not None:
+            self.capture.write(got)
+        self.result = self.comparator.result()
+        log_scoreboard.info("compare: %s", self.result)
+        return self.comparator.passed
+
+    def report(self, input_data, name="simple_top_tb"):
+        if self.capture is not None:
+            self.capture.close()
+        log_scoreboard.info("got: %s; exp: %s", summary(self.val_got), summary(self.val_exp))
         num_of_elements = np.arange(len(self.val_got))
-        num_of_elements_input = np.arange(len(input_data))
-        int_input = list(map(int, input_data))
-
-        num_of_elements_avg = np.arange(len(self.averaged_got))
-
 
-        fig, axs = plt.subplots(2,3) # Two rows and three cols
-        axs[0, 0].plot(num_of_elements, self.val_got, color='r', label='dut', alpha=0.7, linestyle='-')
-        axs[0, 0].set_title('DUT')
-        axs[1, 0].plot(num_of_elements, self.val_exp, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[1, 0].set_title('Model')
+        # Averages of the whole run as recorded by the comparator (val_got is the last block in burst mode)
+        self.averaged_got = np.array(self.comparator.recorded_got)
+        self.averaged_exp = np.array(self.comparator.recorded_exp)
+        num_of_elements_avg = np.array(self.comparator.recorded_index)
 
-        axs[0, 1].plot(num_of_elements_input, input_data, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[0, 1].set_title('input dut')
-        axs[1, 1].plot(num_of_elements_input, int_input, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[1, 1].set_title('input model')
 
-        axs[0, 2].plot(num_of_elements_avg, self.averaged_got, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[0, 2].set_title('avg filtered dut')
-        axs[1, 2].plot(num_of_elements_avg, self.averaged_exp, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[1, 2].set_title('avg filtered model')
-        plt.show()
+        panels = [
+            {"title": 'DUT', "series": [{"x": num_of_elements, "y": self.val_got, "color": 'r', "label": 'dut'}], "step": True},
+            {"title": 'input dut', "series": [{"y": input_data, "color": 'b'}]},
+            {"title": 'avg filtered dut', "series": [{"x": num_of_elements_avg, "y": self.averaged_got, "color": 'b'}]},
+            {"title": 'Model', "series": [{"x": num_of_elements, "y": self.val_exp, "color": 'b', "label": 'model'}], "step": True},
+            {"title": 'input model', "series": [{"y": input_data, "color": 'b'}]},
+            {"title": 'avg filtered model', "series": [{"x": num_of_elements_avg, "y": self.averaged_exp, "color": 'b'}]},
+            spectrum_panel(self.spectrum_got, self.spectrum_exp),
+        ]
+        metrics = dict(self.comparator.result(), **compare_spectra(self.spectrum_got, self.spectrum_exp))
+        log_scoreboard.info("spectrum: %s", metrics)
+        # Headless: PNG/SVG/HTML and a JSON summary in the sim build directory
+        paths = write_report(name, panels, metrics=metrics, layout=(3, 3))
+        log_scoreboard.info("report written to %s", paths["html"])
 
 
 class SDM_model_wrapper():
-    def __init__(self, periods=2, samples_per_period=20, target_rate=2822400, frequency=1, order=1):
+    def __init__(self, periods=2, samples_per_period=20, target_rate=2822400, sample_rate=44100, frequency=1, order=1,
+                 stimulus=None):
         self.periods = periods
         self.samples_per_period = samples_per_period
         self.frequency = frequency
         self.target_rate = target_rate
+        self.sample_rate = sample_rate
         self.order = order
+        # Any model.stimulus generator or file, the 0.5 amplitude sine of periods * samples_per_period samples if None
+        if stimulus is None:
+            stimulus = SDM_multitone([frequency], [0.5], num_samples=periods * samples_per_period,
+                                     sample_rate=samples_per_period * frequency)
+        self.stimulus = stimulus
         self.generate_data()
 
     def generate_data(self):
-        # Calculate the duration for periods
-        self.duration = self.periods / self.frequency
-
-        # Total number of samples
-        self.total_samples = self.periods * self.samples_per_period
-
-        # Time array with 5 samples per period
-        self.time = np.linspace(0, self.duration, int(self.total_samples), endpoint=False)
-        print(f"time: {self.time}, len: {len(self.time)}")
-
-        # Generate sine wave with the desired properties
-        #self.audio_data = (0.9 * np.sin(2 * np.pi * self.frequency * self.time) * 32767).astype(dtype='int16')
-
-        self.audio_data = (0.5 * np.sin(2 * np.pi * self.frequency * self.time) * 32767).astype(dtype='int16')
-        print(f"audio_data: {self.audio_data}, len: {len(self.audio_data)}")
-        # Convert to SDM signal
-        self.sdm_signal = convert_audio_to_sdm(self.audio_data, self.total_samples, self.target_rate, self.order)
+        # Generated on demand or memory-mapped, the driver iterates over self.stimulus itself
+        log_model.info("stimulus: %s", self.stimulus)
+        # Convert to SDM signal (behavioural model) and bit-exact sdm_out of the RTL DAC, as seen by the monitor.
+        # The models render the stimulus block by block; with $SDM_GOLDEN_CACHE set, a stimulus that was
+        # already modelled is loaded instead
+        golden = golden_outputs(self.stimulus, self.order, self.sample_rate, self.target_rate)
+        self.sdm_signal = golden["sdm_signal"]
+        self.dac_signal = golden["dac_signal"]
 
 def parse_plusargs():
     def validate_field(field):
@@ -161,31 +329,94 @@ def parse_plusargs():
         return field
 
     order = 0
-    adc_type = 0
     if "ORDER" in cocotb.plusargs:
         order = validate_field(int(cocotb.plusargs["ORDER"]))
 
-    if "ADC_TYPE" in cocotb.plusargs:
-        adc_type = validate_field(int(cocotb.plusargs["ADC_TYPE"]))
+    # ADC_TYPE as top.sv reads it: 0 adc_avg, 1 adc_art (its default), anything else no ADC
+    adc_type = int(cocotb.plusargs.get("ADC_TYPE", 1))
 
     return order, adc_type
 
 @cocotb.test()
 async def functionality(top):
-    order_from_terminal, adc_type_from_terminal = parse_plusargs()
-    model = SDM_model_wrapper(order=order_from_terminal)
+    configure_logging(cocotb.plusargs.get("VERBOSITY"))
+    order_from_terminal, adc_type = parse_plusargs()
+    exact = int(cocotb.plusargs.get("EXACT", 0))
+    fail_threshold = float(cocotb.plusargs["FAIL_THRESHOLD"]) if "FAIL_THRESHOLD" in cocotb.plusargs else None
+    block_size = int(cocotb.plusargs.get("BURST", 0)) or None
+    # +STIMULUS=<spec>, see model.stimulus.stimulus_from_spec()
+    stimulus = stimulus_from_spec(cocotb.plusargs["STIMULUS"]) if cocotb.plusargs.get("STIMULUS") else None
+    model = SDM_model_wrapper(order=order_from_terminal, stimulus=stimulus)
+    # +LOOPBACK=1 feeds sdm_out back into the ADC of ADC_TYPE
+    loopback = int(cocotb.plusargs.get("LOOPBACK", 0))
+    if loopback and adc_type not in ADC_MODELS:
+        log_scoreboard.warning("loopback: top has no ADC for ADC_TYPE=%d, only the DAC path is checked", adc_type)
+        loopback = 0
 
 
     cocotb.start_soon(Clock(top.clk, 354.6, units='ns').start())
-    cocotb.start_soon(Clock(top.dummy_clk, 22675.73, units='ns').start())
+    # The exact check needs exactly 64 clk cycles per audio sample
+    cocotb.start_soon(Clock(top.dummy_clk, 354.6 * 64 if exact else 22675.73, units='ns').start())
 
     rst_drv = SDM_reset_driver(top.clk, top.rst_n)
     drv = SDM_driver(top.dummy_clk, top.audio_in, top.valid_in_dac)
-    mon = SDM_monitor(top.clk, "mon", top.sdm_out, top.valid_out_dac, num_of_probes=len(model.sdm_signal), callback=None)
-    scb = SDM_scoreboard(top, fail_immediately=False)
-    scb.add_interface(mon, [model.sdm_signal], reorder_depth=0)
-
+    if cocotb.plusargs.get("DUMP"):
+        # The simulator dumps the ports, the outputs are checked offline by model/waveform.py (make dump_check).
+        # Without the loopback the ADC inputs stay low and audio_out is checked to stay idle.
+        top.sdm_in.value = 0
+        top.valid_in_adc.value = 0
+        await rst_drv.send(500)
+        if loopback:
+            # Only drives the ADC, nothing is sampled per cycle
+            loopback_mon = SDM_loopback(top.clk, top.sdm_out, top.valid_out_dac, top.sdm_in, top.valid_in_adc,
+                                        len(model.sdm_signal) + LOOPBACK_DRAIN)
+        if exact:
+            await RisingEdge(top.dummy_clk)
+        await drv.send(model.stimulus)
+        await Timer(354.6 * DUMP_DRAIN, units='ns')
+        if loopback:
+            await loopback_mon.done.wait()
+        manifest = write_dump_manifest(cocotb.plusargs["DUMP_FILE"], model.dac_signal if exact else model.sdm_signal,
+                                       exact=exact, fail_threshold=fail_threshold,
+                                       adc_type=adc_type if adc_type in ADC_MODELS else None,
+                                       dac_signal=model.dac_signal if loopback else None)
+        log_scoreboard.info("dump written to %s, check it with model/waveform.py %s", cocotb.plusargs["DUMP_FILE"],
+                            manifest)
+        return
+    mon = SDM_monitor(top.clk, "mon", top.sdm_out, top.valid_out_dac, num_of_probes=len(model.sdm_signal), callback=None,
+                      block_size=block_size)
+    scb = SDM_scoreboard(top, fail_immediately=False, exact=exact, fail_threshold=fail_threshold)
+    expected = model.dac_signal if exact else model.sdm_signal
+    if block_size:
+        # One expected transaction per captured block
+        expected = [expected[start:start + block_size] for start in range(0, len(expected), block_size)]
+    else:
+        expected = [expected]
+    scb.add_interface(mon, expected, reorder_depth=0)
+
+    if loopback:
+        top.sdm_in.value = 0
+        top.valid_in_adc.value = 0
     await rst_drv.send(500)
-    await drv.send(model.audio_data)
-    await mon.wait_for_recv()
-    scb.report(model.audio_data)
+    if loopback:
+        # Both directions in the same run, started together so that they stay cycle-aligned
+        loopback_scb = SDM_loopback_scoreboard(adc_type, model.dac_signal, exact=exact)
+        num_cycles = len(model.sdm_signal) + LOOPBACK_DRAIN
+        loopback_mon = SDM_loopback(top.clk, top.sdm_out, top.valid_out_dac, top.sdm_in, top.valid_in_adc, num_cycles,
+                                    callback=loopback_scb.loopback_received)
+        adc_mon = SDM_pcm_monitor(top.clk, "adc_mon", top.audio_out, top.valid_out_adc, num_cycles,
+                                  callback=loopback_scb.audio_received)
+    if exact:
+        await RisingEdge(top.dummy_clk)
+    await drv.send(model.stimulus)
+    if block_size:
+        await mon.done.wait()
+    else:
+        await mon.wait_for_recv()
+    scb.report(model.stimulus, name=f"simple_top_tb_order{order_from_terminal}")
+    if loopback:
+        await loopback_mon.done.wait()
+        await adc_mon.done.wait()
+        loopback_scb.report(name=f"simple_top_tb_loopback_order{order_from_terminal}_adc{adc_type}")
+        assert loopback_scb.passed, (f"loopback audio_out differs from the models: adc {loopback_scb.adc.result()}, "
+                                     f"end to end {loopback_scb.end_to_end.result()}")
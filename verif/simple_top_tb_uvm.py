@@ -18,10 +18,8 @@ import random
 import numpy as np
 import sys
 import os
-import matplotlib.pyplot as plt
-from scipy.signal import resample
-from scipy.signal import firwin, lfilter, decimate
-import collections
+import logging
+import time
 # Adding main_repo to path to use relative imports
 parent_path = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
 
@@ -29,43 +27,67 @@ if parent_path not in sys.path:
     sys.path.append(parent_path)
 
 # Model
-from model.SDM import convert_audio_to_sdm, sigma_delta_demodulator_fir
-
-
-# Misc
-sys.setrecursionlimit(10000000)
+from model.SDM import SDM_modulator
+from model.bitstream import moving_average, compare_bitstreams
+from model.dac_models import SDM_dac_model
+from model.scoreboard import SDM_stream_comparator
+from model.trace import configure_logging, get_logger, summary
+from model.report import write_report
+from model.golden import golden_outputs
+from model.stimulus import SDM_multitone, stimulus_from_spec
+from model.spectrum import SDM_spectrum_analyser, compare_spectra, spectrum_panel
+from model.capture import open_capture
+
+# Captured bits handed to the streaming comparator at once
+STREAM_BLOCK = 4096
+
+# Per-component loggers, levels from the +VERBOSITY plusarg (e.g. +VERBOSITY=INFO,monitor=DEBUG)
+log_model = get_logger("model")
+log_sequence = get_logger("sequence")
+log_driver = get_logger("driver")
+log_monitor = get_logger("monitor")
+log_scoreboard = get_logger("scoreboard")
+log_test = get_logger("test")
+
+
+
+def plusarg_stimulus():
+    ''' Stimulus selected with +STIMULUS=<spec> (see model.stimulus.stimulus_from_spec()), None for the default sine. '''
+    spec = cocotb.plusargs.get("STIMULUS")
+    return stimulus_from_spec(spec) if spec else None
+
+def fifo_data(items, dtype):
+    ''' Flattens the data of (success, item) tuples from a TLM fifo, single-value and block items alike. '''
+    return np.concatenate([np.atleast_1d(np.asarray(x[1].data, dtype=dtype)) for x in items] or [np.zeros(0, dtype)])
 
 class SDM_model_wrapper():
-    def __init__(self, periods=2, samples_per_period=20, target_rate=2822400, frequency=1, order=1):
+    def __init__(self, periods=2, samples_per_period=20, target_rate=2822400, sample_rate=44100, frequency=1, order=1,
+                 stimulus=None):
         self.periods = periods
         self.samples_per_period = samples_per_period
         self.frequency = frequency
         self.target_rate = target_rate
+        self.sample_rate = sample_rate
         self.order = order
-        self.generate_audio_data()
+        # Any model.stimulus generator or file, the 0.5 amplitude sine of periods * samples_per_period samples if None
+        if stimulus is None:
+            stimulus = SDM_multitone([frequency], [0.5], num_samples=periods * samples_per_period,
+                                     sample_rate=samples_per_period * frequency)
+        self.stimulus = stimulus
 
     def generate_audio_data(self):
-        # Calculate the duration for periods
-        self.duration = self.periods / self.frequency
-
-        # Total number of samples
-        self.total_samples = self.periods * self.samples_per_period
-
-        # Time array with 5 samples per period
-        self.time = np.linspace(0, self.duration, int(self.total_samples), endpoint=False)
-        print(f"time: {self.time}, len: {len(self.time)}")
-
-        # Generate sine wave with the desired properties
-        #self.audio_data = (0.9 * np.sin(2 * np.pi * self.frequency * self.time) * 32767).astype(dtype='int16')
-
-        self.audio_data = (0.5 * np.sin(2 * np.pi * self.frequency * self.time) * 32767).astype(dtype='int16')
-        return self.audio_data
+        # Generated on demand or memory-mapped, the sequences iterate over self.stimulus itself
+        log_model.info("stimulus: %s", self.stimulus)
+        return self.stimulus
 
     def generate_data(self, audio_data):
-        audio_data = [x[1].data for x in audio_data]
-        print(f"audio_data: {audio_data}, len: {len(audio_data)}")
-        # Convert to SDM signal
-        self.sdm_signal = convert_audio_to_sdm(audio_data, self.total_samples, self.target_rate, self.order)
+        audio_data = fifo_data(audio_data, np.int16)
+        log_model.info("audio_data: %s", summary(audio_data))
+        # Convert to SDM signal (behavioural model) and bit-exact sdm_out of the RTL DAC, as seen by the monitor.
+        # With $SDM_GOLDEN_CACHE set, a stimulus that was already modelled is loaded instead
+        golden = golden_outputs(audio_data, self.order, self.sample_rate, self.target_rate)
+        self.sdm_signal = golden["sdm_signal"]
+        self.dac_signal = golden["dac_signal"]
 
 # Sequence item
 class SDM_seq_item(uvm_sequence_item):
@@ -81,6 +103,19 @@ class SDM_seq_item(uvm_sequence_item):
 
         return (f" SDM_SEQ_ITEM | data = {self.data}, valid = {self.valid}")
 
+class SDM_block_item(uvm_sequence_item):
+    ''' Block transaction: a NumPy array of samples instead of one value per item. '''
+    def __init__(self, name, data, valid=1):
+        super().__init__(name)
+        self.data = data
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.data)
+
+    def __str__(self) -> str:
+        return (f" SDM_BLOCK_ITEM | {len(self.data)} samples, valid = {self.valid}")
+
 # Sequence
 class SDM_base_seq(uvm_sequence):
     def __init__(self, name):
@@ -89,7 +124,7 @@ class SDM_base_seq(uvm_sequence):
     async def body(self):
         sdm_transaction = SDM_seq_item("sdm_transaction", 0, 0)
         await self.start_item(sdm_transaction)
-        print(f"SDM_BASE_SEQUENCE | CREATED ITEM: {str(sdm_transaction)}")
+        log_sequence.debug("created item: %s", sdm_transaction)
         await self.finish_item(sdm_transaction)
 
     #TODO: ADD RANDOMIZATION
@@ -99,17 +134,33 @@ class SDM_sinus_sequence(uvm_sequence):
         super().__init__(name)
 
     async def body(self):
-        print(f"SDM_SINUS_SEQUENCE | body()")
+        log_sequence.info("SDM_SINUS_SEQUENCE | body()")
         sdm_order = int(cocotb.plusargs["ORDER"])
-        model = SDM_model_wrapper(order=sdm_order)
-        self.audio_data = model.generate_audio_data()
-        for idx, audio_chunk in enumerate(self.audio_data):
-            print(f"SDM_SINUS_SEQUENCE | Iteration {idx}, Data: {audio_chunk}")
+        model = SDM_model_wrapper(order=sdm_order, stimulus=plusarg_stimulus())
+        for idx, audio_chunk in enumerate(model.stimulus):
+            log_sequence.debug("iteration %d, data: %s", idx, audio_chunk)
             sdm_transaction = SDM_seq_item("sdm_transaction", audio_chunk, 1)
             await self.start_item(sdm_transaction)
-            print(f"SDM_SINUS_SEQUENCE | STARTED ITEM: {sdm_transaction}")
+            log_sequence.debug("started item: %s", sdm_transaction)
             await self.finish_item(sdm_transaction)
-            print(f"SDM_SINUS_SEQUENCE | FINISHED ITEM: {sdm_transaction}")
+            log_sequence.debug("finished item: %s", sdm_transaction)
+
+
+class SDM_sinus_block_sequence(uvm_sequence):
+    ''' Same stimulus as SDM_sinus_sequence, one SDM_block_item per block_size samples. '''
+    def __init__(self, name, block_size=1024):
+        super().__init__(name)
+        self.block_size = block_size
+
+    async def body(self):
+        log_sequence.info("SDM_SINUS_BLOCK_SEQUENCE | body()")
+        sdm_order = int(cocotb.plusargs["ORDER"])
+        model = SDM_model_wrapper(order=sdm_order, stimulus=plusarg_stimulus())
+        for block in model.stimulus.blocks(self.block_size):
+            sdm_transaction = SDM_block_item("sdm_block", np.array(block), 1)
+            await self.start_item(sdm_transaction)
+            await self.finish_item(sdm_transaction)
+        log_sequence.info("%d samples in blocks of %d", len(model.stimulus), self.block_size)
 
 
 # Driver
@@ -119,58 +170,101 @@ class SDM_driver(uvm_driver):
         self.clkc = clk
 
     def connect_phase(self):
-        print(f"SDM_DRIVER | CONNECT_PHASE")
+        log_driver.debug("connect_phase")
         self.valid = cocotb.top.valid_in_dac
         self.data_in = cocotb.top.audio_in
         self.clk = cocotb.top.dummy_clk
         #self.clk = cocotb.top.clk
 
     def build_phase(self):
-        print(f"SDM_DRIVER | BUILD_PHASE")
+        log_driver.debug("build_phase")
         self.ap = uvm_analysis_port("ap", self)
 
     async def run_phase(self):
-        print(f"SDM_DRIVER | RUN_PHASE")
+        log_driver.debug("run_phase")
         while True:
-            print(f"SDM_DRIVER | BEFORE WAIT FOR DUMMY_CLK")
             await RisingEdge(self.clk)
-            print("SDM_DRIVER | RisingEdge detected")
-            print(f"SDM_DRIVER | AFTER WAIT FOR DUMMY_CLK")
             tx_transaction_item = await self.seq_item_port.get_next_item()
-            print(f"SDM_DRIVER | AFTER WAIT FOR self.seq_item_port.get_next_item")
-            print(f"SDM_DRIVER | tx_transaction_item: {tx_transaction_item}")
+            if isinstance(tx_transaction_item, SDM_block_item):
+                await self.drive_block(tx_transaction_item)
+                continue
+            log_driver.debug("tx_transaction_item: %s", tx_transaction_item)
             # Drive signals to DUT
             self.valid.value = int(tx_transaction_item.valid)
             self.data_in.value = int(tx_transaction_item.data)
             self.ap.write(tx_transaction_item)
             self.seq_item_port.item_done()
 
+    async def drive_block(self, block_item):
+        # One sample per dummy_clk edge without a sequencer round-trip, the scoreboard gets the block once
+        self.ap.write(block_item)
+        self.valid.value = int(block_item.valid)
+        for index, sample in enumerate(block_item.data.tolist()):
+            if index:
+                await RisingEdge(self.clk)
+            self.data_in.value = int(sample)
+        self.seq_item_port.item_done()
+
 # Monitor
 class SDM_monitor(uvm_component):
     def build_phase(self):
-        print(f"SDM_MONITOR | BUILD_PHASE")
+        log_monitor.debug("build_phase")
         self.ap = uvm_analysis_port("ap", self)
 
     def connect_phase(self):
-        print(f"SDM_MONITOR | CONNECT_PHASE")
+        log_monitor.debug("connect_phase")
         self.data_out = cocotb.top.sdm_out
         self.valid = cocotb.top.valid_out_dac
         self.clk = cocotb.top.clk
 
 
     async def run_phase(self):
-        print(f"SDM_MONITOR | RUN_PHASE")
+        log_monitor.debug("run_phase")
+        # Checked once, the per-cycle loop does not even build the log call when debug is off
+        debug = log_monitor.isEnabledFor(logging.DEBUG)
+        # BURST=N captures into an array and writes one SDM_block_item every N valid cycles
+        self.block_size = int(cocotb.plusargs.get("BURST", 0))
+        if self.block_size:
+            await self.run_burst()
+            return
         while True:
             await RisingEdge(self.clk)
             if self.valid.value:
                 rx_transaction_item = SDM_seq_item ("rx_transaction", int(self.data_out.value), int(self.valid.value))
-                print(f"SDM_MONITOR | Captured transaction: {rx_transaction_item}")
+                if debug:
+                    log_monitor.debug("captured transaction: %s", rx_transaction_item)
                 self.ap.write(rx_transaction_item)
 
+    async def run_burst(self):
+        self.buffer = np.empty(self.block_size, dtype=np.uint8)
+        self.count = 0
+        self.captured = 0
+        self.start_time = time.perf_counter()
+        while True:
+            await RisingEdge(self.clk)
+            if self.valid.value:
+                self.buffer[self.count] = int(self.data_out.value)
+                self.count += 1
+                if self.count == self.block_size:
+                    self.write_block()
+
+    def write_block(self):
+        self.ap.write(SDM_block_item("rx_block", self.buffer[:self.count].copy(), 1))
+        self.captured += self.count
+        self.count = 0
+
+    def extract_phase(self):
+        # Publish the last partial block before the scoreboard checks
+        if getattr(self, "block_size", 0):
+            if self.count:
+                self.write_block()
+            cycles_per_second = self.captured / (time.perf_counter() - self.start_time)
+            log_monitor.info("captured %d cycles, %.0f cycles/s", self.captured, cycles_per_second)
+
 # Scoreboard
 class SDM_scoreboard(uvm_component):
     def build_phase(self):
-        print(f"SDM_SCOREBOARD | BUILD_PHASE")
+        log_scoreboard.debug("build_phase")
         self.rx_fifo = uvm_tlm_analysis_fifo("rx_fifo", self)
         self.tx_fifo = uvm_tlm_analysis_fifo("tx_fifo", self)
         self.rx_get_port = uvm_get_port("rx_get_port", self)
@@ -179,14 +273,85 @@ class SDM_scoreboard(uvm_component):
         self.tx_export = self.tx_fifo.analysis_export
         self.received_audio_data = []
         self.received_sdm_data = []
+        self.streaming = int(cocotb.plusargs.get("STREAM", 0))
+        self.rx_bits = []
+        # In-band SNR/SINAD/ENOB/THD and noise-shaping slope of the DUT capture and of the model
+        self.spectrum_got = SDM_spectrum_analyser(2822400)
+        self.spectrum_exp = SDM_spectrum_analyser(2822400)
+        # sdm_out as captured, written to $SDM_CAPTURE_DIR for the simulator parity check
+        self.capture = open_capture("sdm_out", np.uint8)
+
+    def capture_received(self, bits):
+        if self.capture is not None:
+            self.capture.write(bits)
 
     def connect_phase(self):
-        print(f"SDM_SCOREBOARD | CONNECT_PHASE")
+        log_scoreboard.debug("connect_phase")
         self.rx_get_port.connect(self.rx_fifo.get_export)
         self.tx_get_port.connect(self.tx_fifo.get_export)
 
+    async def run_phase(self):
+        # With STREAM=1 the bits are checked while the simulation runs instead of in check_phase
+        if not self.streaming:
+            return
+        log_scoreboard.info("run_phase | streaming compare")
+        sdm_order = int(cocotb.plusargs["ORDER"])
+        exact = int(cocotb.plusargs.get("EXACT", 0))
+        fail_threshold = float(cocotb.plusargs["FAIL_THRESHOLD"]) if "FAIL_THRESHOLD" in cocotb.plusargs else None
+        model = SDM_model_wrapper(order=sdm_order)
+        oversampling_factor = model.target_rate // model.sample_rate
+        self.comparator = SDM_stream_comparator(fail_threshold=fail_threshold, exact=exact, record_every=256)
+        if exact:
+            self.reference = SDM_dac_model(sdm_order)
+            if sdm_order == 2:
+                self.comparator.update(exp=[0])  # first capture is the reset value, see sdm_dac_capture()
+        else:
+            self.reference = SDM_modulator(sdm_order, oversampling_factor)
+        cocotb.start_soon(self.stream_expected(exact, oversampling_factor))
+        while True:
+            self.receive(await self.rx_get_port.get())
+
+    def receive(self, rx_transaction_item):
+        if isinstance(rx_transaction_item, SDM_block_item):
+            self.flush_received()
+            self.rx_bits = rx_transaction_item.data
+            self.flush_received()
+            return
+        self.rx_bits.append(rx_transaction_item.data)
+        if len(self.rx_bits) == STREAM_BLOCK:
+            self.flush_received()
+
+    async def stream_expected(self, exact, oversampling_factor):
+        while True:
+            tx_transaction_item = await self.tx_get_port.get()
+            self.received_audio_data.append((True, tx_transaction_item))
+            samples = np.atleast_1d(np.asarray(tx_transaction_item.data, dtype=np.int64))
+            if exact:
+                bits = self.reference.process(np.repeat(samples, oversampling_factor))["bits"]
+            else:
+                bits = self.reference.process(samples)
+            self.comparator.update(exp=bits)
+            self.spectrum_exp.update(bits)
+
+    def flush_received(self):
+        passing = self.comparator.failed_at is None
+        self.comparator.update(got=self.rx_bits)
+        self.spectrum_got.update(self.rx_bits)
+        self.capture_received(self.rx_bits)
+        self.rx_bits = []
+        if passing and self.comparator.failed_at is not None:
+            log_scoreboard.error("FAIL at bit %d", self.comparator.failed_at)
+
     def check_phase(self):
-        print(f"SDM_SCOREBOARD | CHECK_PHASE")
+        log_scoreboard.debug("check_phase")
+        if self.streaming:
+            while self.rx_get_port.can_get():
+                self.receive(self.rx_get_port.try_get()[1])
+            self.flush_received()
+            self.result = self.comparator.result()
+            log_scoreboard.info("stream compare: %s", self.result)
+            self.report_stream(self.received_audio_data)
+            return
         while self.rx_get_port.can_get():
             self.received_sdm_data.append(self.rx_get_port.try_get())
 
@@ -197,52 +362,85 @@ class SDM_scoreboard(uvm_component):
         model = SDM_model_wrapper(order=sdm_order)
         model_data = model.generate_data(self.received_audio_data)
         #print(f"Model: {model.sdm_signal}")
-        self.compare(self.received_sdm_data, model.sdm_signal)
+        if int(cocotb.plusargs.get("EXACT", 0)):
+            self.compare_exact(self.received_sdm_data, model.dac_signal)
+        else:
+            self.compare(self.received_sdm_data, model.sdm_signal)
         self.report(self.received_audio_data)
 
     def compare(self, got, exp):
-        self.val_got = [x[1].data for x in got[:len(exp)]]
+        self.val_got = fifo_data(got, np.uint8)[:len(exp)]
         self.val_exp = exp
-        print(f"len val_exp: {len(self.val_exp)}, len val_got: {len(self.val_got)}")
+        self.spectrum_got.update(self.val_got)
+        self.spectrum_exp.update(self.val_exp)
+        self.capture_received(self.val_got)
+        log_scoreboard.info("len val_exp: %d, len val_got: %d", len(self.val_exp), len(self.val_got))
         #print(f"val_exp: {self.val_exp}, exp: {exp}")
         #for x in self.val_got:
         #
         #    print(f"x: {x}, x[0]: {x[0]}, x[1]: {x[1].data}")
         #print(f"SDM_SCOREBOARD | COMPARE | val_got: {self.val_got}, type(val_got): {type(self.val_got)}")
         #print(f"SDM_SCOREBOARD | COMPARE | val_exp: {self.val_exp}, type(val_exp): {type(self.val_exp)}")
-        self.averaged_got = np.convolve(self.val_got, np.ones(256)/256, mode='valid') * 2 - 1
-        self.averaged_exp = np.convolve(self.val_exp, np.ones(256)/256, mode='valid') * 2 - 1
-        if np.average(np.abs(self.averaged_exp - self.averaged_got)) >= 0.1:
+        self.averaged_got = moving_average(self.val_got, 256) * 2 - 1
+        self.averaged_exp = moving_average(self.val_exp, 256) * 2 - 1
+        mean_error = float(np.average(np.abs(self.averaged_exp - self.averaged_got)))
+        self.result = {"compared": len(self.val_got), "mean_error": mean_error, "passed": mean_error < 0.1}
+        if mean_error >= 0.1:
             return False
         return True
 
+    def compare_exact(self, got, exp):
+        self.val_got = fifo_data(got, np.uint8)[:len(exp)]
+        self.val_exp = exp
+        self.spectrum_got.update(self.val_got)
+        self.spectrum_exp.update(self.val_exp)
+        self.capture_received(self.val_got)
+        # Bit-for-bit against the fixed-point DAC model, the averages are only needed for the plots
+        self.result = compare_bitstreams(self.val_got, self.val_exp)
+        log_scoreboard.info("compare exact: %s", self.result)
+        self.averaged_got = moving_average(self.val_got, 256) * 2 - 1
+        self.averaged_exp = moving_average(self.val_exp, 256) * 2 - 1
+        return self.result["mismatches"] == 0
+
     def report(self, input_data):
-        input_data = [x[1].data for x in input_data]
-        print(f"Len got: {len(self.val_got)}, got: {self.val_got}, type: {type(self.val_got)}; Len exp: {len(self.val_exp)}, exp: {self.val_exp}, type: {type(self.val_exp)}")
+        input_data = fifo_data(input_data, np.int16)
+        log_scoreboard.info("got: %s; exp: %s", summary(self.val_got), summary(self.val_exp))
         num_of_elements = np.arange(len(self.val_got))
-        num_of_elements_input = np.arange(len(input_data))
-        #int_input = [int(x[1].data) for x in input_data]
-        int_input = list(map(int, input_data))
 
         num_of_elements_avg = np.arange(len(self.averaged_got))
 
 
-        fig, axs = plt.subplots(2,3) # Two rows and three cols
-        axs[0, 0].plot(num_of_elements, self.val_got, color='r', label='dut', alpha=0.7, linestyle='-')
-        axs[0, 0].set_title('DUT')
-        axs[1, 0].plot(num_of_elements, self.val_exp, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[1, 0].set_title('Model')
-
-        axs[0, 1].plot(num_of_elements_input, input_data, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[0, 1].set_title('input dut')
-        axs[1, 1].plot(num_of_elements_input, int_input, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[1, 1].set_title('input model')
-
-        axs[0, 2].plot(num_of_elements_avg, self.averaged_got, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[0, 2].set_title('avg filtered dut')
-        axs[1, 2].plot(num_of_elements_avg, self.averaged_exp, color='b', label='model', alpha=0.7, linestyle='-')
-        axs[1, 2].set_title('avg filtered model')
-        plt.show()
+        panels = [
+            {"title": 'DUT', "series": [{"x": num_of_elements, "y": self.val_got, "color": 'r', "label": 'dut'}], "step": True},
+            {"title": 'input dut', "series": [{"y": input_data, "color": 'b'}]},
+            {"title": 'avg filtered dut', "series": [{"x": num_of_elements_avg, "y": self.averaged_got, "color": 'b'}]},
+            {"title": 'Model', "series": [{"x": num_of_elements, "y": self.val_exp, "color": 'b', "label": 'model'}], "step": True},
+            {"title": 'input model', "series": [{"y": input_data, "color": 'b'}]},
+            {"title": 'avg filtered model', "series": [{"x": num_of_elements_avg, "y": self.averaged_exp, "color": 'b'}]},
+            spectrum_panel(self.spectrum_got, self.spectrum_exp),
+        ]
+        self.write_report(panels, (3, 3))
+
+
+    def report_stream(self, input_data):
+        input_data = fifo_data(input_data, np.int16)
+        panels = [
+            {"title": 'input dut', "series": [{"y": input_data, "color": 'b', "label": 'input'}]},
+            {"title": 'avg filtered dut / model',
+             "series": [{"x": self.comparator.recorded_index, "y": self.comparator.recorded_got, "color": 'r', "label": 'dut'},
+                        {"x": self.comparator.recorded_index, "y": self.comparator.recorded_exp, "color": 'b', "label": 'model'}]},
+            spectrum_panel(self.spectrum_got, self.spectrum_exp),
+        ]
+        self.write_report(panels, (1, 3))
+
+    def write_report(self, panels, layout):
+        if self.capture is not None:
+            self.capture.close()
+        # Headless: PNG/SVG/HTML and a JSON summary in the sim build directory
+        metrics = dict(getattr(self, "result", {}), order=int(cocotb.plusargs["ORDER"]),
+                       **compare_spectra(self.spectrum_got, self.spectrum_exp))
+        paths = write_report(f"simple_top_tb_uvm_order{metrics['order']}", panels, metrics=metrics, layout=layout)
+        log_scoreboard.info("report written to %s", paths["html"])
 
 
 # Environment
@@ -271,29 +469,41 @@ class SDM_env(uvm_env):
 class SDM_base_test(uvm_test):
     def build_phase(self):
         #print(f"Top-level DUT signals: {dir(cocotb.top)}")
-        print(f"SDM_BASE_TEST | BUILD_PHASE")
+        log_test.debug("build_phase")
         self.env = SDM_env("env", self)
-        self.seq = SDM_sinus_sequence.create("sin_stimulus")
+        # BLOCK=N sends the stimulus as SDM_block_items of N samples
+        block_size = int(cocotb.plusargs.get("BLOCK", 0))
+        if block_size:
+            self.seq = SDM_sinus_block_sequence("sin_block_stimulus", block_size)
+        else:
+            self.seq = SDM_sinus_sequence.create("sin_stimulus")
 
     async def run_phase(self):
         self.raise_objection()
-        print("SDM_BASE_TEST | Clock started")
+        log_test.info("clock started")
         #dummy_clk = cocotb.top.dummy_clk
         #cocotb.start_soon(Clock(dummy_clk, 22675.73, units='ns').start())
-        cocotb.start_soon(Clock(self.env.dummy_clk_, 22675.73, units='ns').start())
+        # The exact check needs exactly 64 clk cycles per audio sample
+        dummy_period = 354.6 * 64 if int(cocotb.plusargs.get("EXACT", 0)) else 22675.73
+        cocotb.start_soon(Clock(self.env.dummy_clk_, dummy_period, units='ns').start())
         cocotb.start_soon(Clock(self.env.clk, 354.6, units='ns').start())
         #cocotb.start_soon(Clock(self.env))
         cocotb.top.rst_n.value = 0
         await Timer(500, units='ns')
         cocotb.top.rst_n.value = 1
 
-        print("SDM_BASE_TEST | Starting sequence...")
+        log_test.info("starting sequence...")
         await self.seq.start(self.env.seqr)
-        print("SDM_BASE_TEST | Sequence completed.")
+        log_test.info("sequence completed.")
         # Sequence or stimulus generation
         await Timer(25000, units='ns')
         self.drop_objection()
 
 @cocotb.test()
 async def functionality(top):
+    configure_logging(cocotb.plusargs.get("VERBOSITY"))
+    if int(cocotb.plusargs.get("LOOPBACK", 0)):
+        log_test.warning("LOOPBACK=1 is run by the cocotb testbench (UVM=0), only the DAC path is checked here")
+    if cocotb.plusargs.get("DUMP"):
+        log_test.warning("DUMP is run by the cocotb testbench (UVM=0), sdm_out is monitored per cycle here")
     await uvm_root().run_test("SDM_base_test")